@@ -1,7 +1,13 @@
-from django.contrib import admin
+from django.conf.urls import url
+from django.contrib import admin, messages
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
 
-from .models import Category, Question, Answer, TestCase, AccountTest, Test
-from .forms import AnswerBaseInlineFormSet
+from apps.utils.paginator import EstimatedCountPaginator
+
+from .models import Category, Question, Answer, TestCase, TestCaseRule, AccountTest, Test
+from .forms import AnswerBaseInlineFormSet, AccountImportForm
+from .importers import import_accounts, guess_format
 
 
 @admin.register(Category)
@@ -18,20 +24,87 @@ class AnswerInline(admin.StackedInline):
     formset = AnswerBaseInlineFormSet
 
 
+class DifficultyListFilter(admin.SimpleListFilter):
+    """
+    Фильтр по сложности вопроса, посчитанной по реальным ответам.
+
+    """
+    title = "Сложность по ответам"
+    parameter_name = "difficulty"
+    BORDERS = {
+        "easy": {"stat__pass_rate__gte": 0.8},
+        "medium": {"stat__pass_rate__gte": 0.4, "stat__pass_rate__lt": 0.8},
+        "hard": {"stat__pass_rate__lt": 0.4},
+        "unknown": {"stat__pass_rate__isnull": True},
+    }
+
+    def lookups(self, request, model_admin):
+        return (
+            ("easy", "Легкий (от 80%)"),
+            ("medium", "Средний (40-80%)"),
+            ("hard", "Сложный (до 40%)"),
+            ("unknown", "Нет ответов"),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() in self.BORDERS:
+            return queryset.filter(**self.BORDERS[self.value()])
+        return queryset
+
+
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     inlines = (AnswerInline, )
-    list_display = "degree", "category", "is_active", "question"
-    list_filter = "degree", "category", "is_active"
-    search_fields = "category", "question"
+    list_display = "degree", "category", "is_active", "question", "attempts", "pass_rate"
+    list_filter = "degree", DifficultyListFilter, "category", "is_active"
+    list_select_related = "category", "stat"
+    # Поиск по подстроке: на PostgreSQL его обслуживает триграммный индекс из миграции 0016, на SQLite это
+    # полный просмотр таблицы.
+    search_fields = "=category__name", "question"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        """ Число ищем по id, остальное по тексту вопроса и имени категории. """
+        if search_term.strip().isdigit():
+            return queryset.filter(pk=int(search_term)), False
+        return super(QuestionAdmin, self).get_search_results(request, queryset, search_term)
+
+    def attempts(self, obj):
+        stat = getattr(obj, "stat", None)
+        return stat.attempts if stat else 0
+    attempts.short_description = "Ответов"
+    attempts.admin_order_field = "stat__attempts"
+
+    def pass_rate(self, obj):
+        stat = getattr(obj, "stat", None)
+        if stat is None or stat.pass_rate is None:
+            return "-"
+        return "{:.0%}".format(stat.pass_rate)
+    pass_rate.short_description = "Правильных ответов"
+    pass_rate.admin_order_field = "stat__pass_rate"
 
 
 @admin.register(Test)
 class TestAdmin(admin.ModelAdmin):
-    list_display = "account", "test_case", "date_start", "date_end"
-    list_filter = "test_case",
+    list_display = "account", "test_case", "status", "date_start", "date_end"
+    list_filter = "status", "test_case"
+    list_select_related = "account", "test_case"
     search_fields = "account__name", "account__email", "test_case__name"
-    readonly_fields = "account", "test_case", "date_start", "date_end", "answers"
+    readonly_fields = (
+        "account", "test_case", "status", "date_start", "deadline", "date_end", "seed", "question_order", "answers"
+    )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = super(TestAdmin, self).get_queryset(request)
+        if request.resolver_match and request.resolver_match.url_name.endswith("_changelist"):
+            # В списке ответы не показываются, а это самые большие колонки.
+            queryset = queryset.defer(
+                "answers", "results", "question_order", "account__information", "account__password"
+            )
+        return queryset
 
     def save_model(self, request, obj, form, change):
         if change:
@@ -51,21 +124,69 @@ class TestAdmin(admin.ModelAdmin):
         return True
 
 
+class TestCaseRuleInline(admin.TabularInline):
+    model = TestCaseRule
+    extra = 0
+
+
 @admin.register(TestCase)
 class TeasCaseAdmin(admin.ModelAdmin):
     list_display = "name", "is_active", "time_to_test"
     list_filter = "is_active",
     search_fields = "name", "questions__question"
     filter_horizontal = "questions",
+    inlines = TestCaseRuleInline,
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        if db_field.name == "questions":
+            # Question.__str__ выводит категорию.
+            kwargs["queryset"] = Question.objects.select_related("category")
+        return super(TeasCaseAdmin, self).formfield_for_manytomany(db_field, request, **kwargs)
 
 
 @admin.register(AccountTest)
 class AccountAdmin(admin.ModelAdmin):
     list_display = "name", "email", "information"
+    # Поиск по подстроке: на PostgreSQL его обслуживают триграммные индексы из миграций 0016 и 0017.
     search_fields = "name", "email", "information"
     filter_horizontal = "tests",
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    change_list_template = "admin/quiz/accounttest/change_list.html"
+
+    def get_urls(self):
+        urls = [
+            url(r"^import/$", self.admin_site.admin_view(self.import_view), name="quiz_accounttest_import"),
+        ]
+        return urls + super(AccountAdmin, self).get_urls()
+
+    def import_view(self, request):
+        """ Импорт аккаунтов из CSV или JSONL. """
+        if not self.has_add_permission(request):
+            return redirect("admin:quiz_accounttest_changelist")
+
+        form = AccountImportForm(request.POST or None, request.FILES or None)
+        report = None
+        if form.is_valid():
+            uploaded = form.cleaned_data["file"]
+            report = import_accounts(
+                uploaded.file,
+                fmt=form.cleaned_data["format"] or guess_format(uploaded.name)
+            )
+            messages.info(request, str(report))
+
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            title="Импорт аккаунтов",
+            form=form,
+            report=report,
+        )
+        return TemplateResponse(request, "admin/quiz/accounttest/import.html", context)
 
     def save_model(self, request, obj, form, change):
+        if not obj.has_usable_hash():
+            obj.set_password(obj.password)
         obj.save()
 
     def save_related(self, request, form, *args, **kwargs):
@@ -73,17 +194,15 @@ class AccountAdmin(admin.ModelAdmin):
         super(AccountAdmin, self).save_related(request, form, *args, **kwargs)
         obj = form.instance
         tests_old = Test.objects.filter(account=obj)
-        old_tests_ids = set([i["id"] for i in tests_old.values("id")])
+        old_tests_ids = set([i["test_case_id"] for i in tests_old.values("test_case_id")])
         new_tests_ids = set([i["id"] for i in obj.tests.all().values("id")])
 
         tests_delete_ids = old_tests_ids - new_tests_ids
         tests_create_ids = new_tests_ids - old_tests_ids
-        tests_old.filter(pk__in=list(tests_delete_ids)).delete()
-
-        test_cases = TestCase.objects.filter(pk__in=tests_create_ids)
+        tests_old.filter(test_case_id__in=list(tests_delete_ids)).delete()
 
         tests = [
-            Test(account=obj, test_case=test_cases.get(pk=i))
+            Test(account=obj, test_case_id=i)
             for i in tests_create_ids
         ]
         Test.objects.bulk_create(tests)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class QuizConfig(AppConfig):
     name = "apps.quiz"
     verbose_name = "Тестирование"
+
+    def ready(self):
+        from . import signals  # noqa
@@ -0,0 +1,324 @@
+"""
+Автосохранение ответов.
+
+Каждый ответ хранится отдельной строкой TestAnswer, сохранение вопроса - один
+UPDATE маленькой строки, независимо от количества вопросов в тесте. Полный
+набор ответов собирается только при завершении прохождения.
+
+В режиме "buffered" (QUIZ["AUTOSAVE_MODE"]) ответы сначала пишутся в кеш и
+сбрасываются в базу пачками командой flush_autosave. Повторные сохранения
+одного вопроса между сбросами схлопываются в одну запись. Каждое сохранение
+добавляет запись в журнал в кеше: счетчик через incr и ключ на каждый номер,
+сброс идет по журналу от последнего сброшенного номера. Если самый старый
+несброшенный ответ старше AUTOSAVE_MAX_LAG секунд, запрос сбрасывает журнал
+сам, так что при потере кеша теряются ответы не больше чем за это время.
+При завершении прохождения ответы из кеша учитываются сразу, без ожидания сброса.
+
+Режим "buffered" требует общего для процессов кеша (memcached, redis), с кешем
+в памяти процесса не запускается, см. check_autosave_mode.
+
+"""
+import datetime
+import json
+import logging
+import time
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+
+from apps.utils.cache import is_shared_cache
+from apps.utils.db import bulk_update
+
+from .conf import get_setting
+from .models import Test, TestAnswer
+
+logger = logging.getLogger(__name__)
+
+MODE_DIRECT = "direct"
+MODE_BUFFERED = "buffered"
+
+SEQ_KEY = "quiz:autosave:seq"  # Номер последней записи журнала.
+FLUSHED_KEY = "quiz:autosave:flushed"  # Номер последней сброшенной записи.
+STALLED_KEY = "quiz:autosave:stalled"  # Пропавшая запись, на которой остановился прошлый сброс.
+LOCK_KEY = "quiz:autosave:lock"
+LOCK_TIMEOUT = 60
+STATS_KEY = "quiz:autosave:stats"
+
+
+def get_answer_cache_key(test_id, question_id):
+    return "quiz:autosave:answer:{}:{}".format(test_id, question_id)
+
+
+def get_slot_cache_key(number):
+    return "quiz:autosave:slot:{}".format(number)
+
+
+def dump_answer_ids(answer_ids):
+    return json.dumps(sorted(answer_ids), separators=(",", ":"))
+
+
+def load_answer_ids(text):
+    return json.loads(text) if text else []
+
+
+def is_buffered():
+    return get_setting("AUTOSAVE_MODE") == MODE_BUFFERED
+
+
+def check_autosave_mode():
+    """
+    :raises ImproperlyConfigured: Режим "buffered" с кешем в памяти процесса.
+
+    """
+    if is_buffered() and not is_shared_cache():
+        raise ImproperlyConfigured(
+            'QUIZ["AUTOSAVE_MODE"] = "buffered" требует общего для процессов кеша: '
+            "ответы из LocMemCache других процессов flush_autosave не увидит и они потеряются."
+        )
+
+
+def save_answer(test_id, question_id, answer_ids):
+    """
+    Сохраняет ответ на вопрос. Повторное сохранение того же ответа ничего не меняет.
+
+    :param test_id: id прохождения.
+    :param question_id: id вопроса.
+    :param answer_ids: id выбранных ответов.
+    :type test_id: int
+    :type question_id: int
+    :type answer_ids: collections.Iterable
+
+    """
+    if is_buffered():
+        return buffer_answer(test_id, question_id, answer_ids)
+
+    values = {"answers": dump_answer_ids(answer_ids), "updated": timezone.now()}
+    if TestAnswer.objects.filter(test_id=test_id, question_id=question_id).update(**values):
+        return
+    try:
+        with transaction.atomic():
+            TestAnswer.objects.create(test_id=test_id, question_id=question_id, **values)
+    except IntegrityError:
+        # Строку создал параллельный запрос.
+        TestAnswer.objects.filter(test_id=test_id, question_id=question_id).update(**values)
+
+
+def buffer_answer(test_id, question_id, answer_ids):
+    """
+    Кладет ответ в кеш и добавляет запись в журнал.
+
+    """
+    timeout = get_setting("AUTOSAVE_BUFFER_TIMEOUT")
+    saved = time.time()
+    cache.set(get_answer_cache_key(test_id, question_id), (dump_answer_ids(answer_ids), saved), timeout)
+    cache.add(SEQ_KEY, 0, None)
+    number = cache.incr(SEQ_KEY)
+    cache.set(get_slot_cache_key(number), (test_id, question_id, saved), timeout)
+
+    oldest = cache.get(get_slot_cache_key((cache.get(FLUSHED_KEY) or 0) + 1))
+    if oldest is not None and saved - oldest[2] > get_setting("AUTOSAVE_MAX_LAG"):
+        flush()
+
+
+def write_answers(values):
+    """
+    Пишет ответы в базу: существующие строки одним UPDATE на пачку, новые - одной вставкой.
+
+    :param values: {(id прохождения, id вопроса): (answers в JSON, дата сохранения)}
+    :type values: dict
+
+    :return: Количество записанных ответов.
+    :rtype: int
+
+    """
+    if not values:
+        return 0
+    test_ids = {test_id for test_id, question_id in values}
+    existing = {
+        (test_id, question_id): pk
+        for pk, test_id, question_id in TestAnswer.objects.filter(
+            test_id__in=test_ids, question_id__in={question_id for test_id, question_id in values}
+        ).values_list("pk", "test_id", "question_id")
+        if (test_id, question_id) in values
+    }
+    bulk_update(TestAnswer, {
+        pk: {"answers": values[key][0], "updated": values[key][1]} for key, pk in existing.items()
+    }, ["answers", "updated"])
+
+    missing = [key for key in values if key not in existing]
+    try:
+        with transaction.atomic():
+            TestAnswer.objects.bulk_create([
+                TestAnswer(test_id=key[0], question_id=key[1], answers=values[key][0], updated=values[key][1])
+                for key in missing
+            ])
+    except IntegrityError:
+        # Часть строк создали параллельно, пишем по одной.
+        for test_id, question_id in missing:
+            answers, updated = values[(test_id, question_id)]
+            if not TestAnswer.objects.filter(test_id=test_id, question_id=question_id).update(
+                    answers=answers, updated=updated):
+                TestAnswer.objects.create(test_id=test_id, question_id=question_id, answers=answers, updated=updated)
+    return len(values)
+
+
+def flush(batch_size=None):
+    """
+    Сбрасывает ответы из кеша в базу.
+
+    Ответы прохождений, которые уже не идут, пропускаются. Одновременно
+    выполняется только один сброс, остальные сразу возвращают 0.
+
+    :param batch_size: Записей журнала на пачку.
+    :type batch_size: int
+
+    :return: Количество записанных ответов.
+    :rtype: int
+
+    """
+    batch_size = batch_size or get_setting("AUTOSAVE_FLUSH_BATCH")
+    if not cache.add(LOCK_KEY, 1, LOCK_TIMEOUT):
+        return 0
+    written = 0
+    try:
+        last = cache.get(SEQ_KEY) or 0
+        flushed = cache.get(FLUSHED_KEY) or 0
+        while flushed < last:
+            numbers = range(flushed + 1, min(flushed + batch_size, last) + 1)
+            slots = cache.get_many([get_slot_cache_key(i) for i in numbers])
+            end = flushed
+            for number in numbers:
+                if get_slot_cache_key(number) in slots:
+                    end = number
+                elif number == cache.get(STALLED_KEY):
+                    # Запись пропала еще до прошлого сброса, дальше ждать нечего.
+                    end = number
+                else:
+                    # Номер уже выдан, но запись еще не положена: сбросим со следующим разом.
+                    cache.set(STALLED_KEY, number, None)
+                    break
+            if end == flushed:
+                break
+
+            slots = [slots[get_slot_cache_key(i)] for i in range(flushed + 1, end + 1)
+                     if get_slot_cache_key(i) in slots]
+            written += flush_slots(slots)
+            cache.set(FLUSHED_KEY, end, None)
+            cache.delete_many([get_slot_cache_key(i) for i in range(flushed + 1, end + 1)])
+            flushed = end
+    finally:
+        cache.delete(LOCK_KEY)
+    return written
+
+
+def flush_slots(slots):
+    """
+    Пишет в базу ответы по записям журнала.
+
+    :param slots: Список (id прохождения, id вопроса, время сохранения).
+    :type slots: list
+
+    :return: Количество записанных ответов.
+    :rtype: int
+
+    """
+    keys = {(test_id, question_id) for test_id, question_id, saved in slots}
+    started = set(Test.objects.filter(
+        pk__in={test_id for test_id, question_id in keys}, status=Test.STATUS_STARTED
+    ).values_list("pk", flat=True))
+    cached = cache.get_many([get_answer_cache_key(*key) for key in keys if key[0] in started])
+
+    values = {}
+    for key in keys:
+        value = cached.get(get_answer_cache_key(*key))
+        if value is not None:
+            answers, saved = value
+            values[key] = (answers, datetime.datetime.fromtimestamp(saved, timezone.utc))
+    written = write_answers(values)
+
+    now = time.time()
+    lag = max(now - saved for test_id, question_id, saved in slots) if slots else 0
+    stats = cache.get(STATS_KEY) or {"flushes": 0, "written": 0, "max_lag": 0}
+    stats.update(
+        flushes=stats["flushes"] + 1,
+        written=stats["written"] + written,
+        last_flush=now,
+        last_lag=lag,
+        max_lag=max(stats["max_lag"], lag),
+    )
+    cache.set(STATS_KEY, stats, None)
+    logger.info("Autosave flush: %s answers, lag %.3f s.", written, lag)
+    return written
+
+
+def get_stats():
+    """
+    Метрики буфера: сбросы, записанные ответы, задержка сброса в секундах и длина журнала.
+
+    :rtype: dict
+
+    """
+    stats = cache.get(STATS_KEY) or {"flushes": 0, "written": 0, "max_lag": 0}
+    stats["pending"] = (cache.get(SEQ_KEY) or 0) - (cache.get(FLUSHED_KEY) or 0)
+    oldest = cache.get(get_slot_cache_key((cache.get(FLUSHED_KEY) or 0) + 1))
+    stats["current_lag"] = time.time() - oldest[2] if oldest else 0
+    return stats
+
+
+def collect_answers(test, question_ids):
+    """
+    Собирает сохраненные ответы прохождения, с учетом еще не сброшенных из кеша.
+
+    :param test: Прохождение.
+    :param question_ids: id вопросов теста.
+    :type test: Test
+    :type question_ids: collections.Iterable
+
+    :return: {id вопроса: список id ответов}
+    :rtype: dict
+
+    """
+    return collect_many({test.pk: question_ids})[test.pk]
+
+
+def collect_many(question_ids):
+    """
+    Собирает сохраненные ответы нескольких прохождений одним запросом.
+
+    :param question_ids: {id прохождения: id вопросов теста}
+    :type question_ids: dict
+
+    :return: {id прохождения: {id вопроса: список id ответов}}
+    :rtype: dict
+
+    """
+    answers = {test_id: {} for test_id in question_ids}
+    queryset = TestAnswer.objects.filter(
+        test_id__in=list(question_ids)
+    ).values_list("test_id", "question_id", "answers")
+    for test_id, question_id, value in queryset:
+        answers[test_id][question_id] = load_answer_ids(value)
+    if is_buffered():
+        keys = {
+            get_answer_cache_key(test_id, question_id): (test_id, question_id)
+            for test_id, ids in question_ids.items() for question_id in ids
+        }
+        for key, (value, saved) in cache.get_many(list(keys)).items():
+            test_id, question_id = keys[key]
+            answers[test_id][question_id] = load_answer_ids(value)
+    return answers
+
+
+def clear_answers(test_ids):
+    """
+    Удаляет сохраненные ответы, после завершения они уже есть в Test.answers.
+
+    Ответы в кеше остаются до истечения, сброс их пропускает.
+
+    :param test_ids: id прохождений.
+    :type test_ids: collections.Iterable
+
+    """
+    TestAnswer.objects.filter(test_id__in=list(test_ids)).delete()
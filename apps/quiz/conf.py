@@ -0,0 +1,95 @@
+"""
+Настройки приложения тестирования.
+
+Переопределяются словарем QUIZ в settings.py.
+
+"""
+import datetime
+
+from django.conf import settings
+
+from apps.utils.cache import is_shared_cache
+
+
+DEFAULTS = {
+    # Время жизни токена авторизации.
+    "TOKEN_LIFETIME": datetime.timedelta(days=1),
+    # Кеш токен -> аккаунт.
+    "TOKEN_CACHE_TIMEOUT": 300,  # Секунд в кеше django.
+    "TOKEN_LOCAL_CACHE_SIZE": 1024,  # Записей в локальном LRU процесса.
+    "TOKEN_LOCAL_CACHE_TIMEOUT": 10,  # Секунд в локальном LRU процесса, не больше LOCAL_CACHE_TIMEOUT.
+    # Авторизация: "session" - токен из базы в сессии, "signed" - подписанный токен
+    # в заголовке "Authorization: Bearer", без сессии и таблицы токенов, см. apps.quiz.tokens.
+    # "signed" требует общего для процессов кеша, с LocMemCache не запускается.
+    "AUTH_MODE": "session",
+    "SIGNED_TOKEN_SALT": "apps.quiz.tokens",
+    # Хешер паролей аккаунтов тестирования из PASSWORD_HASHERS, "default" - первый из списка.
+    "ACCOUNT_PASSWORD_HASHER": "default",
+    # Слепки тестов, сбрасываются сигналами.
+    "TEST_CASE_CACHE_TIMEOUT": 60 * 60 * 24,
+    # Предел срока для данных, которые сбрасываются сигналами, если кеш в памяти процесса
+    # (LocMemCache): сброс не дойдет до других процессов, и они отдают устаревшие данные
+    # не дольше этого срока. 0 - не кешировать, None - без предела, только если процесс один.
+    # См. get_cache_timeout.
+    "LOCAL_CACHE_TIMEOUT": 5,
+    # Сколько после срока еще принимаются ответы, на задержки сети.
+    "TEST_DEADLINE_GRACE": datetime.timedelta(seconds=30),
+    # Автосохранение ответов: "direct" - сразу в базу, "buffered" - через кеш, см. apps.quiz.autosave.
+    "AUTOSAVE_MODE": "direct",
+    "AUTOSAVE_MAX_LAG": 30,  # Секунд, дольше ответ не ждет сброса в базу.
+    "AUTOSAVE_FLUSH_BATCH": 1000,  # Записей журнала на пачку при сбросе.
+    "AUTOSAVE_BUFFER_TIMEOUT": 60 * 60 * 6,  # Секунд хранения ответа в кеше.
+}
+
+
+def get_setting(name):
+    """
+    Достает настройку приложения.
+
+    :param name: Название настройки.
+    :type name: str
+
+    :return: Значение из settings.QUIZ или значение по умолчанию.
+
+    """
+    return getattr(settings, "QUIZ", {}).get(name, DEFAULTS[name])
+
+
+def get_cache_timeout(name):
+    """
+    Срок хранения в кеше django из настройки name.
+
+    С кешем в памяти процесса срок не больше LOCAL_CACHE_TIMEOUT: сигналы
+    сбрасывают ключи только в своем процессе, а остальные отдавали бы
+    устаревшие ответы, слепки и токены до конца срока.
+
+    :param name: Название настройки со сроком в секундах.
+    :type name: str
+
+    :return: Срок в секундах.
+    :rtype: int
+
+    """
+    if is_shared_cache():
+        return get_setting(name)
+    return get_local_cache_timeout(name)
+
+
+def get_local_cache_timeout(name):
+    """
+    Срок хранения в памяти процесса из настройки name, не больше LOCAL_CACHE_TIMEOUT.
+
+    :param name: Название настройки со сроком в секундах.
+    :type name: str
+
+    :return: Срок в секундах, None - без предела.
+    :rtype: int
+
+    """
+    timeout = get_setting(name)
+    local_timeout = get_setting("LOCAL_CACHE_TIMEOUT")
+    if local_timeout is None:
+        return timeout
+    if timeout is None:
+        return local_timeout
+    return min(timeout, local_timeout)
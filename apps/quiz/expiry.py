@@ -0,0 +1,111 @@
+"""
+Закрытие прохождений с вышедшим сроком.
+
+Начатые прохождения с прошедшим deadline выбираются по индексу (status, deadline)
+пачками. Каждая пачка в одной транзакции: строки пачки блокируются
+SELECT ... FOR UPDATE (SKIP LOCKED, где база умеет), закрываются одним UPDATE,
+проверяются по сохраненным ответам и попадают в статистику, как при завершении.
+
+Проверяются только заблокированные этой пачкой строки, поэтому параллельные
+сборщики, в том числе на разных машинах, не проверяют и не учитывают одно
+прохождение дважды. Закрытые прохождения без результата, например оставшиеся
+от прерванного сборщика до перехода на транзакции, проверяются в следующей
+пачке.
+
+"""
+import logging
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.utils.db import bulk_update
+
+from . import autosave, stats
+from .grading import get_test_answer_key, grade_test
+from .models import Test
+
+logger = logging.getLogger(__name__)
+
+
+def claim(queryset, limit):
+    """
+    Блокирует до limit строк выборки до конца транзакции.
+
+    :param queryset: Выборка прохождений.
+    :param limit: Максимум строк.
+    :type queryset: django.db.models.QuerySet
+    :type limit: int
+
+    :return: id заблокированных прохождений.
+    :rtype: list
+
+    """
+    if limit <= 0:
+        return []
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    return list(queryset.select_for_update(skip_locked=skip_locked).values_list("pk", flat=True)[:limit])
+
+
+def expire_batch(now, batch_size):
+    """
+    Закрывает и проверяет одну пачку прохождений с вышедшим сроком.
+
+    :param now: Текущее время.
+    :param batch_size: Прохождений в пачке.
+    :type now: datetime.datetime
+    :type batch_size: int
+
+    :return: Количество закрытых и проверенных прохождений.
+    :rtype: int
+
+    """
+    with transaction.atomic():
+        ids = claim(Test.objects.ungraded().order_by("pk"), batch_size)
+        expired_ids = claim(Test.objects.expired(now).order_by("deadline"), batch_size - len(ids))
+        if expired_ids:
+            # Строки заблокированы, UPDATE закрывает ровно их.
+            Test.objects.filter(pk__in=expired_ids).expire(now)
+        ids += expired_ids
+        if not ids:
+            return 0
+
+        # Без ответов: они пустые, пока прохождение идет.
+        tests = list(Test.objects.filter(pk__in=ids).only(
+            "pk", "test_case_id", "question_order", "status", "date_end"
+        ))
+        answers = autosave.collect_many({i.pk: get_test_answer_key(i) for i in tests})
+        for test in tests:
+            grade_test(test, answers[test.pk])
+
+        fields = ["answers", "results", "score", "max_score"]
+        bulk_update(Test, {i.pk: {field: getattr(i, field) for field in fields} for i in tests}, fields)
+        autosave.clear_answers(ids)
+        stats.record_tests(tests)
+    return len(tests)
+
+
+def expire_tests(batch_size=500, now=None):
+    """
+    Закрывает все прохождения с вышедшим сроком.
+
+    Сборщики можно запускать параллельно: каждый берет свои строки.
+
+    :param batch_size: Прохождений в пачке.
+    :param now: Текущее время.
+    :type batch_size: int
+    :type now: datetime.datetime
+
+    :return: Количество закрытых прохождений.
+    :rtype: int
+
+    """
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        count = expire_batch(now, batch_size)
+        if not count:
+            break
+        expired += count
+    if expired:
+        logger.info("Expired %s tests.", expired)
+    return expired
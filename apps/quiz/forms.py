@@ -1,3 +1,4 @@
+from django import forms
 from django.core.exceptions import ValidationError
 from django.forms import BaseInlineFormSet
 
@@ -16,3 +17,13 @@ class AnswerBaseInlineFormSet(BaseInlineFormSet):
 
         if not is_valid:
             raise ValidationError("Хотя бы один ответ должен быть правильный.")
+
+
+class AccountImportForm(forms.Form):
+    """ Форма импорта аккаунтов из файла. """
+    file = forms.FileField(label="Файл", help_text="CSV с заголовком name,email,password,information,tests или JSONL.")
+    format = forms.ChoiceField(
+        label="Формат",
+        choices=(("", "По расширению файла"), ("csv", "CSV"), ("jsonl", "JSONL")),
+        required=False
+    )
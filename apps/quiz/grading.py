@@ -0,0 +1,335 @@
+"""
+Проверка ответов.
+
+Для каждого теста один раз собирается ключ ответов: для каждого вопроса множество
+правильных ответов и множество всех его ответов. Проверка прохождения после этого
+не ходит в базу и сводится к сравнению множеств.
+
+"""
+import json
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from .conf import get_cache_timeout
+from .models import Answer
+
+
+def get_cache_key(test_case_id):
+    """
+    Ключ кеша для ключа ответов теста.
+
+    :param test_case_id: id теста.
+    :type test_case_id: int
+
+    :return: Ключ кеша.
+    :rtype: str
+
+    """
+    return "quiz:testcase:{}:answer_key".format(test_case_id)
+
+
+def get_question_cache_key(question_id):
+    """
+    Ключ кеша для ключа ответов одного вопроса.
+
+    :param question_id: id вопроса.
+    :type question_id: int
+
+    :return: Ключ кеша.
+    :rtype: str
+
+    """
+    return "quiz:question:{}:answer_key".format(question_id)
+
+
+def compile_answer_key(test_case_id):
+    """
+    Собирает ключ ответов теста из базы.
+
+    :param test_case_id: id теста.
+    :type test_case_id: int
+
+    :return: {id вопроса: (правильные id ответов, все id ответов)}
+    :rtype: dict
+
+    """
+    return collect_answer_key(Answer.objects.filter(question__test_case=test_case_id))
+
+
+def compile_question_keys(question_ids):
+    """
+    Собирает ключ ответов для произвольных вопросов из базы.
+
+    :param question_ids: id вопросов.
+    :type question_ids: collections.Iterable
+
+    :return: {id вопроса: (правильные id ответов, все id ответов)}
+    :rtype: dict
+
+    """
+    return collect_answer_key(Answer.objects.filter(question_id__in=list(question_ids)))
+
+
+def collect_answer_key(queryset):
+    """
+    Ключ ответов по выборке ответов.
+
+    :param queryset: Выборка Answer.
+    :type queryset: django.db.models.QuerySet
+
+    :return: {id вопроса: (правильные id ответов, все id ответов)}
+    :rtype: dict
+
+    """
+    correct, variants = defaultdict(set), defaultdict(set)
+    queryset = queryset.values_list("pk", "question_id", "is_valid")
+    for pk, question_id, is_valid in queryset:
+        variants[question_id].add(pk)
+        if is_valid:
+            correct[question_id].add(pk)
+    return {
+        question_id: (frozenset(correct[question_id]), frozenset(answer_ids))
+        for question_id, answer_ids in variants.items()
+    }
+
+
+def get_answer_key(test_case_id):
+    """
+    Достает ключ ответов теста из кеша, собирая его при промахе.
+
+    :param test_case_id: id теста.
+    :type test_case_id: int
+
+    :return: {id вопроса: (правильные id ответов, все id ответов)}
+    :rtype: dict
+
+    """
+    key = get_cache_key(test_case_id)
+    answer_key = cache.get(key)
+    if answer_key is None:
+        answer_key = compile_answer_key(test_case_id)
+        cache.set(key, answer_key, get_cache_timeout("TEST_CASE_CACHE_TIMEOUT"))
+    return answer_key
+
+
+def get_question_keys(question_ids):
+    """
+    Достает ключи ответов вопросов из кеша, собирая недостающие одним запросом.
+
+    :param question_ids: id вопросов.
+    :type question_ids: collections.Iterable
+
+    :return: {id вопроса: (правильные id ответов, все id ответов)}
+    :rtype: dict
+
+    """
+    keys = {get_question_cache_key(i): i for i in question_ids}
+    answer_key = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+    missing = set(keys.values()) - set(answer_key)
+    if missing:
+        compiled = compile_question_keys(missing)
+        # Вопрос без ответов тоже кешируем, чтобы не собирать его каждый раз.
+        cache.set_many({
+            get_question_cache_key(i): compiled.get(i, (frozenset(), frozenset())) for i in missing
+        }, get_cache_timeout("TEST_CASE_CACHE_TIMEOUT"))
+        answer_key.update(compiled)
+    return {question_id: value for question_id, value in answer_key.items() if value[1]}
+
+
+def get_test_answer_key(test):
+    """
+    Ключ ответов прохождения: по его набору вопросов или по вопросам теста.
+
+    :param test: Прохождение теста.
+    :type test: apps.quiz.models.Test
+
+    :return: {id вопроса: (правильные id ответов, все id ответов)}
+    :rtype: dict
+
+    """
+    question_order = load_question_order(test.question_order)
+    if question_order:
+        return get_question_keys(question_order)
+    return get_answer_key(test.test_case_id)
+
+
+def normalize_answers(answer_key, answers):
+    """
+    Оставляет только вопросы теста и ответы на эти вопросы.
+
+    :param answer_key: Ключ ответов теста.
+    :param answers: {id вопроса: список id ответов}
+    :type answer_key: dict
+    :type answers: dict
+
+    :return: {id вопроса: frozenset id ответов}
+    :rtype: dict
+
+    """
+    normalized = {}
+    for question_id, answer_ids in answers.items():
+        question_id = int(question_id)
+        if question_id not in answer_key:
+            continue
+        normalized[question_id] = frozenset(int(i) for i in answer_ids) & answer_key[question_id][1]
+    return normalized
+
+
+def grade(answer_key, answers):
+    """
+    Проверяет ответы.
+
+    Вопрос засчитывается, если выбраны ровно все правильные ответы.
+
+    :param answer_key: Ключ ответов теста.
+    :param answers: Ответы после normalize_answers.
+    :type answer_key: dict
+    :type answers: dict
+
+    :return: Количество правильных ответов и {id вопроса: правильно ли}
+    :rtype: tuple
+
+    """
+    results = {
+        question_id: answers.get(question_id, frozenset()) == correct
+        for question_id, (correct, variants) in answer_key.items()
+    }
+    return sum(results.values()), results
+
+
+def dump_answers(answers):
+    """
+    Ответы в JSON для Test.answers.
+
+    :param answers: {id вопроса: id ответов}
+    :type answers: dict
+
+    :rtype: str
+
+    """
+    return json.dumps({str(k): sorted(v) for k, v in sorted(answers.items())}, separators=(",", ":"))
+
+
+def load_answers(text):
+    """
+    Ответы из JSON в Test.answers.
+
+    :param text: JSON.
+    :type text: str
+
+    :return: {id вопроса: список id ответов}
+    :rtype: dict
+
+    """
+    if not text:
+        return {}
+    return {int(k): v for k, v in json.loads(text).items()}
+
+
+def dump_results(results):
+    """
+    Результаты по вопросам в JSON для Test.results.
+
+    :param results: {id вопроса: правильно ли}
+    :type results: dict
+
+    :rtype: str
+
+    """
+    return json.dumps({str(k): bool(v) for k, v in sorted(results.items())}, separators=(",", ":"))
+
+
+def load_results(text):
+    """
+    Результаты по вопросам из JSON в Test.results.
+
+    :param text: JSON.
+    :type text: str
+
+    :return: {id вопроса: правильно ли}
+    :rtype: dict
+
+    """
+    if not text:
+        return {}
+    return {int(k): v for k, v in json.loads(text).items()}
+
+
+def dump_question_order(question_ids):
+    """
+    Набор вопросов прохождения в JSON для Test.question_order.
+
+    :param question_ids: id вопросов в порядке показа.
+    :type question_ids: list
+
+    :rtype: str
+
+    """
+    return json.dumps(list(question_ids), separators=(",", ":"))
+
+
+def load_question_order(text):
+    """
+    Набор вопросов прохождения из JSON в Test.question_order.
+
+    :param text: JSON.
+    :type text: str
+
+    :return: id вопросов в порядке показа, пустой список - вопросы теста.
+    :rtype: list
+
+    """
+    return json.loads(text) if text else []
+
+
+def grade_test(test, answers):
+    """
+    Проверяет прохождение и записывает результат в объект, без сохранения.
+
+    :param test: Прохождение теста.
+    :param answers: {id вопроса: список id ответов}
+    :type test: apps.quiz.models.Test
+    :type answers: dict
+
+    :return: Прохождение теста.
+    :rtype: apps.quiz.models.Test
+
+    """
+    answer_key = get_test_answer_key(test)
+    answers = normalize_answers(answer_key, answers)
+    score, results = grade(answer_key, answers)
+    test.answers = dump_answers(answers)
+    test.results = dump_results(results)
+    test.score = score
+    test.max_score = len(answer_key)
+    return test
+
+
+def regrade_rows(rows, answer_keys, question_keys=None):
+    """
+    Перепроверяет прохождения без обращений к базе, можно запускать в пуле процессов.
+
+    :param rows: Список (pk, id теста, question_order, answers, score, results) прохождений.
+    :param answer_keys: {id теста: ключ ответов}
+    :param question_keys: Ключи ответов вопросов из наборов прохождений.
+    :type rows: list
+    :type answer_keys: dict
+    :type question_keys: dict
+
+    :return: {pk: {"score", "max_score", "results"}} только для изменившихся прохождений.
+    :rtype: dict
+
+    """
+    changed = {}
+    for pk, test_case_id, question_order, answers, score, results in rows:
+        question_order = load_question_order(question_order)
+        if question_order:
+            answer_key = {i: question_keys[i] for i in question_order if i in question_keys}
+        else:
+            answer_key = answer_keys[test_case_id]
+        new_score, new_results = grade(answer_key, normalize_answers(answer_key, load_answers(answers)))
+        new_results = dump_results(new_results)
+        if new_score != score or new_results != results:
+            changed[pk] = {"score": new_score, "max_score": len(answer_key), "results": new_results}
+    return changed
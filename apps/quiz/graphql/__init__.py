@@ -5,9 +5,9 @@
 import graphene
 
 from .querys import RootQuery
-# from .mutations import Login
+from .mutations import RootMutation
 
-schema = graphene.Schema(RootQuery)
+schema = graphene.Schema(query=RootQuery, mutation=RootMutation)
 
 """
 test@test.ruasfj
@@ -0,0 +1,185 @@
+"""
+ALL Mutation для GraphQL.
+
+"""
+import logging
+
+import graphene
+from django.db import transaction
+from django.utils import timezone
+from graphql import GraphQLError
+
+from .types import TestResultType
+from .. import autosave, stats
+from ..grading import get_test_answer_key, normalize_answers, grade_test
+from ..models import Test
+from ..tokens import is_signed_mode, revoke_signed_token
+
+logger = logging.getLogger(__name__)
+
+
+class QuestionAnswerInput(graphene.InputObjectType):
+    """
+    Ответ на один вопрос.
+
+    """
+    question = graphene.Int(required=True)
+    answers = graphene.List(graphene.Int, required=True)
+
+
+def get_started_test(context, test_case_id):
+    """
+    Идущее прохождение теста авторизованным аккаунтом.
+
+    :param context: Request объект.
+    :param test_case_id: id теста.
+    :type context: django.core.handlers.wsgi.WSGIRequest
+    :type test_case_id: int
+
+    :return: Прохождение теста.
+    :rtype: Test
+
+    """
+    if not getattr(context, "account_test", None):
+        raise GraphQLError("Требуется авторизация.")
+
+    test = Test.objects.filter(test_case_id=test_case_id, account=context.account_test).first()
+    if test is None:
+        raise GraphQLError("Такого теста не существует.")
+    if test.status == Test.STATUS_NEW:
+        raise GraphQLError("Тест с id `{}` еще не начат.".format(test_case_id))
+    if test.status != Test.STATUS_STARTED:
+        raise GraphQLError("Тест с id `{}` уже завершен.".format(test_case_id))
+    return test
+
+
+class SaveAnswer(graphene.Mutation):
+    """
+    Автосохранение ответа на один вопрос во время тестирования.
+
+    """
+    class Input:
+        id = graphene.Int(required=True)
+        question = graphene.Int(required=True)
+        answers = graphene.List(graphene.Int, required=True)
+
+    answers = graphene.List(graphene.Int)  # Сохраненные id ответов.
+
+    @staticmethod
+    def mutate(root, args, context, info):
+        """
+        Сохраняем ответ на вопрос.
+
+        :param args: Аргументы к ендпоинту.
+        :param context: Request объект.
+        :param info: AST запроса.
+        :type args: dict
+        :type context: django.core.handlers.wsgi.WSGIRequest
+        :type info: graphql.execution.base.ResolveInfo
+
+        :return: Сохраненный ответ.
+        :rtype: SaveAnswer
+
+        """
+        test = get_started_test(context, args.get("id"))
+        if test.is_overdue():
+            raise GraphQLError("Время на тест с id `{}` истекло.".format(args.get("id")))
+
+        question_id = args.get("question")
+        answers = normalize_answers(get_test_answer_key(test), {question_id: args.get("answers") or []})
+        if question_id not in answers:
+            raise GraphQLError("В тесте нет вопроса с id `{}`.".format(question_id))
+
+        autosave.save_answer(test.pk, question_id, answers[question_id])
+
+        return SaveAnswer(answers=sorted(answers[question_id]))
+
+
+class EndTest(graphene.Mutation):
+    """
+    Завершение тестирования с отправкой ответов на проверку.
+
+    """
+    class Input:
+        id = graphene.Int(required=True)
+        answers = graphene.List(QuestionAnswerInput)  # Если не переданы, берутся сохраненные.
+
+    result = graphene.Field(TestResultType)
+
+    @staticmethod
+    def mutate(root, args, context, info):
+        """
+        Проверяем ответы и завершаем тест.
+
+        :param args: Аргументы к ендпоинту.
+        :param context: Request объект.
+        :param info: AST запроса.
+        :type args: dict
+        :type context: django.core.handlers.wsgi.WSGIRequest
+        :type info: graphql.execution.base.ResolveInfo
+
+        :return: Результат тестирования.
+        :rtype: EndTest
+
+        """
+        test = get_started_test(context, args.get("id"))
+
+        # Сохраненные ответы, поверх них переданные с завершением.
+        answers = autosave.collect_answers(test, get_test_answer_key(test))
+        answers.update({i.get("question"): i.get("answers") or [] for i in args.get("answers") or []})
+        grade_test(test, answers)
+        now = timezone.now()
+        # Завершение, удаление сохраненных ответов и статистика - вместе или ничего.
+        with transaction.atomic():
+            finished = Test.objects.finish(
+                test.pk, now=now,
+                answers=test.answers, results=test.results, score=test.score, max_score=test.max_score
+            )
+            if not finished:
+                # Срок вышел или тест завершили параллельным запросом.
+                # Прохождение с вышедшим сроком закроет и проверит expire_tests.
+                if test.is_overdue(now):
+                    raise GraphQLError("Время на тест с id `{}` истекло.".format(args.get("id")))
+                raise GraphQLError("Тест с id `{}` уже завершен.".format(args.get("id")))
+            test.status, test.date_end = Test.STATUS_FINISHED, now
+            autosave.clear_answers([test.pk])
+            stats.record_test(test)
+
+        return EndTest(result=test)
+
+
+class Logout(graphene.Mutation):
+    """
+    Выход из аккаунта.
+
+    """
+    ok = graphene.Boolean()
+
+    @staticmethod
+    def mutate(root, args, context, info):
+        """
+        Отзываем подписанный токен запроса или убираем токен из сессии.
+
+        :param args: Аргументы к ендпоинту.
+        :param context: Request объект.
+        :param info: AST запроса.
+        :type args: dict
+        :type context: django.core.handlers.wsgi.WSGIRequest
+        :type info: graphql.execution.base.ResolveInfo
+
+        :return: Был ли выполнен вход.
+        :rtype: Logout
+
+        """
+        if not getattr(context, "account_test", None):
+            return Logout(ok=False)
+        if is_signed_mode():
+            return Logout(ok=revoke_signed_token(context.auth_token))
+        context.session.pop("testing_auth_token", None)
+        return Logout(ok=True)
+
+
+class RootMutation(graphene.ObjectType):
+    save_answer = SaveAnswer.Field()  # Автосохранение ответа.
+    end_test = EndTest.Field()  # Завершение тестирования.
+    logout = Logout.Field()  # Выход из аккаунта.
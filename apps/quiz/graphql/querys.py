@@ -3,17 +3,20 @@ ALL Query для GraphQL.
 
 """
 import logging
-import datetime
 
 import graphene
+from django.db.models import Prefetch
 from graphql import GraphQLError
 
 from .types import (
-    AccountTestType, TestCaseType, StartTestType
+    AccountTestType, TestCaseType, StartTestType, QuestionStatType
 )
+from ..grading import dump_question_order
 from ..models import (
-    AccountTest, TestCase, Test
+    AccountTest, TestCase, Test, Answer, QuestionStat
 )
+from ..pools import make_seed, make_paper
+from ..tokens import is_signed_mode, make_signed_token
 
 logger = logging.getLogger(__name__)
 
@@ -35,10 +38,10 @@ class RootQuery(graphene.AbstractType, graphene.ObjectType):
         StartTestType,
         id=graphene.Int(required=True)
     )  # Начало тестирования.
-    end_test = graphene.Field(
-        TestCaseType,
-        id=graphene.Int(required=True)
-    )  # Завершение тестирования.
+    question_stats = graphene.List(
+        QuestionStatType,
+        ids=graphene.List(graphene.Int, required=True)
+    )  # Статистика по вопросам, только для персонала.
 
     def resolve_login(self, args, context, info):
         """
@@ -56,14 +59,16 @@ class RootQuery(graphene.AbstractType, graphene.ObjectType):
 
         """
         email, passwd = args.get("email"), args.get("password")
-        accounts = AccountTest.objects.filter(email=email, password=passwd)
+        account = AccountTest.objects.filter(email=AccountTest.normalize_email(email)).first()
 
-        if not accounts.exists():
+        if account is None or not account.check_password(passwd):
             raise GraphQLError("Логин или пароль неверные.")
 
-        account = accounts.first()
-
-        context.session["testing_auth_token"] = account.get_auth_token()
+        if is_signed_mode():
+            # Токен отдается в поле token, клиент шлет его в заголовке Authorization.
+            account.auth_token = make_signed_token(account)
+        else:
+            context.session["testing_auth_token"] = account.get_auth_token()
 
         return account
 
@@ -82,7 +87,7 @@ class RootQuery(graphene.AbstractType, graphene.ObjectType):
         :rtype: AccountTest
 
         """
-        if hasattr(context, "account_test"):
+        if getattr(context, "account_test", None):
             return context.account_test
         raise GraphQLError("Требуется авторизация.")
 
@@ -101,7 +106,7 @@ class RootQuery(graphene.AbstractType, graphene.ObjectType):
         :rtype: TestCase
 
         """
-        if not hasattr(context, "account_test"):
+        if not getattr(context, "account_test", None):
             raise GraphQLError("Требуется авторизация.")
 
         try:
@@ -130,7 +135,7 @@ class RootQuery(graphene.AbstractType, graphene.ObjectType):
         :rtype: TestCase
 
         """
-        if not hasattr(context, "account_test"):
+        if not getattr(context, "account_test", None):
             raise GraphQLError("Требуется авторизация.")
 
         try:
@@ -138,13 +143,17 @@ class RootQuery(graphene.AbstractType, graphene.ObjectType):
                 pk=args.get("id", None)
             )  # Получили тест
 
-            test = Test.objects.filter(test_case_id=args.get("id", None), account=context.account_test).first()
-            if any([test.date_start, test.date_end, test.answers]):
-                # Если пользователь его уже проходил.
+            seed = make_seed()
+            paper = make_paper(test_case, seed)
+            fields = {"seed": seed, "question_order": dump_question_order(paper)} if paper is not None else {}
+            if not Test.objects.start(context.account_test, test_case, **fields):
+                # Ни одна строка не обновилась: прохождения нет, либо его уже начали, в том числе параллельным запросом.
+                if not Test.objects.filter(account=context.account_test, test_case=test_case).exists():
+                    logger.error("Нет прохождения теста %s для аккаунта %s.", test_case.pk, context.account_test.pk)
+                    raise GraphQLError("Тест с id `{}` вам не назначен.".format(args.get("id", "")))
                 raise GraphQLError("Вы уже начинали тест с id `{}`.".format(args.get("id", "")))
 
-            test.date_start = datetime.datetime.now()
-            test.save()
+            test_case.paper = paper  # Набор вопросов для StartTestType.
             return test_case
 
         except TestCase.DoesNotExist as e:
@@ -154,5 +163,25 @@ class RootQuery(graphene.AbstractType, graphene.ObjectType):
             logger.error(e)
             raise GraphQLError("Произошла неизвестная ошибка.")
 
+    def resolve_question_stats(self, args, context, info):
+        """
+        Возвращает статистику по вопросам.
+
+        :param args: Аргументы к ендпоинту.
+        :param context: Request объект.
+        :param info: AST запроса.
+        :type args: dict
+        :type context: django.core.handlers.wsgi.WSGIRequest
+        :type info: graphql.execution.base.ResolveInfo
+
+        :return: Статистика по вопросам
+        :rtype: Queryset
+
+        """
+        if not context.user.is_staff:
+            raise GraphQLError("Требуются права персонала.")
 
-# TODO: Осталось написать проверку тест и ручку на результаты теста/ов
+        return QuestionStat.objects.filter(question_id__in=args.get("ids")).prefetch_related(
+            Prefetch("question__answers", queryset=Answer.objects.order_by("pk")),
+            "question__answers__stat",
+        )
@@ -5,11 +5,13 @@
 import logging
 
 import graphene
+from django.db.models import Prefetch
 from graphene_django.types import DjangoObjectType
 
 from apps.utils.graphql.fields import CustomDurationField
 
-from ..models import Test, AccountTest, TestCase, Answer, Question
+from ..models import AccountTest, TestCase, Test, Answer, Question, QuestionStat, AnswerStat
+from ..snapshots import get_test_case_questions, get_paper_questions
 
 
 logger = logging.getLogger(__name__)
@@ -57,11 +59,11 @@ class QuestionType(DjangoObjectType):
         :type context: django.core.handlers.wsgi.WSGIRequest
         :type info: graphql.execution.base.ResolveInfo
 
-        :return: Queryset(Answers)
+        :return: Варианты ответов, у вопросов из слепка уже прикреплены.
         :rtype: Queryset
 
         """
-        return Answer.objects.filter(question=self)
+        return self.answers.all()
 
     def resolve_category(self, args, context, info):
         """
@@ -74,21 +76,76 @@ class QuestionType(DjangoObjectType):
         :type context: django.core.handlers.wsgi.WSGIRequest
         :type info: graphql.execution.base.ResolveInfo
 
-        :return: Category.name
+        :return: Category.name, у вопросов из слепка категория уже прикреплена.
         :rtype: str
 
         """
         return self.category.name
 
 
-class TestCaseListType(DjangoObjectType):
+class TestCaseInterface(graphene.Interface):
     """
-    Тип для списка доступных тестов.
+    Интерфейс для самого теста.
 
     """
+    status_test = graphene.String()
     time_to_test = CustomDurationField(description="Время на тест.")
 
+    def resolve_status_test(self, args, context, info):
+        """
+        Смотрим статус теста по отношению к ползователю.
+
+        :param args: Аргументы к типу.
+        :param context: Request объект.
+        :param info: AST запроса.
+        :type args: dict
+        :type context: django.core.handlers.wsgi.WSGIRequest
+        :type info: graphql.execution.base.ResolveInfo
+
+        :return: Статус теста
+        :rtype: str
+
+        """
+        account = getattr(context, "account_test", None)
+        if not account:
+            return None
+
+        tests = getattr(self, "account_tests", None)  # Прикрепляет AccountTestType.resolve_tests.
+        if tests is None:
+            tests = list(Test.objects.filter(account=account, test_case=self)[:1])
+        return get_status_test(tests[0] if tests else None)
+
+
+def get_status_test(test):
+    """
+    Статус прохождения теста для пользователя.
+
+    :param test: Прохождение теста.
+    :type test: Test
+
+    :return: Статус теста
+    :rtype: str
+
+    """
+    if test is None:
+        return None
+    if test.status == Test.STATUS_FINISHED:
+        return "Вы уже проходили тест."
+    elif test.status == Test.STATUS_EXPIRED or test.status == Test.STATUS_STARTED and test.is_overdue():
+        return "Время на тест истекло."
+    elif test.status == Test.STATUS_STARTED:
+        return "Сейчас невозможно начать сначала тест."
+
+    return "Все готово для начала теста."
+
+
+class TestCaseListType(DjangoObjectType):
+    """
+    Тип для списка доступных тестов.
+
+    """
     class Meta:
+        interfaces = (TestCaseInterface,)
         model = TestCase
         only_fields = ("id", "name", "time_to_test")
 
@@ -99,14 +156,15 @@ class AccountTestType(DjangoObjectType):
 
     """
     tests = graphene.List(TestCaseListType)
+    token = graphene.String()  # Подписанный токен, только в ответе login при AUTH_MODE = "signed".
 
     class Meta:
         model = AccountTest
         only_fields = ("name", "email", "tests")
 
-    def resolve_tests(self, args, context, info):
+    def resolve_token(self, args, context, info):
         """
-        Достаем тесты.
+        Подписанный токен, выданный при входе.
 
         :param args: Аргументы к типу.
         :param context: Request объект.
@@ -115,24 +173,15 @@ class AccountTestType(DjangoObjectType):
         :type context: django.core.handlers.wsgi.WSGIRequest
         :type info: graphql.execution.base.ResolveInfo
 
-        :return: Аккаунт или None
-        :rtype: AccountTest
+        :return: Токен или None, если вход был не в режиме AUTH_MODE = "signed".
+        :rtype: str
 
         """
-        return self.tests.all()
-
-
-class TestCaseInterface(graphene.Interface):
-    """
-    Интерфейс для самого теста.
+        return getattr(self, "auth_token", None)
 
-    """
-    status_test = graphene.String()
-    time_to_test = CustomDurationField(description="Время на тест.")
-
-    def resolve_status_test(self, args, context, info):
+    def resolve_tests(self, args, context, info):
         """
-        Смотрим статус теста по отношению к ползователю.
+        Достаем тесты.
 
         :param args: Аргументы к типу.
         :param context: Request объект.
@@ -141,31 +190,13 @@ class TestCaseInterface(graphene.Interface):
         :type context: django.core.handlers.wsgi.WSGIRequest
         :type info: graphql.execution.base.ResolveInfo
 
-        :return: Статус теста
-        :rtype: str
+        :return: Тесты с прохождениями аккаунта для status_test.
+        :rtype: Queryset
 
         """
-        if not hasattr(context, "account_test"):
-            return None
-
-        try:
-            test = Test.objects.get(
-                account=context.account_test,
-                test_case=self
-            )
-        except Test.DoesNotExist as e:
-            logger.error(e)
-            return None
-        except Test.MultipleObjectsReturned as e:
-            logger.error(e)
-            return None
-
-        if test.date_end:
-            return "Вы уже проходили тест."
-        elif test.date_start:
-            return "Сейчас невозможно начать сначала тест."
-
-        return "Все готово для начала теста."
+        return self.tests.prefetch_related(Prefetch(
+            "testcase_test_result", queryset=Test.objects.filter(account=self), to_attr="account_tests"
+        ))
 
 
 class TestCaseType(DjangoObjectType):
@@ -203,7 +234,62 @@ class StartTestType(DjangoObjectType):
         :type info: graphql.execution.base.ResolveInfo
 
         :return: Список Question
-        :rtype: Queryset
+        :rtype: list
+
+        """
+        paper = getattr(self, "paper", None)
+        if paper is not None:
+            return get_paper_questions(paper)
+        return get_test_case_questions(self)
+
+
+class TestResultType(DjangoObjectType):
+    """
+    Результат тестирования.
+
+    """
+    class Meta:
+        model = Test
+        only_fields = ("status", "date_start", "date_end", "deadline", "score", "max_score")
+
+
+class AnswerStatType(DjangoObjectType):
+    """
+    Статистика варианта ответа.
+
+    """
+    answer_id = graphene.Int()
+
+    class Meta:
+        model = AnswerStat
+        only_fields = ("selected",)
+
+
+class QuestionStatType(DjangoObjectType):
+    """
+    Статистика вопроса.
+
+    """
+    question_id = graphene.Int()
+    answers = graphene.List(AnswerStatType)
+
+    class Meta:
+        model = QuestionStat
+        only_fields = ("attempts", "correct", "pass_rate")
+
+    def resolve_answers(self, args, context, info):
+        """
+        Достаем статистику вариантов ответа.
+
+        :param args: Аргументы к типу.
+        :param context: Request объект.
+        :param info: AST запроса.
+        :type args: dict
+        :type context: django.core.handlers.wsgi.WSGIRequest
+        :type info: graphql.execution.base.ResolveInfo
+
+        :return: Список AnswerStat, ответы и их статистику прикрепляет resolve_question_stats.
+        :rtype: list
 
         """
-        return self.questions.all()
+        return [answer.stat for answer in self.question.answers.all() if hasattr(answer, "stat")]
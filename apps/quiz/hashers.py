@@ -0,0 +1,15 @@
+"""
+Хешер паролей аккаунтов тестирования, только для старых хешей.
+
+Раньше пароли кандидатов хешировались PBKDF2 с 1000 итераций, чтобы импорт
+тысяч аккаунтов шел быстро. Теперь они хешируются хешером по умолчанию, а
+импорт хеширует в пуле процессов. Хешер остается в PASSWORD_HASHERS, чтобы
+проверять старые хеши, при входе они перехешируются хешером по умолчанию.
+
+"""
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class AccountPasswordHasher(PBKDF2PasswordHasher):
+    algorithm = "quiz_pbkdf2_sha256"
+    iterations = 1000
@@ -0,0 +1,261 @@
+"""
+Массовый импорт аккаунтов тестирования из CSV или JSONL.
+
+Поля строки: name, email, password, information (необязательно) и tests - id тестов,
+в CSV через пробел, запятую или точку с запятой, в JSONL списком.
+
+Строки обрабатываются пачками, на пачку уходит фиксированное число запросов:
+проверка существующих email, вставка аккаунтов, получение их id, привязка тестов
+и создание прохождений.
+
+"""
+import csv
+import io
+import json
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from .conf import get_setting
+from .models import AccountTest, TestCase, Test
+
+
+FORMAT_CSV = "csv"
+FORMAT_JSONL = "jsonl"
+FORMATS = (FORMAT_CSV, FORMAT_JSONL)
+
+
+class ImportReport(object):
+    """
+    Итог импорта.
+
+    """
+    def __init__(self):
+        self.created = 0
+        self.errors = []  # (номер строки, ошибка)
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+    def __str__(self):
+        return "Создано аккаунтов: {}, ошибок: {}".format(self.created, len(self.errors))
+
+
+def guess_format(filename):
+    """
+    Формат файла по расширению.
+
+    :param filename: Имя файла.
+    :type filename: str
+
+    :rtype: str
+
+    """
+    return FORMAT_JSONL if filename.lower().endswith((".jsonl", ".json")) else FORMAT_CSV
+
+
+def read_rows(stream, fmt):
+    """
+    Читает строки файла по одной.
+
+    :param stream: Текстовый поток.
+    :param fmt: Формат, csv или jsonl.
+    :type fmt: str
+
+    :return: Генератор (номер строки, словарь или ошибка).
+    :rtype: collections.Iterator
+
+    """
+    if fmt == FORMAT_JSONL:
+        for line, text in enumerate(stream, start=1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as e:
+                yield line, ValueError("Неверный JSON: {}".format(e))
+                continue
+            yield line, row if isinstance(row, dict) else ValueError("Строка должна быть объектом.")
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def clean_row(row, test_case_ids):
+    """
+    Проверяет строку и приводит ее к нужному виду.
+
+    :param row: Строка файла.
+    :param test_case_ids: id существующих тестов.
+    :type row: dict
+    :type test_case_ids: set
+
+    :return: Проверенная строка.
+    :rtype: dict
+
+    :raises ValueError: Если строка неверная.
+
+    """
+    name = (row.get("name") or "").strip()
+    email = AccountTest.normalize_email(row.get("email"))
+    password = row.get("password") or ""
+    if not name:
+        raise ValueError("Не указано ФИО.")
+    if not password:
+        raise ValueError("Не указан пароль.")
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise ValueError("Неверный email `{}`.".format(email))
+
+    tests = row.get("tests") or []
+    if isinstance(tests, str):
+        tests = [i for i in re.split(r"[\s,;]+", tests) if i]
+    try:
+        tests = {int(i) for i in tests}
+    except (TypeError, ValueError):
+        raise ValueError("Неверные id тестов `{}`.".format(row.get("tests")))
+    unknown = tests - test_case_ids
+    if unknown:
+        raise ValueError("Нет тестов с id {}.".format(", ".join(str(i) for i in sorted(unknown))))
+
+    return {
+        "name": name,
+        "email": email,
+        "password": password,
+        "information": (row.get("information") or "").strip(),
+        "tests": tests,
+    }
+
+
+def hash_password(password):
+    return make_password(password, hasher=get_setting("ACCOUNT_PASSWORD_HASHER"))
+
+
+class AccountImporter(object):
+    """
+    Импорт аккаунтов пачками.
+
+    """
+    def __init__(self, batch_size=500, workers=0):
+        """
+        :param batch_size: Строк в пачке.
+        :param workers: Процессов для хеширования паролей, 0 - хешировать в текущем процессе.
+        :type batch_size: int
+        :type workers: int
+
+        """
+        self.batch_size = batch_size
+        self.workers = workers
+        self.report = ImportReport()
+        self.test_case_ids = set(TestCase.objects.values_list("pk", flat=True))
+        self._pool = None
+
+    def hash_passwords(self, passwords):
+        if not self.workers:
+            return [hash_password(i) for i in passwords]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return list(self._pool.map(hash_password, passwords, chunksize=max(1, len(passwords) // self.workers)))
+
+    def run(self, rows):
+        """
+        Импортирует строки.
+
+        :param rows: Генератор (номер строки, строка) из read_rows.
+        :type rows: collections.Iterator
+
+        :return: Итог импорта.
+        :rtype: ImportReport
+
+        """
+        batch = []
+        try:
+            for line, row in rows:
+                if isinstance(row, Exception):
+                    self.report.add_error(line, str(row))
+                    continue
+                try:
+                    batch.append((line, clean_row(row, self.test_case_ids)))
+                except ValueError as e:
+                    self.report.add_error(line, str(e))
+                    continue
+                if len(batch) >= self.batch_size:
+                    self.import_batch(batch)
+                    batch = []
+            if batch:
+                self.import_batch(batch)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+        return self.report
+
+    def import_batch(self, batch):
+        """
+        Создает аккаунты пачки, привязывает тесты и создает прохождения.
+
+        :param batch: Список (номер строки, проверенная строка).
+        :type batch: list
+
+        """
+        rows = {}
+        for line, row in batch:
+            if row["email"] in rows:
+                self.report.add_error(line, "Email `{}` повторяется в файле.".format(row["email"]))
+                continue
+            rows[row["email"]] = (line, row)
+
+        for email in AccountTest.objects.filter(email__in=list(rows)).values_list("email", flat=True):
+            line, row = rows.pop(email.lower())
+            self.report.add_error(line, "Аккаунт с email `{}` уже существует.".format(email))
+        if not rows:
+            return
+
+        passwords = self.hash_passwords([row["password"] for line, row in rows.values()])
+        accounts = [
+            AccountTest(name=row["name"], email=email, information=row["information"], password=password)
+            for (email, (line, row)), password in zip(rows.items(), passwords)
+        ]
+
+        with transaction.atomic():
+            AccountTest.objects.bulk_create(accounts)
+            # bulk_create в django 1.11 не везде проставляет pk.
+            ids = dict(AccountTest.objects.filter(email__in=list(rows)).values_list("email", "pk"))
+            through = AccountTest.tests.through
+            through.objects.bulk_create([
+                through(accounttest_id=ids[email], testcase_id=test_case_id)
+                for email, (line, row) in rows.items()
+                for test_case_id in row["tests"]
+            ])
+            Test.objects.bulk_create([
+                Test(account_id=ids[email], test_case_id=test_case_id)
+                for email, (line, row) in rows.items()
+                for test_case_id in row["tests"]
+            ])
+        self.report.created += len(rows)
+
+
+def import_accounts(stream, fmt=FORMAT_CSV, batch_size=500, workers=0):
+    """
+    Импортирует аккаунты из потока.
+
+    :param stream: Текстовый или бинарный поток с файлом.
+    :param fmt: Формат, csv или jsonl.
+    :param batch_size: Строк в пачке.
+    :param workers: Процессов для хеширования паролей.
+    :type fmt: str
+    :type batch_size: int
+    :type workers: int
+
+    :return: Итог импорта.
+    :rtype: ImportReport
+
+    """
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    return AccountImporter(batch_size=batch_size, workers=workers).run(read_rows(stream, fmt))
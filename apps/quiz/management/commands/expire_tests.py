@@ -0,0 +1,26 @@
+"""
+Закрытие прохождений с вышедшим сроком.
+
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.quiz.expiry import expire_tests
+
+
+class Command(BaseCommand):
+    help = "Закрывает и проверяет прохождения, у которых вышло время на тест."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Прохождений в пачке.")
+        parser.add_argument("--interval", type=float, default=0,
+                            help="Секунд между проходами, 0 - пройти один раз и выйти.")
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_tests(batch_size=options["batch_size"])
+            self.stdout.write("Закрыто прохождений: {}".format(expired))
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
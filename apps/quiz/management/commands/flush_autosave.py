@@ -0,0 +1,30 @@
+"""
+Сброс автосохраненных ответов из кеша в базу.
+
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.quiz import autosave
+
+
+class Command(BaseCommand):
+    help = "Сбрасывает автосохраненные ответы из кеша в базу, один раз или в цикле."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=0,
+                            help="Секунд между сбросами, 0 - сбросить один раз и выйти.")
+        parser.add_argument("--batch-size", type=int, default=None, help="Записей журнала на пачку.")
+
+    def handle(self, *args, **options):
+        autosave.check_autosave_mode()
+        while True:
+            written = autosave.flush(batch_size=options["batch_size"])
+            stats = autosave.get_stats()
+            self.stdout.write("Записано ответов: {}, в очереди: {}, задержка: {:.3f} с".format(
+                written, stats["pending"], stats.get("last_lag", 0)
+            ))
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,37 @@
+"""
+Импорт аккаунтов тестирования из CSV или JSONL.
+
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.quiz.importers import FORMATS, import_accounts, guess_format
+
+
+class Command(BaseCommand):
+    help = "Создает аккаунты тестирования из CSV или JSONL, привязывает тесты и создает прохождения."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь до файла.")
+        parser.add_argument("--format", choices=FORMATS, help="Формат файла, по умолчанию по расширению.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Строк в пачке.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="Процессов для хеширования паролей, 0 - хешировать в текущем процессе.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError("Файл `{}` не найден.".format(path))
+
+        with open(path, encoding="utf-8-sig", newline="") as stream:
+            report = import_accounts(
+                stream,
+                fmt=options["format"] or guess_format(path),
+                batch_size=options["batch_size"],
+                workers=options["workers"]
+            )
+
+        for line, message in report.errors:
+            self.stderr.write("Строка {}: {}".format(line, message))
+        self.stdout.write(self.style.SUCCESS(str(report)))
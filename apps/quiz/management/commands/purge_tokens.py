@@ -0,0 +1,18 @@
+"""
+Удаление устаревших токенов авторизации.
+
+"""
+from django.core.management.base import BaseCommand
+
+from apps.quiz.models import Token
+
+
+class Command(BaseCommand):
+    help = "Удаляет устаревшие токены авторизации."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Размер пачки на удаление.")
+
+    def handle(self, *args, **options):
+        deleted = Token.objects.purge_expired(batch_size=options["batch_size"])
+        self.stdout.write("Удалено токенов: {}".format(deleted))
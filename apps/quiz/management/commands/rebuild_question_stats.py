@@ -0,0 +1,18 @@
+"""
+Пересборка статистики по вопросам.
+
+"""
+from django.core.management.base import BaseCommand
+
+from apps.quiz import stats
+
+
+class Command(BaseCommand):
+    help = "Пересобирает статистику по вопросам и ответам из проверенных прохождений."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Прохождений в пачке.")
+
+    def handle(self, *args, **options):
+        processed = stats.rebuild(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS("Учтено прохождений: {}".format(processed)))
@@ -0,0 +1,168 @@
+"""
+Перепроверка завершенных прохождений.
+
+Прохождения читаются пачками по возрастанию pk, проверяются в пуле процессов
+и записываются обратно пачками. После каждой записанной пачки сохраняется
+последний pk, поэтому прерванную перепроверку можно продолжить.
+
+"""
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils.dateparse import parse_datetime, parse_date
+
+from apps.utils.db import bulk_update
+from apps.quiz import stats
+from apps.quiz.grading import compile_answer_key, compile_question_keys, load_question_order, regrade_rows
+from apps.quiz.models import Test
+from apps.quiz.pools import get_rule_test_case_ids
+from apps.quiz.snapshots import get_test_case_ids, invalidate_test_cases, invalidate_questions
+
+
+def parse_moment(value):
+    """
+    Дата или дата со временем из аргумента командной строки.
+
+    """
+    moment = parse_datetime(value) or parse_date(value)
+    if moment is None:
+        raise CommandError("Неверная дата `{}`.".format(value))
+    return moment
+
+
+class Command(BaseCommand):
+    help = "Перепроверяет завершенные прохождения тестов."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--test-case", type=int, action="append", default=[], help="id теста.")
+        parser.add_argument("--question", type=int, action="append", default=[], help="id вопроса.")
+        parser.add_argument("--since", type=parse_moment, help="Завершенные начиная с даты.")
+        parser.add_argument("--until", type=parse_moment, help="Завершенные до даты.")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Прохождений в пачке.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="Процессов для проверки, 0 - проверять в текущем процессе.")
+        parser.add_argument("--checkpoint", help="Файл для сохранения прогресса.")
+        parser.add_argument("--restart", action="store_true", help="Начать сначала, игнорируя checkpoint.")
+        parser.add_argument("--skip-stats", action="store_true", help="Не пересобирать статистику по вопросам.")
+
+    def get_queryset(self, options):
+        queryset = Test.objects.filter(date_end__isnull=False)
+        test_case_ids = set(options["test_case"])
+        if options["question"]:
+            test_case_ids.update(get_test_case_ids(question_id__in=options["question"]))
+            test_case_ids.update(get_rule_test_case_ids(options["question"]))
+        if options["test_case"] or options["question"]:
+            queryset = queryset.filter(test_case_id__in=test_case_ids)
+        if options["since"]:
+            queryset = queryset.filter(date_end__gte=options["since"])
+        if options["until"]:
+            queryset = queryset.filter(date_end__lt=options["until"])
+        return queryset
+
+    def get_chunks(self, queryset, last_pk, chunk_size):
+        """
+        Пачки прохождений по возрастанию pk, без загрузки всех строк в память.
+
+        """
+        while True:
+            rows = list(
+                queryset.filter(pk__gt=last_pk).order_by("pk").values_list(
+                    "pk", "test_case_id", "question_order", "answers", "score", "results"
+                )[:chunk_size].iterator()
+            )
+            if not rows:
+                return
+            last_pk = rows[-1][0]
+            yield rows
+
+    def load_checkpoint(self, path, filters):
+        if not path or not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint["filters"] != filters:
+            raise CommandError("Checkpoint `{}` сделан с другими фильтрами, используйте --restart.".format(path))
+        return checkpoint["last_pk"]
+
+    def save_checkpoint(self, path, filters, last_pk):
+        if not path:
+            return
+        with open(path + ".tmp", "w") as f:
+            json.dump({"filters": filters, "last_pk": last_pk}, f)
+        os.replace(path + ".tmp", path)
+
+    def handle(self, *args, **options):
+        filters = {
+            key: str(options[key]) if options[key] else options[key]
+            for key in ("test_case", "question", "since", "until")
+        }
+        checkpoint = options["checkpoint"]
+        last_pk = 0 if options["restart"] else self.load_checkpoint(checkpoint, filters)
+        if last_pk:
+            self.stdout.write("Продолжаем с pk > {}".format(last_pk))
+
+        queryset = self.get_queryset(options)
+        chunks = self.get_chunks(queryset, last_pk, options["chunk_size"])
+        answer_keys, question_keys = {}, {}
+        processed = changed = 0
+        started = time.time()
+
+        def prepare(rows):
+            # Ключи ответов собираем заново: флаги могли менять в обход сигналов.
+            test_case_ids = {row[1] for row in rows}
+            for test_case_id in test_case_ids - set(answer_keys):
+                answer_keys[test_case_id] = compile_answer_key(test_case_id)
+            # Вопросы из наборов прохождений, собранных по правилам теста.
+            question_ids = {i for row in rows for i in load_question_order(row[2])}
+            missing = question_ids - set(question_keys)
+            if missing:
+                question_keys.update(compile_question_keys(missing))
+                question_keys.update({i: (frozenset(), frozenset()) for i in missing - set(question_keys)})
+            keys = {i: question_keys[i] for i in question_ids if question_keys[i][1]}
+            return rows, {i: answer_keys[i] for i in test_case_ids}, keys
+
+        def write(rows, result):
+            nonlocal processed, changed
+            bulk_update(Test, result, ["score", "max_score", "results"])
+            processed += len(rows)
+            changed += len(result)
+            self.save_checkpoint(checkpoint, filters, rows[-1][0])
+            elapsed = time.time() - started
+            self.stdout.write("Проверено {}, изменено {}, {:.0f} прохождений/с".format(
+                processed, changed, processed / elapsed if elapsed else 0
+            ))
+
+        if options["workers"]:
+            # Дочерние процессы не должны наследовать открытые соединения.
+            connections.close_all()
+            pending = deque()
+            with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+                for rows in chunks:
+                    rows, keys, chunk_question_keys = prepare(rows)
+                    pending.append((rows, pool.submit(regrade_rows, rows, keys, chunk_question_keys)))
+                    # Держим ограниченное число пачек в работе и пишем их по порядку.
+                    while len(pending) > options["workers"] * 2 or (pending and pending[0][1].done()):
+                        rows, future = pending.popleft()
+                        write(rows, future.result())
+                while pending:
+                    rows, future = pending.popleft()
+                    write(rows, future.result())
+        else:
+            for rows in chunks:
+                write(rows, regrade_rows(*prepare(rows)))
+
+        invalidate_test_cases(answer_keys)
+        invalidate_questions(question_keys)
+        if changed and not options["skip_stats"]:
+            self.stdout.write("Пересобираем статистику по вопросам...")
+            stats.rebuild(chunk_size=options["chunk_size"])
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS("Готово: проверено {}, изменено {} за {:.1f} с".format(
+            processed, changed, time.time() - started
+        )))
@@ -0,0 +1,92 @@
+"""
+Синтетические данные для нагрузочных замеров.
+
+"""
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.quiz import stats
+from apps.quiz.models import Question, Test
+from apps.quiz.synthetic import SyntheticData, DEFAULT_DEGREES, DEFAULT_STATUSES, parse_weights
+
+
+def format_weights(weights):
+    return ",".join("{}:{:g}".format(value, weight) for value, weight in weights.items())
+
+
+def parse_range(value):
+    """
+    Диапазон вида "4-6" или одно число.
+
+    """
+    low, sep, high = value.partition("-")
+    try:
+        low, high = int(low), int(high or low)
+    except ValueError:
+        raise CommandError("Неверный диапазон `{}`.".format(value))
+    if not 1 <= low <= high:
+        raise CommandError("Неверный диапазон `{}`.".format(value))
+    return low, high
+
+
+class Command(BaseCommand):
+    help = "Заполняет базу синтетическими категориями, вопросами, аккаунтами и прохождениями."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0, help="Зерно случайных значений.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Строк в пачке.")
+        parser.add_argument("--categories", type=int, default=50, help="Категорий.")
+        parser.add_argument("--active-categories", type=float, default=1.0, help="Доля активных категорий.")
+        parser.add_argument("--questions", type=int, default=100000, help="Вопросов.")
+        parser.add_argument("--active-questions", type=float, default=0.9, help="Доля активных вопросов.")
+        parser.add_argument("--answers", default="4-6", help="Ответов на вопрос, число или диапазон.")
+        parser.add_argument("--degrees", default=format_weights(DEFAULT_DEGREES),
+                            help="Веса сложностей вопросов, сложность:вес через запятую.")
+        parser.add_argument("--test-cases", type=int, default=20, help="Тестов.")
+        parser.add_argument("--questions-per-test", type=int, default=30, help="Вопросов в тесте.")
+        parser.add_argument("--time-to-test", type=int, default=60, help="Минут на тест.")
+        parser.add_argument("--accounts", type=int, default=50000, help="Аккаунтов.")
+        parser.add_argument("--password", default="password", help="Пароль всех аккаунтов.")
+        parser.add_argument("--tests", type=int, default=1000000, help="Прохождений.")
+        parser.add_argument("--statuses", default=format_weights(DEFAULT_STATUSES),
+                            help="Веса статусов прохождений, статус:вес через запятую.")
+        parser.add_argument("--correct", type=float, default=0.7,
+                            help="Доля правильных ответов в проверенных прохождениях.")
+        parser.add_argument("--stats", action="store_true", help="Пересобрать статистику по вопросам.")
+
+    def handle(self, *args, **options):
+        try:
+            degrees = parse_weights(options["degrees"], dict(Question.DEGREE_CHOICES), int)
+            statuses = parse_weights(options["statuses"], dict(Test.STATUS_CHOICES))
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.verbosity = options["verbosity"]
+        started = time.perf_counter()
+        data = SyntheticData(seed=options["seed"], batch_size=options["batch_size"], progress=self.progress)
+        category_ids = data.create_categories(options["categories"], options["active_categories"])
+        data.create_questions(
+            options["questions"], category_ids, degrees=degrees,
+            active=options["active_questions"], answers=parse_range(options["answers"])
+        )
+        test_case_ids = data.create_test_cases(
+            options["test_cases"], options["questions_per_test"],
+            time_to_test=datetime.timedelta(minutes=options["time_to_test"])
+        )
+        account_start = data.create_accounts(options["accounts"], options["password"])
+        try:
+            data.create_tests(options["tests"], account_start, test_case_ids,
+                              statuses=statuses, correct=options["correct"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options["stats"]:
+            stats.rebuild()
+        if self.verbosity:
+            self.stdout.write(self.style.SUCCESS("{} за {:.1f} с".format(data.report, time.perf_counter() - started)))
+
+    def progress(self, name, count):
+        if self.verbosity > 1:
+            self.stdout.write("{}: {}".format(name, count))
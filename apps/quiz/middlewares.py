@@ -3,37 +3,89 @@
 """
 import logging
 
+from django.utils.functional import SimpleLazyObject
+
 try:
     from django.utils.deprecation import MiddlewareMixin
 except ImportError:
     MiddlewareMixin = object
 
-from .models import Token
+from .autosave import check_autosave_mode
+from .tokens import get_account_by_token, get_account_by_signed_token, is_signed_mode, check_auth_mode
 
 
 logger = logging.getLogger(__name__)
 
 
+def get_bearer_token(request):
+    """
+    Токен из заголовка "Authorization: Bearer <токен>".
+
+    :param request: Объект запроса
+    :type request: django.http.request.HttpRequest
+
+    :return: Токен или None
+    :rtype: str
+
+    """
+    scheme, _, token_str = request.META.get("HTTP_AUTHORIZATION", "").partition(" ")
+    if scheme.lower() != "bearer" or not token_str.strip():
+        return None
+    return token_str.strip()
+
+
+def get_account_test(request):
+    """
+    Пробуем достать токен из сессии, и получить по нему пользователя.
+
+    В режиме AUTH_MODE = "signed" токен берется из заголовка Authorization,
+    а сессия не читается.
+
+    :param request: Объект запроса
+    :type request: django.http.request.HttpRequest
+
+    :return: Аккаунт или None
+    :rtype: apps.quiz.models.AccountTest
+
+    """
+    if not hasattr(request, "_cached_account_test"):
+        account = None
+        if is_signed_mode():
+            request.auth_token = get_bearer_token(request)
+            if request.auth_token:
+                account = get_account_by_signed_token(request.auth_token)
+                if account is None:
+                    logger.warning("Invalid signed auth token.")
+            request._cached_account_test = account
+            return account
+
+        token_str = request.session.get("testing_auth_token", None)
+        if token_str:
+            account = get_account_by_token(token_str)
+            if account is None:
+                logger.warning("Unknown auth token in session %s.", request.session.session_key)
+        request._cached_account_test = account
+    return request._cached_account_test
+
+
 class TestAccountMiddleware(MiddlewareMixin):
     """
     Крепит пользователя в request.
 
+    Сессия и аккаунт достаются лениво, при первом обращении к request.account_test.
+    Если авторизации нет, request.account_test ведет себя как None.
+
     """
+    def __init__(self, get_response=None):
+        # Режимы, которым нужен общий кеш, не запускаются с кешем в памяти процесса.
+        check_auth_mode()
+        check_autosave_mode()
+        super(TestAccountMiddleware, self).__init__(get_response)
+
     def process_request(self, request):
         """
-        Пробуем достать токен из сессии, и получить по нему пользователя.
-
         :param request: Объект запроса
         :type request: django.http.request.HttpRequest
 
         """
-        # if not request.user.is_authenticated:
-        token_str = request.session.get("testing_auth_token", None)
-        if token_str:
-            try:
-                token = Token.objects.get(token=token_str)
-                request.account_test = token.account
-            except Token.DoesNotExist as e:
-                logger.error(e)
-            except Token.MultipleObjectsReturned as e:
-                logger.error(e)
+        request.account_test = SimpleLazyObject(lambda: get_account_test(request))
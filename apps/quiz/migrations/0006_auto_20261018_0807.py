@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 08:07
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0005_auto_20170728_1905'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='token',
+            name='created',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Дата выдачи'),
+        ),
+        migrations.AlterField(
+            model_name='token',
+            name='token',
+            field=models.CharField(max_length=150, unique=True, verbose_name='Токен для авторизации'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 08:09
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0006_auto_20261018_0807'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='max_score',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Всего вопросов'),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='results',
+            field=models.TextField(blank=True, verbose_name='Правильность ответов по вопросам в формате JSON'),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='score',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Правильных ответов'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 08:11
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0007_auto_20261018_0809'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerStat',
+            fields=[
+                ('answer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stat', serialize=False, to='quiz.Answer', verbose_name='Ответ')),
+                ('selected', models.PositiveIntegerField(default=0, verbose_name='Выбран раз')),
+            ],
+            options={
+                'verbose_name': 'Статистика ответа',
+                'verbose_name_plural': 'Статистика ответов',
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionStat',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stat', serialize=False, to='quiz.Question', verbose_name='Вопрос')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Ответов')),
+                ('correct', models.PositiveIntegerField(default=0, verbose_name='Правильных ответов')),
+                ('pass_rate', models.FloatField(blank=True, db_index=True, null=True, verbose_name='Доля правильных ответов')),
+            ],
+            options={
+                'verbose_name': 'Статистика вопроса',
+                'verbose_name_plural': 'Статистика вопросов',
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 08:18
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def check_duplicate_tests(apps, schema_editor):
+    """
+    Перед уникальным индексом проверяем, что на пару аккаунт-тест одно прохождение.
+
+    Повторы не удаляем, а останавливаем миграцию со списком: в них могут быть
+    ответы и оценки, какое прохождение оставить, решает человек.
+
+    """
+    Test = apps.get_model("quiz", "Test")
+    tests = Test.objects.using(schema_editor.connection.alias)
+    conflicts = list(
+        tests.order_by().values("account_id", "test_case_id").annotate(count=Count("pk")).filter(count__gt=1)
+        .values_list("account_id", "test_case_id")
+    )
+    if conflicts:
+        raise RuntimeError(
+            "Несколько прохождений на пару аккаунт-тест, оставьте по одному вручную (account_id, test_case_id): "
+            "{}".format(", ".join("({}, {})".format(*pair) for pair in conflicts))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0008_answerstat_questionstat'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_tests, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='test',
+            unique_together=set([('account', 'test_case')]),
+        ),
+    ]
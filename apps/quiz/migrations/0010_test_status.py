@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 08:21
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def fill_status(apps, schema_editor):
+    """
+    Статус и срок окончания для уже существующих прохождений по их датам.
+
+    """
+    Test = apps.get_model("quiz", "Test")
+    TestCase = apps.get_model("quiz", "TestCase")
+    db_alias = schema_editor.connection.alias
+    tests = Test.objects.using(db_alias)
+    tests.filter(date_end__isnull=False).update(status="finished")
+    started = tests.filter(date_end__isnull=True, date_start__isnull=False)
+    started.update(status="started")
+    for pk, time_to_test in TestCase.objects.using(db_alias).values_list("pk", "time_to_test"):
+        started.filter(test_case_id=pk).update(deadline=models.F("date_start") + time_to_test)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0009_test_account_test_case_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='deadline',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Срок окончания тестирования'),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='status',
+            field=models.CharField(choices=[('new', 'Не начат'), ('started', 'Идет'), ('finished', 'Завершен'), ('expired', 'Время вышло')], db_index=True, default='new', max_length=16, verbose_name='Статус'),
+        ),
+        migrations.RunPython(fill_status, migrations.RunPython.noop),
+    ]
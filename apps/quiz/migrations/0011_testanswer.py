@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 08:22
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0010_test_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TestAnswer',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answers', models.TextField(blank=True, verbose_name='id ответов в формате JSON')),
+                ('updated', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата сохранения')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='quiz.Question', verbose_name='Вопрос')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_answers', to='quiz.Test', verbose_name='Прохождение')),
+            ],
+            options={
+                'verbose_name': 'Сохраненный ответ',
+                'verbose_name_plural': 'Сохраненные ответы',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='testanswer',
+            unique_together=set([('test', 'question')]),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 08:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0011_testanswer'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='test',
+            name='status',
+            field=models.CharField(choices=[('new', 'Не начат'), ('started', 'Идет'), ('finished', 'Завершен'), ('expired', 'Время вышло')], default='new', max_length=16, verbose_name='Статус'),
+        ),
+        migrations.AddIndex(
+            model_name='test',
+            index=models.Index(fields=['status', 'deadline'], name='quiz_test_status_dec5b1_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 08:28
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0012_test_status_deadline_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TestCaseRule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('degree', models.PositiveSmallIntegerField(choices=[(1, 'Junior'), (2, 'Middle'), (3, 'Senior'), (4, 'Other')], verbose_name='Сложность вопроса')),
+                ('count', models.PositiveSmallIntegerField(verbose_name='Количество вопросов')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='quiz.Category', verbose_name='Категория')),
+                ('test_case', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rules', to='quiz.TestCase', verbose_name='Тест')),
+            ],
+            options={
+                'verbose_name': 'Правило набора вопросов',
+                'verbose_name_plural': 'Правила набора вопросов',
+            },
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='question_order',
+            field=models.TextField(blank=True, verbose_name='id вопросов в порядке показа в формате JSON'),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='seed',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Зерно случайного набора вопросов'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='testcaserule',
+            unique_together=set([('test_case', 'category', 'degree')]),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 08:58
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0013_testcaserule'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='test',
+            index=models.Index(fields=['status', 'score'], name='quiz_test_status_017a06_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 09:05
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Count, F
+from django.db.models.functions import Lower
+
+
+def lowercase_emails(apps, schema_editor):
+    """
+    Приводим email аккаунтов к нижнему регистру, как их ищет вход.
+
+    Аккаунты, email которых совпадают без учета регистра, не трогаем, а
+    останавливаем миграцию со списком: какой из них оставить, решает человек.
+
+    """
+    AccountTest = apps.get_model("quiz", "AccountTest")
+    accounts = AccountTest.objects.using(schema_editor.connection.alias)
+    conflicts = list(
+        accounts.annotate(lower=Lower("email")).values("lower").annotate(count=Count("pk")).filter(count__gt=1)
+        .values_list("lower", flat=True)
+    )
+    if conflicts:
+        raise RuntimeError(
+            "Аккаунты с email, совпадающими без учета регистра, объедините вручную: {}".format(", ".join(conflicts))
+        )
+    ids = accounts.annotate(lower=Lower("email")).exclude(email=F("lower")).values_list("pk", flat=True)
+    accounts.filter(pk__in=list(ids)).update(email=Lower("email"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0014_test_status_score_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_emails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Поиск админки по подстроке (icontains) на PostgreSQL - это UPPER(колонка) LIKE UPPER('%...%'),
+# его обслуживает GIN индекс pg_trgm по тому же выражению. На других базах такой поиск остается
+# полным просмотром таблицы.
+INDEXES = (
+    ("quiz_question_question_trgm", "quiz_question", "question"),
+    ("quiz_accounttest_name_trgm", "quiz_accounttest", "name"),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in INDEXES:
+        schema_editor.execute("CREATE INDEX {} ON {} USING gin (UPPER({}) gin_trgm_ops)".format(
+            name, schema_editor.quote_name(table), schema_editor.quote_name(column)
+        ))
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, table, column in INDEXES:
+        schema_editor.execute("DROP INDEX IF EXISTS {}".format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0015_accounttest_email_lowercase'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
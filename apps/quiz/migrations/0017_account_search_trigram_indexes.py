@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Поиск аккаунтов по подстроке email и информации, как в 0016_search_trigram_indexes.
+INDEXES = (
+    ("quiz_accounttest_email_trgm", "quiz_accounttest", "email"),
+    ("quiz_accounttest_information_trgm", "quiz_accounttest", "information"),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in INDEXES:
+        schema_editor.execute("CREATE INDEX {} ON {} USING gin (UPPER({}) gin_trgm_ops)".format(
+            name, schema_editor.quote_name(table), schema_editor.quote_name(column)
+        ))
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, table, column in INDEXES:
+        schema_editor.execute("DROP INDEX IF EXISTS {}".format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0016_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
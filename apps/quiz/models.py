@@ -1,5 +1,9 @@
-from django.db import models
-from django.utils.crypto import get_random_string
+from django.contrib.auth.hashers import make_password, check_password, identify_hasher
+from django.db import models, transaction, IntegrityError
+from django.utils import timezone
+from django.utils.crypto import get_random_string, constant_time_compare
+
+from .conf import get_setting
 
 
 class Category(models.Model):
@@ -107,6 +111,28 @@ class TestCase(models.Model):
         return self.__str__()
 
 
+class TestCaseRule(models.Model):
+    """
+    Правило набора вопросов: сколько случайных активных вопросов категории и сложности дать в тест.
+
+    """
+    test_case = models.ForeignKey(TestCase, verbose_name="Тест", related_name="rules")
+    category = models.ForeignKey(Category, verbose_name="Категория", related_name="+")
+    degree = models.PositiveSmallIntegerField("Сложность вопроса", choices=Question.DEGREE_CHOICES)
+    count = models.PositiveSmallIntegerField("Количество вопросов")
+
+    class Meta:
+        verbose_name = "Правило набора вопросов"
+        verbose_name_plural = "Правила набора вопросов"
+        unique_together = (("test_case", "category", "degree"),)
+
+    def __str__(self):
+        return "{} {} x{}".format(self.category, self.get_degree_display(), self.count)
+
+    def __repr__(self):
+        return self.__str__()
+
+
 class AccountTest(models.Model):
     """
     Аккаунт для тестирования.
@@ -127,6 +153,71 @@ class AccountTest(models.Model):
     def __str__(self):
         return "{} {}".format(self.name, self.email)
 
+    @staticmethod
+    def normalize_email(email):
+        """
+        Email в нижнем регистре, так он хранится и ищется при входе.
+
+        :param email: Email.
+        :type email: str
+
+        :rtype: str
+
+        """
+        return (email or "").strip().lower()
+
+    def save(self, *args, **kwargs):
+        self.email = self.normalize_email(self.email)
+        super(AccountTest, self).save(*args, **kwargs)
+
+    def set_password(self, raw_password):
+        """
+        Хеширует и ставит пароль, без сохранения.
+
+        :param raw_password: Пароль.
+        :type raw_password: str
+
+        """
+        self.password = make_password(raw_password, hasher=get_setting("ACCOUNT_PASSWORD_HASHER"))
+
+    def has_usable_hash(self):
+        """
+        Хранится ли пароль в виде хеша. Старые аккаунты хранят пароль как есть.
+
+        :rtype: bool
+
+        """
+        try:
+            identify_hasher(self.password)
+        except ValueError:
+            return False
+        return True
+
+    def check_password(self, raw_password):
+        """
+        Проверяет пароль.
+
+        :param raw_password: Пароль.
+        :type raw_password: str
+
+        :rtype: bool
+
+        """
+        if self.has_usable_hash():
+            return check_password(raw_password, self.password, setter=self.upgrade_password)
+        return constant_time_compare(raw_password or "", self.password)
+
+    def upgrade_password(self, raw_password):
+        """
+        Перехеширует пароль со старым хешером или числом итераций после успешной проверки.
+
+        :param raw_password: Пароль.
+        :type raw_password: str
+
+        """
+        self.set_password(raw_password)
+        self.save(update_fields=["password"])
+
     def get_auth_token(self):
         """
         Получает токен пользователя.
@@ -135,40 +226,187 @@ class AccountTest(models.Model):
         :rtype: str
 
         """
-        try:
-            return Token.objects.get().token
-        except Token.DoesNotExist:
-            return Token.objects.create(account=self).token
-        except Token.MultipleObjectsReturned:
-            Token.objects.filter(account=self).delete()
-            return Token.objects.create(account=self).token
+        token = Token.objects.active().filter(account=self).order_by("-created").first()
+        if token is None:
+            token = Token.objects.create(account=self)
+        return token.token
 
     def __repr__(self):
         return self.__str__()
 
 
+class TokenQuerySet(models.QuerySet):
+    """
+    Выборки токенов.
+
+    """
+    def get_expire_border(self):
+        """
+        Токены, выданные раньше этой даты, считаются устаревшими.
+
+        :rtype: datetime.datetime
+
+        """
+        return timezone.now() - get_setting("TOKEN_LIFETIME")
+
+    def active(self):
+        return self.filter(created__gt=self.get_expire_border())
+
+    def expired(self):
+        return self.filter(created__lte=self.get_expire_border())
+
+    def purge_expired(self, batch_size=1000):
+        """
+        Удаляет устаревшие токены пачками.
+
+        :param batch_size: Размер пачки.
+        :type batch_size: int
+
+        :return: Количество удаленных токенов.
+        :rtype: int
+
+        """
+        deleted = 0
+        while True:
+            ids = list(self.expired().values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            deleted += self.model.objects.filter(pk__in=ids).delete()[0]
+
+
 class Token(models.Model):
     """
     Токен для авторизации пользователя.
 
     """
+    TOKEN_LENGTH = 50
+    ISSUE_ATTEMPTS = 5
+
     account = models.ForeignKey(AccountTest, verbose_name="Токен для аккаунта", related_name="token_account")
-    token = models.CharField("Токен для авторизации", max_length=150)
+    token = models.CharField("Токен для авторизации", max_length=150, unique=True)
+    created = models.DateTimeField("Дата выдачи", default=timezone.now, db_index=True)
+
+    objects = TokenQuerySet.as_manager()
 
     def save(self, *args, **kwargs):
         """
         Заводим токен для авторизации.
 
+        Уникальность проверяет индекс, при коллизии генерируем токен заново.
+
+        """
+        if self.token:
+            return super(Token, self).save(*args, **kwargs)
+
+        for attempt in range(self.ISSUE_ATTEMPTS):
+            self.token = get_random_string(self.TOKEN_LENGTH)
+            try:
+                with transaction.atomic():
+                    return super(Token, self).save(*args, **kwargs)
+            except IntegrityError:
+                if attempt + 1 == self.ISSUE_ATTEMPTS:
+                    raise
+
+    def rotate(self):
+        """
+        Выдает новый токен вместо текущего.
+
+        """
+        self.token = ""
+        self.created = timezone.now()
+        self.save()
+
+    @property
+    def expires(self):
+        """
+        Дата, когда токен устареет.
+
+        :rtype: datetime.datetime
+
+        """
+        return self.created + get_setting("TOKEN_LIFETIME")
+
+
+class TestQuerySet(models.QuerySet):
+    """
+    Переходы прохождения между статусами.
+
+    Каждый переход - один UPDATE с условием на текущий статус, поэтому из
+    параллельных запросов переход выполнит только один.
+
+    """
+    def start(self, account, test_case, now=None, **fields):
+        """
+        Начинает прохождение и ставит срок окончания по времени на тест.
+
+        :param account: Аккаунт тестирования.
+        :param test_case: Тест.
+        :param now: Время начала.
+        :param fields: Остальные поля для записи, например набор вопросов.
+        :type account: AccountTest
+        :type test_case: TestCase
+        :type now: datetime.datetime
+
+        :return: Начато ли прохождение.
+        :rtype: bool
+
+        """
+        now = now or timezone.now()
+        return bool(self.filter(account=account, test_case=test_case, status=Test.STATUS_NEW).update(
+            status=Test.STATUS_STARTED, date_start=now, deadline=now + test_case.time_to_test, **fields
+        ))
+
+    def finish(self, pk, now=None, **fields):
+        """
+        Завершает начатое прохождение, если срок еще не вышел.
+
+        :param pk: id прохождения.
+        :param now: Время окончания.
+        :param fields: Остальные поля для записи, например результаты проверки.
+        :type pk: int
+        :type now: datetime.datetime
+
+        :return: Завершено ли прохождение.
+        :rtype: bool
+
+        """
+        now = now or timezone.now()
+        border = now - get_setting("TEST_DEADLINE_GRACE")
+        return bool(self.filter(
+            models.Q(deadline__isnull=True) | models.Q(deadline__gt=border),
+            pk=pk, status=Test.STATUS_STARTED,
+        ).update(status=Test.STATUS_FINISHED, date_end=now, **fields))
+
+    def expired(self, now=None):
+        """
+        Начатые прохождения, у которых вышел срок.
+
+        :param now: Текущее время.
+        :type now: datetime.datetime
+
         """
-        token_str = None
-        while not token_str:
-            token = get_random_string(50)
-            if self.pk and not Token.objects.filter(token=token).exclude(pk=self.pk).exists():
-                token_str = token
-            elif not self.pk and not Token.objects.filter(token=token).exists():
-                token_str = token
-        self.token = token_str
-        super(Token, self).save(*args, **kwargs)
+        now = now or timezone.now()
+        return self.filter(status=Test.STATUS_STARTED, deadline__lte=now - get_setting("TEST_DEADLINE_GRACE"))
+
+    def expire(self, now=None):
+        """
+        Закрывает прохождения с вышедшим сроком, окончанием считается срок.
+
+        :param now: Текущее время.
+        :type now: datetime.datetime
+
+        :return: Количество закрытых прохождений.
+        :rtype: int
+
+        """
+        return self.expired(now).update(status=Test.STATUS_EXPIRED, date_end=models.F("deadline"))
+
+    def ungraded(self):
+        """
+        Закрытые по сроку прохождения без результата проверки.
+
+        """
+        return self.filter(status=Test.STATUS_EXPIRED, score__isnull=True)
 
 
 class Test(models.Model):
@@ -176,17 +414,60 @@ class Test(models.Model):
     Процесс тестирования.
 
     """
+    STATUS_NEW = "new"
+    STATUS_STARTED = "started"
+    STATUS_FINISHED = "finished"
+    STATUS_EXPIRED = "expired"
+    STATUS_CHOICES = (
+        (STATUS_NEW, "Не начат"),
+        (STATUS_STARTED, "Идет"),
+        (STATUS_FINISHED, "Завершен"),
+        (STATUS_EXPIRED, "Время вышло"),
+    )
+
     account = models.ForeignKey(AccountTest, verbose_name="Аккаунт для тестирования", related_name="account_test_result")
     test_case = models.ForeignKey(TestCase, verbose_name="Конкретный тест", related_name="testcase_test_result")
 
     date_start = models.DateTimeField("Дата начала тестирования", null=True, blank=True)
     date_end = models.DateTimeField("Дата окончания тестирования", null=True, blank=True)
+    deadline = models.DateTimeField("Срок окончания тестирования", null=True, blank=True)
+    status = models.CharField("Статус", max_length=16, choices=STATUS_CHOICES, default=STATUS_NEW)
 
     answers = models.TextField("Ответы аккаунта в формате JSON", blank=True)
 
+    seed = models.PositiveIntegerField("Зерно случайного набора вопросов", null=True, blank=True)
+    question_order = models.TextField("id вопросов в порядке показа в формате JSON", blank=True)
+
+    score = models.PositiveIntegerField("Правильных ответов", null=True, blank=True)
+    max_score = models.PositiveIntegerField("Всего вопросов", null=True, blank=True)
+    results = models.TextField("Правильность ответов по вопросам в формате JSON", blank=True)
+
+    objects = TestQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Тест для пользователя"
         verbose_name_plural = "Тесты для пользователя"
+        unique_together = (("account", "test_case"),)
+        indexes = [
+            # Идущие прохождения по сроку, для expire_tests.
+            models.Index(fields=["status", "deadline"]),
+            # Закрытые по сроку без результата, для expire_tests.
+            models.Index(fields=["status", "score"]),
+        ]
+
+    def is_overdue(self, now=None):
+        """
+        Вышел ли срок у начатого прохождения.
+
+        :param now: Текущее время.
+        :type now: datetime.datetime
+
+        :rtype: bool
+
+        """
+        if self.deadline is None:
+            return False
+        return self.deadline <= (now or timezone.now()) - get_setting("TEST_DEADLINE_GRACE")
 
     def __str__(self):
         return "{} {} ({}-{})".format(
@@ -195,3 +476,70 @@ class Test(models.Model):
 
     def __repr__(self):
         return self.__str__()
+
+
+class TestAnswer(models.Model):
+    """
+    Сохраненный ответ на вопрос в идущем прохождении.
+
+    Одна строка на вопрос, при завершении теста ответы собираются в Test.answers.
+
+    """
+    test = models.ForeignKey(Test, verbose_name="Прохождение", related_name="saved_answers")
+    question = models.ForeignKey(Question, verbose_name="Вопрос", related_name="+")
+
+    answers = models.TextField("id ответов в формате JSON", blank=True)
+    updated = models.DateTimeField("Дата сохранения", default=timezone.now)
+
+    class Meta:
+        verbose_name = "Сохраненный ответ"
+        verbose_name_plural = "Сохраненные ответы"
+        unique_together = (("test", "question"),)
+
+    def __str__(self):
+        return "{} {} {}".format(self.test_id, self.question_id, self.answers)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class QuestionStat(models.Model):
+    """
+    Статистика ответов на вопрос по проверенным прохождениям.
+
+    """
+    question = models.OneToOneField(Question, verbose_name="Вопрос", related_name="stat", primary_key=True)
+
+    attempts = models.PositiveIntegerField("Ответов", default=0)
+    correct = models.PositiveIntegerField("Правильных ответов", default=0)
+    pass_rate = models.FloatField("Доля правильных ответов", null=True, blank=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Статистика вопроса"
+        verbose_name_plural = "Статистика вопросов"
+
+    def __str__(self):
+        return "{} {}/{}".format(self.question_id, self.correct, self.attempts)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class AnswerStat(models.Model):
+    """
+    Сколько раз выбирали вариант ответа.
+
+    """
+    answer = models.OneToOneField(Answer, verbose_name="Ответ", related_name="stat", primary_key=True)
+
+    selected = models.PositiveIntegerField("Выбран раз", default=0)
+
+    class Meta:
+        verbose_name = "Статистика ответа"
+        verbose_name_plural = "Статистика ответов"
+
+    def __str__(self):
+        return "{} {}".format(self.answer_id, self.selected)
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,201 @@
+"""
+Случайные наборы вопросов по правилам теста.
+
+Тест с правилами (TestCaseRule) дает каждому прохождению свой набор: вопросы
+теста плюс по count случайных активных вопросов на каждую пару категория-сложность.
+Набор определяется зерном прохождения и сохраняется в Test.question_order.
+
+Для выборки в памяти процесса держится индекс: для каждой пары категория-сложность
+кортеж id активных вопросов. Индекс собирается одним запросом и пересобирается,
+когда сигналы меняют его версию в кеше. С кешем в памяти процесса смена версии
+не видна другим процессам, поэтому индекс там живет не дольше
+LOCAL_CACHE_TIMEOUT. Сама выборка - случайные индексы
+random.Random(seed) по кортежу, без ORDER BY RANDOM() в базе.
+
+"""
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from apps.utils.cache import is_shared_cache
+
+from .conf import get_setting, get_cache_timeout
+from .models import Question, TestCaseRule
+from .snapshots import get_test_case_payload
+
+VERSION_KEY = "quiz:pools:version"
+
+SEED_MAX = 2 ** 31 - 1
+
+_index = None
+_lock = threading.Lock()
+
+
+class PoolIndex(object):
+    """
+    id активных вопросов по парам категория-сложность.
+
+    """
+    def __init__(self, version):
+        self.version = version
+        self.built = time.monotonic()
+        self.pools = {}
+
+    def is_stale(self, version):
+        if self.version != version:
+            return True
+        local_timeout = get_setting("LOCAL_CACHE_TIMEOUT")
+        if local_timeout is None or is_shared_cache():
+            return False
+        return time.monotonic() - self.built >= local_timeout
+
+    @classmethod
+    def build(cls, version):
+        index = cls(version)
+        pools = defaultdict(list)
+        queryset = Question.objects.filter(
+            is_active=True, category__is_active=True
+        ).order_by("pk").values_list("pk", "category_id", "degree")
+        for pk, category_id, degree in queryset.iterator():
+            pools[(category_id, degree)].append(pk)
+        index.pools = {key: tuple(ids) for key, ids in pools.items()}
+        return index
+
+    def get(self, category_id, degree):
+        return self.pools.get((category_id, degree), ())
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def get_pool_index():
+    """
+    Индекс пулов вопросов, пересобирается при смене версии.
+
+    :rtype: PoolIndex
+
+    """
+    global _index
+    version = get_version()
+    index = _index
+    if index is None or index.is_stale(version):
+        with _lock:
+            if _index is None or _index.is_stale(version):
+                _index = PoolIndex.build(version)
+            index = _index
+    return index
+
+
+def invalidate_pools():
+    """
+    Меняет версию индекса, процессы пересоберут его при следующей выборке.
+
+    """
+    get_version()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Ключ успел истечь или вытесниться.
+        cache.add(VERSION_KEY, 1, None)
+
+
+def get_rules_cache_key(test_case_id):
+    return "quiz:testcase:{}:rules".format(test_case_id)
+
+
+def get_rules(test_case_id):
+    """
+    Правила набора вопросов теста.
+
+    :param test_case_id: id теста.
+    :type test_case_id: int
+
+    :return: Список (id категории, сложность, количество).
+    :rtype: list
+
+    """
+    key = get_rules_cache_key(test_case_id)
+    rules = cache.get(key)
+    if rules is None:
+        rules = list(TestCaseRule.objects.filter(test_case=test_case_id).order_by("pk").values_list(
+            "category_id", "degree", "count"
+        ))
+        cache.set(key, rules, get_cache_timeout("TEST_CASE_CACHE_TIMEOUT"))
+    return rules
+
+
+def invalidate_rules(test_case_id):
+    cache.delete(get_rules_cache_key(test_case_id))
+
+
+def make_seed():
+    return random.SystemRandom().randint(1, SEED_MAX)
+
+
+def make_paper(test_case, seed):
+    """
+    Набор вопросов для прохождения.
+
+    :param test_case: Тест.
+    :param seed: Зерно прохождения.
+    :type test_case: apps.quiz.models.TestCase
+    :type seed: int
+
+    :return: id вопросов в порядке показа, None - у теста нет правил.
+    :rtype: list
+
+    """
+    rules = get_rules(test_case.pk)
+    if not rules:
+        return None
+    rng = random.Random(seed)
+    index = get_pool_index()
+    paper = [item["id"] for item in get_test_case_payload(test_case)]
+    chosen = set(paper)
+    for category_id, degree, count in rules:
+        pool = index.get(category_id, degree)
+        if len(pool) <= count + len(chosen):
+            # Маленький пул: выбираем из того, что еще не взято.
+            sample = [i for i in pool if i not in chosen]
+            sample = rng.sample(sample, min(count, len(sample)))
+        else:
+            # Большой пул: случайные индексы с отбрасыванием уже взятых, в среднем count попыток.
+            sample = []
+            while len(sample) < count:
+                question_id = pool[rng.randrange(len(pool))]
+                if question_id not in chosen:
+                    sample.append(question_id)
+                    chosen.add(question_id)
+        paper.extend(sample)
+        chosen.update(sample)
+    rng.shuffle(paper)
+    return paper
+
+
+def get_rule_test_case_ids(question_ids):
+    """
+    id тестов, в набор которых вопросы могут попасть по правилам.
+
+    :param question_ids: id вопросов.
+    :type question_ids: collections.Iterable
+
+    :return: Список id тестов.
+    :rtype: list
+
+    """
+    buckets = set(Question.objects.filter(pk__in=list(question_ids)).values_list("category_id", "degree"))
+    if not buckets:
+        return []
+    condition = Q()
+    for category_id, degree in buckets:
+        condition |= Q(category_id=category_id, degree=degree)
+    return list(TestCaseRule.objects.filter(condition).values_list("test_case_id", flat=True).distinct())
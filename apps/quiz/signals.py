@@ -0,0 +1,117 @@
+"""
+Обработчики сигналов моделей.
+
+"""
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import AccountTest, Token, Question, Answer, Category, TestCase, TestCaseRule
+from .pools import invalidate_pools, invalidate_rules
+from .snapshots import invalidate_test_cases, invalidate_questions, get_test_case_ids
+from .tokens import invalidate_token, invalidate_account
+
+
+@receiver(post_init, sender=Token)
+def remember_token(sender, instance, **kwargs):
+    """
+    Запоминаем токен из базы, чтобы сбросить кеш при его смене.
+
+    """
+    instance._loaded_token = instance.token
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token_cache(sender, instance, **kwargs):
+    """
+    Сбрасываем кеш при смене или удалении токена.
+
+    """
+    invalidate_token(instance._loaded_token)
+    invalidate_token(instance.token)
+    instance._loaded_token = instance.token
+
+
+@receiver(post_save, sender=AccountTest)
+def invalidate_account_tokens_cache(sender, instance, created, **kwargs):
+    """
+    В кеше лежит сам аккаунт, поэтому при его изменении сбрасываем все его токены.
+
+    """
+    if created:
+        return
+    invalidate_account(instance.pk)
+    for token_str in Token.objects.filter(account=instance).values_list("token", flat=True):
+        invalidate_token(token_str)
+
+
+@receiver(post_delete, sender=AccountTest)
+def invalidate_account_cache(sender, instance, **kwargs):
+    """
+    Подписанные токены удаленного аккаунта перестают действовать со сбросом кеша.
+
+    """
+    invalidate_account(instance.pk)
+
+
+@receiver(post_save, sender=Question)
+@receiver(pre_delete, sender=Question)
+def invalidate_question_test_cases(sender, instance, **kwargs):
+    """
+    Сбрасываем слепки тестов, в которые входит вопрос, слепок самого вопроса и пулы вопросов.
+
+    """
+    invalidate_test_cases(get_test_case_ids(question_id=instance.pk))
+    invalidate_questions([instance.pk])
+    invalidate_pools()
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def invalidate_answer_test_cases(sender, instance, **kwargs):
+    """
+    Сбрасываем слепки тестов, в которые входит вопрос ответа, и слепок самого вопроса.
+
+    """
+    invalidate_test_cases(get_test_case_ids(question_id=instance.question_id))
+    invalidate_questions([instance.question_id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def invalidate_category_test_cases(sender, instance, **kwargs):
+    """
+    Сбрасываем слепки тестов и вопросов из категории и пулы вопросов.
+
+    """
+    invalidate_test_cases(get_test_case_ids(question__category_id=instance.pk))
+    invalidate_questions(Question.objects.filter(category_id=instance.pk).values_list("pk", flat=True))
+    invalidate_pools()
+
+
+@receiver(post_save, sender=TestCase)
+@receiver(post_delete, sender=TestCase)
+def invalidate_test_case(sender, instance, **kwargs):
+    invalidate_test_cases([instance.pk])
+
+
+@receiver(post_save, sender=TestCaseRule)
+@receiver(post_delete, sender=TestCaseRule)
+def invalidate_test_case_rules(sender, instance, **kwargs):
+    invalidate_rules(instance.test_case_id)
+
+
+@receiver(m2m_changed, sender=TestCase.questions.through)
+def invalidate_test_case_questions(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Сбрасываем слепки при изменении состава теста.
+
+    """
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        invalidate_test_cases([instance.pk])
+    elif action == "pre_clear":
+        invalidate_test_cases(get_test_case_ids(question_id=instance.pk))
+    else:
+        invalidate_test_cases(pk_set or [])
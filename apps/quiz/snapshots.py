@@ -0,0 +1,259 @@
+"""
+Слепки тестов.
+
+Вопросы, варианты ответов (без is_valid) и категории теста одинаковы для всех
+тестируемых, поэтому собираем их один раз и храним в кеше одним объектом.
+Для наборов вопросов, собранных по правилам теста, слепки хранятся по одному на вопрос.
+Кеш сбрасывается сигналами при изменении вопросов, ответов, категорий и состава теста.
+
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from . import grading
+from .conf import get_cache_timeout
+from .models import Answer, Category, Question, TestCase
+
+
+def get_cache_key(test_case_id):
+    """
+    Ключ кеша для слепка теста.
+
+    :param test_case_id: id теста.
+    :type test_case_id: int
+
+    :return: Ключ кеша.
+    :rtype: str
+
+    """
+    return "quiz:testcase:{}:payload".format(test_case_id)
+
+
+def get_question_cache_key(question_id):
+    """
+    Ключ кеша для слепка одного вопроса.
+
+    :param question_id: id вопроса.
+    :type question_id: int
+
+    :return: Ключ кеша.
+    :rtype: str
+
+    """
+    return "quiz:question:{}:payload".format(question_id)
+
+
+def compile_test_case(test_case_id):
+    """
+    Собирает слепок теста из базы.
+
+    :param test_case_id: id теста.
+    :type test_case_id: int
+
+    :return: Список вопросов с категориями и вариантами ответов.
+    :rtype: list
+
+    """
+    return compile_questions(Question.objects.filter(test_case=test_case_id))
+
+
+def compile_questions(queryset):
+    """
+    Собирает слепки вопросов из базы.
+
+    :param queryset: Выборка вопросов.
+    :type queryset: django.db.models.QuerySet
+
+    :return: Список вопросов с категориями и вариантами ответов по возрастанию id.
+    :rtype: list
+
+    """
+    questions = list(queryset.select_related("category").order_by("pk"))
+    answers = defaultdict(list)
+    queryset = Answer.objects.filter(
+        question_id__in=[q.pk for q in questions]
+    ).order_by("pk").values_list("pk", "question_id", "answer")
+    for pk, question_id, answer in queryset:
+        answers[question_id].append((pk, answer))
+
+    return [
+        {
+            "id": question.pk,
+            "degree": question.degree,
+            "question": question.question,
+            "is_active": question.is_active,
+            "category": (question.category_id, question.category.name),
+            "answers": answers[question.pk],
+        }
+        for question in questions
+    ]
+
+
+def get_test_case_payload(test_case):
+    """
+    Достает слепок теста из кеша, собирая его при промахе.
+
+    Кешируются только активные тесты.
+
+    :param test_case: Тест.
+    :type test_case: TestCase
+
+    :return: Слепок теста.
+    :rtype: list
+
+    """
+    key = get_cache_key(test_case.pk)
+    payload = cache.get(key)
+    if payload is None:
+        payload = compile_test_case(test_case.pk)
+        if test_case.is_active:
+            cache.set(key, payload, get_cache_timeout("TEST_CASE_CACHE_TIMEOUT"))
+    return payload
+
+
+def get_question_payloads(question_ids):
+    """
+    Слепки вопросов из кеша, недостающие собираются одним запросом.
+
+    :param question_ids: id вопросов.
+    :type question_ids: list
+
+    :return: Слепки вопросов в порядке question_ids, удаленные вопросы пропускаются.
+    :rtype: list
+
+    """
+    keys = {get_question_cache_key(i): i for i in question_ids}
+    payloads = {keys[key]: item for key, item in cache.get_many(list(keys)).items()}
+    missing = set(question_ids) - set(payloads)
+    if missing:
+        compiled = {item["id"]: item for item in compile_questions(Question.objects.filter(pk__in=missing))}
+        cache.set_many(
+            {get_question_cache_key(i): item for i, item in compiled.items()},
+            get_cache_timeout("TEST_CASE_CACHE_TIMEOUT")
+        )
+        payloads.update(compiled)
+    return [payloads[i] for i in question_ids if i in payloads]
+
+
+def set_prefetched(instance, name, objects):
+    """
+    Кладет связанные объекты в кеш prefetch_related, как если бы их выбрал prefetch_related(name).
+
+    :param instance: Объект модели.
+    :param name: Имя обратной связи.
+    :param objects: Связанные объекты.
+    :type instance: django.db.models.Model
+    :type name: str
+    :type objects: list
+
+    """
+    queryset = getattr(instance, name).all()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    if not hasattr(instance, "_prefetched_objects_cache"):
+        instance._prefetched_objects_cache = {}
+    instance._prefetched_objects_cache[name] = queryset
+
+
+def hydrate_questions(payload):
+    """
+    Вопросы из слепков.
+
+    Категории и варианты ответов сразу прикрепляются к вопросам,
+    поэтому question.category и question.answers.all() не ходят в базу.
+
+    :param payload: Слепки вопросов.
+    :type payload: list
+
+    :return: Список вопросов.
+    :rtype: list
+
+    """
+    questions = []
+    for item in payload:
+        category_id, category_name = item["category"]
+        question = Question(
+            id=item["id"],
+            degree=item["degree"],
+            question=item["question"],
+            is_active=item["is_active"],
+            category=Category(id=category_id, name=category_name),
+        )
+        set_prefetched(question, "answers", [
+            Answer(id=pk, question_id=question.pk, answer=answer) for pk, answer in item["answers"]
+        ])
+        questions.append(question)
+    return questions
+
+
+def get_test_case_questions(test_case):
+    """
+    Вопросы теста из слепка.
+
+    :param test_case: Тест.
+    :type test_case: TestCase
+
+    :return: Список вопросов.
+    :rtype: list
+
+    """
+    return hydrate_questions(get_test_case_payload(test_case))
+
+
+def get_paper_questions(question_ids):
+    """
+    Вопросы набора прохождения в порядке показа.
+
+    :param question_ids: id вопросов.
+    :type question_ids: list
+
+    :return: Список вопросов.
+    :rtype: list
+
+    """
+    return hydrate_questions(get_question_payloads(question_ids))
+
+
+def invalidate_test_cases(test_case_ids):
+    """
+    Сбрасывает слепки и ключи ответов тестов.
+
+    :param test_case_ids: id тестов.
+    :type test_case_ids: collections.Iterable
+
+    """
+    test_case_ids = set(test_case_ids)
+    keys = [get_cache_key(i) for i in test_case_ids] + [grading.get_cache_key(i) for i in test_case_ids]
+    if keys:
+        cache.delete_many(keys)
+
+
+def invalidate_questions(question_ids):
+    """
+    Сбрасывает слепки и ключи ответов отдельных вопросов.
+
+    :param question_ids: id вопросов.
+    :type question_ids: collections.Iterable
+
+    """
+    question_ids = set(question_ids)
+    keys = [get_question_cache_key(i) for i in question_ids]
+    keys += [grading.get_question_cache_key(i) for i in question_ids]
+    if keys:
+        cache.delete_many(keys)
+
+
+def get_test_case_ids(**filters):
+    """
+    id тестов, в которые входят вопросы по фильтру.
+
+    :param filters: Фильтр по связи тест-вопрос, например question_id=1.
+
+    :return: Список id тестов.
+    :rtype: list
+
+    """
+    return list(
+        TestCase.questions.through.objects.filter(**filters).values_list("testcase_id", flat=True).distinct()
+    )
@@ -0,0 +1,167 @@
+"""
+Статистика по вопросам.
+
+Каждое проверенное прохождение увеличивает счетчики в QuestionStat и AnswerStat
+несколькими UPDATE'ами, независимо от количества вопросов в тесте. Пересобрать
+статистику с нуля можно командой rebuild_question_stats.
+
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction, IntegrityError
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+from .grading import load_answers, load_results
+from .models import Question, Answer, QuestionStat, AnswerStat, Test
+
+
+def increment(model, key, ids, **values):
+    """
+    Увеличивает счетчики у строк статистики, создавая недостающие строки.
+
+    :param model: Модель статистики.
+    :param key: Поле, по которому ищем строки.
+    :param ids: Значения поля.
+    :param values: {счетчик: на сколько увеличить}
+    :type model: django.db.models.Model
+    :type key: str
+    :type ids: collections.Iterable
+    :type values: dict
+
+    """
+    ids = set(ids)
+    if not ids:
+        return
+    updates = {name: F(name) + value for name, value in values.items()}
+    lookup = "{}__in".format(key)
+    if model.objects.filter(**{lookup: ids}).update(**updates) == len(ids):
+        return
+
+    missing = ids - set(model.objects.filter(**{lookup: ids}).values_list(key, flat=True))
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create([model(**dict(values, **{key: i})) for i in missing])
+    except IntegrityError:
+        # Часть строк создали параллельно, пишем по одной.
+        for i in missing:
+            if model.objects.filter(**{key: i}).update(**updates):
+                continue
+            try:
+                with transaction.atomic():
+                    model.objects.create(**dict(values, **{key: i}))
+            except IntegrityError:
+                # Строку создали параллельно или объект уже удален.
+                model.objects.filter(**{key: i}).update(**updates)
+
+
+def update_pass_rate(question_ids):
+    """
+    Пересчитывает долю правильных ответов.
+
+    :param question_ids: id вопросов.
+    :type question_ids: collections.Iterable
+
+    """
+    QuestionStat.objects.filter(question_id__in=question_ids, attempts__gt=0).update(
+        pass_rate=Cast(F("correct"), FloatField()) / F("attempts")
+    )
+
+
+def record_test(test):
+    """
+    Учитывает проверенное прохождение в статистике.
+
+    :param test: Проверенное прохождение.
+    :type test: apps.quiz.models.Test
+
+    """
+    record_tests([test])
+
+
+def record_tests(tests):
+    """
+    Учитывает пачку проверенных прохождений.
+
+    Счетчики суммируются в памяти, строки с одинаковым приращением
+    обновляются одним UPDATE.
+
+    :param tests: Проверенные прохождения.
+    :type tests: collections.Iterable
+
+    """
+    attempts, correct, selected = Counter(), Counter(), Counter()
+    for test in tests:
+        for question_id, is_valid in load_results(test.results).items():
+            attempts[question_id] += 1
+            correct[question_id] += is_valid
+        for answer_ids in load_answers(test.answers).values():
+            selected.update(answer_ids)
+    if not attempts:
+        return
+
+    groups = defaultdict(list)
+    for question_id, count in attempts.items():
+        groups[(count, correct[question_id])].append(question_id)
+    for (count, correct_count), question_ids in groups.items():
+        values = {"attempts": count, "correct": correct_count} if correct_count else {"attempts": count}
+        increment(QuestionStat, "question_id", question_ids, **values)
+
+    groups = defaultdict(list)
+    for answer_id, count in selected.items():
+        groups[count].append(answer_id)
+    for count, answer_ids in groups.items():
+        increment(AnswerStat, "answer_id", answer_ids, selected=count)
+
+    update_pass_rate(attempts)
+
+
+def rebuild(chunk_size=2000):
+    """
+    Пересобирает статистику по всем проверенным прохождениям.
+
+    Прохождения читаются пачками, в памяти держатся только счетчики.
+
+    :param chunk_size: Прохождений в пачке.
+    :type chunk_size: int
+
+    :return: Количество учтенных прохождений.
+    :rtype: int
+
+    """
+    attempts, correct, selected = Counter(), Counter(), Counter()
+    queryset = Test.objects.exclude(results="").order_by("pk")
+    last_pk = processed = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).values_list("pk", "answers", "results")[:chunk_size])
+        if not rows:
+            break
+        for last_pk, answers, results in rows:
+            for question_id, is_valid in load_results(results).items():
+                attempts[question_id] += 1
+                correct[question_id] += is_valid
+            for answer_ids in load_answers(answers).values():
+                selected.update(answer_ids)
+        processed += len(rows)
+
+    # Статистику удаленных вопросов и ответов не переносим.
+    question_ids = set(Question.objects.values_list("pk", flat=True))
+    answer_ids = set(Answer.objects.values_list("pk", flat=True))
+
+    with transaction.atomic():
+        QuestionStat.objects.all().delete()
+        AnswerStat.objects.all().delete()
+        QuestionStat.objects.bulk_create([
+            QuestionStat(
+                question_id=question_id,
+                attempts=count,
+                correct=correct[question_id],
+                pass_rate=correct[question_id] / count,
+            )
+            for question_id, count in attempts.items() if question_id in question_ids
+        ], batch_size=500)
+        AnswerStat.objects.bulk_create([
+            AnswerStat(answer_id=answer_id, selected=count)
+            for answer_id, count in selected.items() if answer_id in answer_ids
+        ], batch_size=500)
+    return processed
@@ -0,0 +1,364 @@
+"""
+Синтетические данные для нагрузочных замеров и подбора индексов.
+
+Категории, вопросы с ответами, тесты, аккаунты и прохождения создаются
+bulk_create пачками. Строки генерируются по одной, а уже созданные читаются
+обратно по pk пачками, поэтому в памяти держится одна пачка, плюс id активных
+вопросов для состава тестов и ключи ответов тестов.
+
+Все случайные значения берутся из random.Random(seed): с одним зерном на
+пустой базе получается одна и та же база.
+
+"""
+import datetime
+import random
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .grading import collect_answer_key, dump_answers, dump_results, grade
+from .models import Answer, AccountTest, Category, Question, Test, TestCase
+
+
+DEFAULT_DEGREES = {
+    Question.DEGREE_JUNIOR: 4,
+    Question.DEGREE_MIDDLE: 3,
+    Question.DEGREE_SENIOR: 2,
+    Question.DEGREE_OTHER: 1,
+}
+
+DEFAULT_STATUSES = {
+    Test.STATUS_NEW: 5,
+    Test.STATUS_STARTED: 0,
+    Test.STATUS_FINISHED: 90,
+    Test.STATUS_EXPIRED: 5,
+}
+
+
+def parse_weights(text, choices, cast=str):
+    """
+    Разбирает веса распределения вида "1:40,2:30,3:20,4:10".
+
+    :param text: Строка с весами.
+    :param choices: Допустимые значения.
+    :param cast: Приведение значения.
+    :type text: str
+    :type choices: collections.Iterable
+    :type cast: callable
+
+    :return: {значение: вес}
+    :rtype: dict
+
+    """
+    weights = {}
+    for item in text.split(","):
+        value, sep, weight = item.strip().partition(":")
+        try:
+            value, weight = cast(value), float(weight)
+        except ValueError:
+            raise ValueError("Неверный вес `{}`.".format(item))
+        if not sep or value not in choices or weight < 0:
+            raise ValueError("Неверный вес `{}`.".format(item))
+        weights[value] = weight
+    if not any(weights.values()):
+        raise ValueError("Все веса нулевые.")
+    return weights
+
+
+def chunked(iterable, size):
+    """
+    Режет поток на списки по size элементов.
+
+    :rtype: collections.Iterator
+
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iterate_pks(queryset, batch_size):
+    """
+    pk выборки пачками по возрастанию, без загрузки всей выборки в память.
+
+    :rtype: collections.Iterator
+
+    """
+    last_pk = 0
+    while True:
+        pks = list(queryset.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return
+        last_pk = pks[-1]
+        yield pks
+
+
+class SyntheticReport(object):
+    """
+    Итог генерации: сколько строк каких моделей создано.
+
+    """
+    def __init__(self):
+        self.created = {}
+
+    def add(self, name, count):
+        self.created[name] = self.created.get(name, 0) + count
+
+    def __str__(self):
+        return ", ".join("{}: {}".format(name, count) for name, count in self.created.items())
+
+
+class SyntheticData(object):
+    """
+    Генератор данных.
+
+    :param seed: Зерно случайных значений.
+    :param batch_size: Строк в пачке bulk_create.
+    :param progress: Вызывается после каждой пачки с названием модели и числом созданных строк.
+    :type seed: int
+    :type batch_size: int
+    :type progress: callable
+
+    """
+    def __init__(self, seed=0, batch_size=5000, progress=None):
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.progress = progress
+        self.now = timezone.now()
+        self.report = SyntheticReport()
+
+    def bulk_create(self, model, objects):
+        """
+        Создает объекты пачками.
+
+        :return: Количество созданных строк.
+        :rtype: int
+
+        """
+        count = 0
+        for chunk in chunked(objects, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(chunk)
+            count += len(chunk)
+            name = model.__name__
+            self.report.add(name, len(chunk))
+            if self.progress is not None:
+                self.progress(name, self.report.created[name])
+        return count
+
+    @staticmethod
+    def last_pk(model):
+        return model.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+
+    def create_categories(self, count, active=1.0):
+        """
+        :param count: Категорий.
+        :param active: Доля активных.
+        :type count: int
+        :type active: float
+
+        :return: id созданных категорий.
+        :rtype: list
+
+        """
+        start = self.last_pk(Category)
+        self.bulk_create(Category, (
+            Category(name="Категория {}".format(start + i), is_active=self.random.random() < active)
+            for i in range(1, count + 1)
+        ))
+        return list(Category.objects.filter(pk__gt=start).order_by("pk").values_list("pk", flat=True))
+
+    def create_questions(self, count, category_ids, degrees=None, active=1.0, answers=(4, 6)):
+        """
+        Вопросы и по answers[0]-answers[1] ответов на каждый, один из них правильный.
+
+        :param count: Вопросов.
+        :param category_ids: id категорий, вопросы распределяются равномерно.
+        :param degrees: Веса сложностей {сложность: вес}.
+        :param active: Доля активных вопросов.
+        :param answers: Минимум и максимум ответов на вопрос.
+        :type count: int
+        :type category_ids: list
+        :type degrees: dict
+        :type active: float
+        :type answers: tuple
+
+        """
+        degrees = degrees or DEFAULT_DEGREES
+        values, weights = list(degrees), list(degrees.values())
+        start = self.last_pk(Question)
+        self.bulk_create(Question, (
+            Question(
+                question="Вопрос {}".format(start + i),
+                category_id=self.random.choice(category_ids),
+                degree=self.random.choices(values, weights)[0],
+                is_active=self.random.random() < active,
+            )
+            for i in range(1, count + 1)
+        ))
+
+        def make_answers(question_ids):
+            for question_id in question_ids:
+                variants = self.random.randint(*answers)
+                correct = self.random.randrange(variants)
+                for i in range(variants):
+                    yield Answer(question_id=question_id, answer="Ответ {}".format(i + 1), is_valid=i == correct)
+
+        for question_ids in iterate_pks(Question.objects.filter(pk__gt=start), self.batch_size):
+            self.bulk_create(Answer, make_answers(question_ids))
+
+    def create_test_cases(self, count, questions_per_test, time_to_test=datetime.timedelta(hours=1)):
+        """
+        Активные тесты из случайных активных вопросов активных категорий.
+
+        :param count: Тестов.
+        :param questions_per_test: Вопросов в тесте.
+        :param time_to_test: Время на тест.
+        :type count: int
+        :type questions_per_test: int
+        :type time_to_test: datetime.timedelta
+
+        :return: id созданных тестов.
+        :rtype: list
+
+        """
+        question_ids = list(Question.objects.filter(
+            is_active=True, category__is_active=True
+        ).order_by("pk").values_list("pk", flat=True))
+        start = self.last_pk(TestCase)
+        self.bulk_create(TestCase, (
+            TestCase(name="Тест {}".format(start + i), is_active=True, time_to_test=time_to_test)
+            for i in range(1, count + 1)
+        ))
+        test_case_ids = list(TestCase.objects.filter(pk__gt=start).order_by("pk").values_list("pk", flat=True))
+        through = TestCase.questions.through
+        self.bulk_create(through, (
+            through(testcase_id=test_case_id, question_id=question_id)
+            for test_case_id in test_case_ids
+            for question_id in self.random.sample(question_ids, min(questions_per_test, len(question_ids)))
+        ))
+        return test_case_ids
+
+    def create_accounts(self, count, password="password"):
+        """
+        Аккаунты perf<n>@example.com с одним паролем.
+
+        :param count: Аккаунтов.
+        :param password: Пароль всех аккаунтов.
+        :type count: int
+        :type password: str
+
+        :return: pk, после которого начинаются созданные аккаунты.
+        :rtype: int
+
+        """
+        # Хеш один на всех, иначе генерация упрется в хеширование.
+        account = AccountTest()
+        account.set_password(password)
+        start = self.last_pk(AccountTest)
+        self.bulk_create(AccountTest, (
+            AccountTest(
+                name="Кандидат {}".format(start + i),
+                email="perf{}@example.com".format(start + i),
+                password=account.password,
+            )
+            for i in range(1, count + 1)
+        ))
+        return start
+
+    def create_tests(self, count, account_start, test_case_ids, statuses=None, correct=0.7):
+        """
+        Назначает тесты аккаунтам и создает прохождения.
+
+        Каждому аккаунту после account_start достается поровну тестов подряд со
+        случайного, пока не наберется count прохождений.
+
+        :param count: Прохождений.
+        :param account_start: pk, после которого идут аккаунты для прохождений.
+        :param test_case_ids: id тестов.
+        :param statuses: Веса статусов {статус: вес}.
+        :param correct: Доля правильных ответов в проверенных прохождениях.
+        :type count: int
+        :type account_start: int
+        :type test_case_ids: list
+        :type statuses: dict
+        :type correct: float
+
+        """
+        accounts = AccountTest.objects.filter(pk__gt=account_start)
+        per_account = -(-count // max(1, accounts.count()))
+        if count and (not test_case_ids or per_account > len(test_case_ids)):
+            raise ValueError("Прохождений больше, чем пар аккаунт-тест.")
+
+        statuses = statuses or DEFAULT_STATUSES
+        values, weights = list(statuses), list(statuses.values())
+        test_cases = {
+            test_case.pk: (
+                collect_answer_key(Answer.objects.filter(question__test_case=test_case)),
+                test_case.time_to_test,
+            )
+            for test_case in TestCase.objects.filter(pk__in=test_case_ids)
+        }
+        through = AccountTest.tests.through
+
+        for account_ids in iterate_pks(accounts, self.batch_size):
+            pairs = []
+            for account_id in account_ids:
+                offset = self.random.randrange(len(test_case_ids))
+                for i in range(min(per_account, count)):
+                    pairs.append((account_id, test_case_ids[(offset + i) % len(test_case_ids)]))
+                count -= min(per_account, count)
+            if not pairs:
+                return
+            self.bulk_create(through, (through(accounttest_id=a, testcase_id=t) for a, t in pairs))
+            self.bulk_create(Test, (
+                self.make_test(account_id, test_case_id, self.random.choices(values, weights)[0],
+                               test_cases[test_case_id], correct)
+                for account_id, test_case_id in pairs
+            ))
+
+    def make_test(self, account_id, test_case_id, status, test_case, correct):
+        """
+        Прохождение в статусе status: сроки, ответы и результат проверки.
+
+        :rtype: apps.quiz.models.Test
+
+        """
+        test = Test(account_id=account_id, test_case_id=test_case_id, status=status)
+        if status == Test.STATUS_NEW:
+            return test
+
+        answer_key, time_to_test = test_case
+        if status == Test.STATUS_STARTED:
+            test.date_start = self.now - time_to_test * self.random.random()
+        else:
+            test.date_start = self.now - datetime.timedelta(days=90) * self.random.random()
+        test.deadline = test.date_start + time_to_test
+        if status == Test.STATUS_STARTED:
+            return test
+
+        # Брошенное прохождение отвечено частично.
+        answered = 1.0 if status == Test.STATUS_FINISHED else self.random.random()
+        answers = {}
+        for question_id, (right, variants) in answer_key.items():
+            if self.random.random() >= answered:
+                continue
+            if self.random.random() < correct:
+                answers[question_id] = right
+            else:
+                answers[question_id] = frozenset([self.random.choice(sorted(variants))])
+
+        score, results = grade(answer_key, answers)
+        test.answers = dump_answers(answers)
+        test.results = dump_results(results)
+        test.score = score
+        test.max_score = len(answer_key)
+        if status == Test.STATUS_FINISHED:
+            test.date_end = test.date_start + time_to_test * self.random.uniform(0.2, 1)
+        else:
+            test.date_end = test.deadline
+        return test
@@ -1,3 +1,762 @@
-from django.test import TestCase
+import datetime
+import json
+import shutil
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, connection
+from django.test import TestCase as DjangoTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import autosave, grading, pools, stats, tokens
+from .conf import get_cache_timeout
+from .expiry import expire_tests
+from .middlewares import TestAccountMiddleware
+from .models import (
+    Category, Question, Answer, TestCase, TestCaseRule, AccountTest, Test, TestAnswer, QuestionStat, AnswerStat
+)
+
+
+class AdminChangelistQueriesTest(DjangoTestCase):
+    """
+    Количество запросов на страницу списка в админке не должно зависеть от количества строк.
+
+    """
+    MAX_QUERIES = 10
+
+    def setUp(self):
+        user = User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(user)
+
+    def create_rows(self, count):
+        offset = Question.objects.count()
+        for i in range(offset, offset + count):
+            category = Category.objects.create(name="Категория {}".format(i))
+            question = Question.objects.create(category=category, question="Вопрос {}".format(i))
+            Answer.objects.create(question=question, answer="Ответ", is_valid=True)
+            test_case = TestCase.objects.create(name="Тест {}".format(i), time_to_test=datetime.timedelta(hours=1))
+            test_case.questions.add(question)
+            account = AccountTest.objects.create(name="Имя {}".format(i), email="{}@example.com".format(i))
+            account.tests.add(test_case)
+            Test.objects.create(account=account, test_case=test_case, answers="{}")
+
+    def get_queries_count(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assert_constant_queries(self, url):
+        self.create_rows(2)
+        small = self.get_queries_count(url)
+        self.create_rows(20)
+        large = self.get_queries_count(url)
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, self.MAX_QUERIES)
+
+    def test_question_changelist(self):
+        self.assert_constant_queries("/admin/quiz/question/")
+
+    def test_test_changelist(self):
+        self.assert_constant_queries("/admin/quiz/test/")
+
+    def test_account_changelist(self):
+        self.assert_constant_queries("/admin/quiz/accounttest/")
+
+    def get_search_plan(self, model, search_term):
+        """
+        План запроса поиска админки.
+
+        :return: Строки плана одной строкой.
+        :rtype: str
+
+        """
+        model_admin = admin.site._registry[model]
+        queryset = model_admin.get_search_results(None, model.objects.all(), search_term)[0]
+        sql, params = queryset.query.sql_with_params()
+        explain = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN "}.get(connection.vendor)
+        if explain is None:
+            self.skipTest("План запроса только для SQLite и PostgreSQL.")
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # На маленькой таблице просмотр дешевле любого индекса.
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(explain + sql, params)
+            return "\n".join(str(row[-1]) for row in cursor.fetchall())
+
+    def test_question_search(self):
+        self.create_rows(3)
+        response = self.client.get("/admin/quiz/question/", {"q": "Вопрос 1"})
+        self.assertContains(response, "Вопрос 1")
+        self.assertNotContains(response, "Вопрос 2")
+        response = self.client.get("/admin/quiz/question/", {"q": "прос 2"})
+        self.assertContains(response, "Вопрос 2")
+        response = self.client.get("/admin/quiz/question/", {"q": str(Question.objects.first().pk)})
+        self.assertEqual(response.status_code, 200)
+
+        plan = self.get_search_plan(Question, str(Question.objects.first().pk))
+        self.assertRegex(plan, "PRIMARY KEY|quiz_question_pkey")
+        plan = self.get_search_plan(Question, "прос")
+        if connection.vendor == "postgresql":
+            self.assertIn("quiz_question_question_trgm", plan)
+        else:
+            # Поиск по подстроке на SQLite - просмотр таблицы вопросов.
+            self.assertRegex(plan, "SCAN (TABLE )?quiz_question")
+
+    def test_account_search(self):
+        self.create_rows(3)
+        AccountTest.objects.filter(email="1@example.com").update(information="Отдел продаж")
+        response = self.client.get("/admin/quiz/accounttest/", {"q": " 1@Example.com"})
+        self.assertContains(response, "Имя 1")
+        self.assertNotContains(response, "Имя 2")
+        response = self.client.get("/admin/quiz/accounttest/", {"q": "example"})
+        self.assertEqual(response.context["cl"].result_count, 3)
+        response = self.client.get("/admin/quiz/accounttest/", {"q": "продаж"})
+        self.assertEqual(response.context["cl"].result_count, 1)
+        response = self.client.get("/admin/quiz/test/", {"q": "1@example"})
+        self.assertEqual(response.context["cl"].result_count, 1)
+
+        plan = self.get_search_plan(AccountTest, "example")
+        if connection.vendor == "postgresql":
+            self.assertIn("quiz_accounttest_email_trgm", plan)
+        else:
+            self.assertRegex(plan, "SCAN (TABLE )?quiz_accounttest")
+
+
+class GradingTest(DjangoTestCase):
+    """
+    Проверка по ключу ответов из кеша.
+
+    """
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Категория")
+        self.question = Question.objects.create(category=category, question="Вопрос")
+        self.right = Answer.objects.create(question=self.question, answer="Верный", is_valid=True)
+        self.wrong = Answer.objects.create(question=self.question, answer="Неверный", is_valid=False)
+        self.test_case = TestCase.objects.create(name="Тест", time_to_test=datetime.timedelta(hours=1))
+        self.test_case.questions.add(self.question)
+
+    def get_score(self, answer):
+        answer_key = grading.get_answer_key(self.test_case.pk)
+        answers = grading.normalize_answers(answer_key, {self.question.pk: [answer.pk]})
+        return grading.grade(answer_key, answers)[0]
+
+    @override_settings(QUIZ={"LOCAL_CACHE_TIMEOUT": None})
+    def test_answer_change_changes_grade(self):
+        self.assertEqual(self.get_score(self.right), 1)
+        self.assertIsNotNone(cache.get(grading.get_cache_key(self.test_case.pk)))
+
+        self.right.is_valid = False
+        self.right.save()
+        self.wrong.is_valid = True
+        self.wrong.save()
+
+        self.assertEqual(self.get_score(self.right), 0)
+        self.assertEqual(self.get_score(self.wrong), 1)
+
+    def test_process_local_cache_is_short(self):
+        # LocMemCache по умолчанию: сброс из другого процесса сюда не дойдет, ключ живет LOCAL_CACHE_TIMEOUT.
+        self.assertEqual(self.get_score(self.right), 1)
+        self.assertIsNotNone(cache.get(grading.get_cache_key(self.test_case.pk)))
+        with mock.patch.object(cache, "set") as cache_set:
+            cache.delete(grading.get_cache_key(self.test_case.pk))
+            self.get_score(self.right)
+        self.assertEqual(cache_set.call_args[0][2], 5)
+
+    @override_settings(QUIZ={"LOCAL_CACHE_TIMEOUT": 0})
+    def test_process_local_cache_can_be_disabled(self):
+        self.assertEqual(self.get_score(self.right), 1)
+        self.assertIsNone(cache.get(grading.get_cache_key(self.test_case.pk)))
+
+    def test_shared_cache_keeps_full_timeout(self):
+        self.assertEqual(get_cache_timeout("TEST_CASE_CACHE_TIMEOUT"), 5)
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+            self.assertEqual(get_cache_timeout("TEST_CASE_CACHE_TIMEOUT"), 60 * 60 * 24)
+
+
+class ExpiryTest(DjangoTestCase):
+    """
+    Сборщик прохождений с вышедшим сроком.
+
+    """
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Категория")
+        self.question = Question.objects.create(category=category, question="Вопрос")
+        self.right = Answer.objects.create(question=self.question, answer="Верный", is_valid=True)
+        Answer.objects.create(question=self.question, answer="Неверный", is_valid=False)
+        self.test_case = TestCase.objects.create(name="Тест", time_to_test=datetime.timedelta(hours=1))
+        self.test_case.questions.add(self.question)
+        self.now = timezone.now()
+
+    def start_test(self, number, answered=True):
+        account = AccountTest.objects.create(name="Имя", email="{}@example.com".format(number))
+        Test.objects.create(account=account, test_case=self.test_case)
+        self.assertTrue(Test.objects.start(account, self.test_case, now=self.now - datetime.timedelta(hours=2)))
+        test = Test.objects.get(account=account)
+        if answered:
+            autosave.save_answer(test.pk, self.question.pk, [self.right.pk])
+        return test
+
+    def test_expire_grades_once(self):
+        tests = [self.start_test(i, answered=i % 2 == 0) for i in range(5)]
+        self.assertEqual(expire_tests(batch_size=2, now=self.now), 5)
+        self.assertEqual(expire_tests(batch_size=2, now=self.now), 0)
+
+        for test in Test.objects.filter(pk__in=[i.pk for i in tests]):
+            self.assertEqual(test.status, Test.STATUS_EXPIRED)
+            self.assertEqual(test.date_end, test.deadline)
+            self.assertEqual(test.score, 1 if test.answers != "{}" else 0)
+        stat = QuestionStat.objects.get(question=self.question)
+        self.assertEqual((stat.attempts, stat.correct), (5, 3))
+
+    def test_failed_batch_is_rolled_back(self):
+        test = self.start_test(1)
+        with mock.patch("apps.quiz.expiry.stats.record_tests", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                expire_tests(now=self.now)
+        test.refresh_from_db()
+        self.assertEqual((test.status, test.score), (Test.STATUS_STARTED, None))
+
+        self.assertEqual(expire_tests(now=self.now), 1)
+        test.refresh_from_db()
+        self.assertEqual((test.status, test.score), (Test.STATUS_EXPIRED, 1))
+
+    def test_ungraded_expired_are_graded(self):
+        test = self.start_test(1)
+        Test.objects.filter(pk=test.pk).expire(self.now)
+        self.assertEqual(expire_tests(now=self.now), 1)
+        test.refresh_from_db()
+        self.assertEqual(test.score, 1)
+
+
+@override_settings(QUIZ={"LOCAL_CACHE_TIMEOUT": None})
+class StatsTest(DjangoTestCase):
+    """
+    Счетчики статистики при параллельном создании строк.
+
+    """
+    def setUp(self):
+        category = Category.objects.create(name="Категория")
+        self.questions = [Question.objects.create(category=category, question=str(i)) for i in range(3)]
+        self.ids = [question.pk for question in self.questions]
+
+    def test_increment(self):
+        stats.increment(QuestionStat, "question_id", self.ids[:1], attempts=1)
+        stats.increment(QuestionStat, "question_id", self.ids, attempts=2, correct=1)
+        self.assertEqual(
+            list(QuestionStat.objects.order_by("pk").values_list("attempts", "correct")), [(3, 1), (2, 1), (2, 1)]
+        )
+
+    def test_parallel_create_keeps_increments(self):
+        stats.increment(QuestionStat, "question_id", self.ids[:1], attempts=5)
+        # Вставка пачкой упала: часть строк успел создать другой запрос.
+        with mock.patch.object(QuestionStat.objects, "bulk_create", side_effect=IntegrityError):
+            stats.increment(QuestionStat, "question_id", self.ids, attempts=1)
+        self.assertEqual(
+            list(QuestionStat.objects.order_by("pk").values_list("attempts", flat=True)), [6, 1, 1]
+        )
+
+
+class PaperTest(DjangoTestCase):
+    """
+    Случайные наборы вопросов по правилам теста.
+
+    """
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Категория", is_active=True)
+        other = Category.objects.create(name="Другая", is_active=True)
+        self.fixed = Question.objects.create(category=self.category, question="Обязательный", is_active=True)
+        self.pool = [
+            Question.objects.create(
+                category=self.category, degree=Question.DEGREE_MIDDLE, question=str(i), is_active=True
+            )
+            for i in range(20)
+        ]
+        Question.objects.create(
+            category=self.category, degree=Question.DEGREE_SENIOR, question="Другая сложность", is_active=True
+        )
+        Question.objects.create(
+            category=other, degree=Question.DEGREE_MIDDLE, question="Другая категория", is_active=True
+        )
+        self.test_case = TestCase.objects.create(name="Тест", time_to_test=datetime.timedelta(hours=1))
+        self.test_case.questions.add(self.fixed)
+
+    def add_rule(self, count):
+        TestCaseRule.objects.create(
+            test_case=self.test_case, category=self.category, degree=Question.DEGREE_MIDDLE, count=count
+        )
+
+    def test_without_rules(self):
+        self.assertIsNone(pools.make_paper(self.test_case, 1))
+
+    def test_paper(self):
+        self.add_rule(5)
+        paper = pools.make_paper(self.test_case, 1)
+        self.assertEqual(len(paper), 6)
+        self.assertEqual(len(set(paper)), 6)
+        self.assertIn(self.fixed.pk, paper)
+        self.assertTrue(set(paper) - {self.fixed.pk} <= {question.pk for question in self.pool})
+
+        self.assertEqual(pools.make_paper(self.test_case, 1), paper)
+        papers = {tuple(sorted(pools.make_paper(self.test_case, seed))) for seed in range(2, 12)}
+        self.assertGreater(len(papers), 1)
+
+    def test_small_pool(self):
+        self.add_rule(50)
+        self.assertEqual(len(pools.make_paper(self.test_case, 1)), 21)
+
+    def test_inactive_question_is_dropped(self):
+        self.add_rule(20)
+        self.assertEqual(len(pools.make_paper(self.test_case, 1)), 21)
+        self.pool[0].is_active = False
+        self.pool[0].save()
+        paper = pools.make_paper(self.test_case, 1)
+        self.assertEqual(len(paper), 20)
+        self.assertNotIn(self.pool[0].pk, paper)
+
+    @override_settings(QUIZ={})
+    def test_index_is_reused_with_process_local_cache(self):
+        index = pools.get_pool_index()
+        self.assertIs(pools.get_pool_index(), index)
+        with mock.patch("apps.quiz.pools.time.monotonic", return_value=index.built + 5):
+            self.assertIsNot(pools.get_pool_index(), index)
+
+    def test_start_saves_paper(self):
+        self.add_rule(5)
+        account = AccountTest.objects.create(name="Имя", email="candidate@example.com")
+        Test.objects.create(account=account, test_case=self.test_case)
+        seed = pools.make_seed()
+        paper = pools.make_paper(self.test_case, seed)
+        Test.objects.start(account, self.test_case, seed=seed, question_order=grading.dump_question_order(paper))
+        test = Test.objects.get(account=account)
+        self.assertEqual(json.loads(test.question_order), paper)
+        self.assertEqual(pools.make_paper(self.test_case, test.seed), paper)
+
+
+class AutosaveTestMixin(object):
+    """
+    Прохождение с двумя вопросами для автосохранения.
+
+    """
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Категория")
+        self.questions = [Question.objects.create(category=category, question="Вопрос {}".format(i)) for i in range(2)]
+        test_case = TestCase.objects.create(name="Тест", time_to_test=datetime.timedelta(hours=1))
+        account = AccountTest.objects.create(name="Имя", email="candidate@example.com")
+        self.test = Test.objects.create(account=account, test_case=test_case, status=Test.STATUS_STARTED)
+
+    def collect(self):
+        return autosave.collect_answers(self.test, [question.pk for question in self.questions])
+
+
+class AutosaveTest(AutosaveTestMixin, DjangoTestCase):
+    """
+    Автосохранение ответов строками TestAnswer.
+
+    """
+    def test_save_answer(self):
+        autosave.save_answer(self.test.pk, self.questions[0].pk, [3, 1])
+        autosave.save_answer(self.test.pk, self.questions[0].pk, [2])
+        autosave.save_answer(self.test.pk, self.questions[1].pk, [])
+        self.assertEqual(TestAnswer.objects.filter(test=self.test).count(), 2)
+        self.assertEqual(self.collect(), {self.questions[0].pk: [2], self.questions[1].pk: []})
+
+    def test_save_is_one_update(self):
+        autosave.save_answer(self.test.pk, self.questions[0].pk, [1])
+        with self.assertNumQueries(1):
+            autosave.save_answer(self.test.pk, self.questions[0].pk, [1, 2])
+        self.assertEqual(self.collect(), {self.questions[0].pk: [1, 2]})
+
+    def test_clear_answers(self):
+        autosave.save_answer(self.test.pk, self.questions[0].pk, [1])
+        autosave.clear_answers([self.test.pk])
+        self.assertEqual(self.collect(), {})
+
+
+class BufferedAutosaveTest(AutosaveTestMixin, DjangoTestCase):
+    """
+    Автосохранение через кеш со сбросом в базу.
+
+    """
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, True)
+        # Режим требует общего кеша, файловый кеш общий для процессов.
+        settings = self.settings(
+            QUIZ={"AUTOSAVE_MODE": "buffered", "AUTOSAVE_MAX_LAG": 30},
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location}},
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        super(BufferedAutosaveTest, self).setUp()
+
+    def test_save_is_one_update(self):
+        with self.assertNumQueries(0):
+            autosave.save_answer(self.test.pk, self.questions[0].pk, [1])
+            autosave.save_answer(self.test.pk, self.questions[0].pk, [1, 2])
+        self.assertEqual(self.collect(), {self.questions[0].pk: [1, 2]})
+
+    def test_flush(self):
+        autosave.save_answer(self.test.pk, self.questions[0].pk, [1])
+        autosave.save_answer(self.test.pk, self.questions[0].pk, [2])
+        autosave.save_answer(self.test.pk, self.questions[1].pk, [3])
+        self.assertFalse(TestAnswer.objects.exists())
+        self.assertEqual(autosave.get_stats()["pending"], 3)
+
+        # Повторные сохранения вопроса схлопываются в одну запись.
+        self.assertEqual(autosave.flush(batch_size=2), 2)
+        self.assertEqual(dict(TestAnswer.objects.values_list("question_id", "answers")), {
+            self.questions[0].pk: "[2]", self.questions[1].pk: "[3]",
+        })
+        self.assertEqual(autosave.get_stats()["pending"], 0)
+        self.assertEqual(autosave.flush(), 0)
+
+    def test_flush_skips_finished(self):
+        autosave.save_answer(self.test.pk, self.questions[0].pk, [1])
+        Test.objects.filter(pk=self.test.pk).update(status=Test.STATUS_FINISHED)
+        self.assertEqual(autosave.flush(), 0)
+        self.assertFalse(TestAnswer.objects.exists())
+
+    def test_max_lag_flushes(self):
+        with mock.patch("apps.quiz.autosave.time.time", return_value=1000):
+            autosave.save_answer(self.test.pk, self.questions[0].pk, [1])
+        self.assertFalse(TestAnswer.objects.exists())
+        with mock.patch("apps.quiz.autosave.time.time", return_value=1031):
+            autosave.save_answer(self.test.pk, self.questions[1].pk, [2])
+        self.assertEqual(TestAnswer.objects.count(), 2)
+
+    def test_process_local_cache_is_refused(self):
+        autosave.check_autosave_mode()
+        with self.settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            with self.assertRaises(ImproperlyConfigured):
+                TestAccountMiddleware()
+
+
+class GraphQLTestMixin(object):
+    """
+    Запросы к /graph/.
+
+    """
+    def graphql(self, query, **extra):
+        response = self.client.post("/graph/", json.dumps({"query": query}), content_type="application/json", **extra)
+        return json.loads(response.content.decode())
+
+
+class PersistedQueryTest(DjangoTestCase):
+    """
+    Разбор extensions.persistedQuery.
+
+    """
+    def post(self, extensions):
+        body = {"query": "{__typename}", "extensions": extensions}
+        return self.client.post("/graph/", json.dumps(body), content_type="application/json")
+
+    def test_invalid_extensions(self):
+        for extensions in ([1], 1, "[1]", "{", {"persistedQuery": "abc"}, {"persistedQuery": {"sha256Hash": [1]}}):
+            response = self.post(extensions)
+            self.assertEqual(response.status_code, 400, extensions)
+
+    def test_without_hash(self):
+        self.assertEqual(self.post({"persistedQuery": {}}).status_code, 200)
+
+
+class TimingTest(GraphQLTestMixin, DjangoTestCase):
+    """
+    Замеры запросов в extensions.timing.
+
+    """
+    def setUp(self):
+        account = AccountTest(name="Имя", email="candidate@example.com")
+        account.set_password("secret")
+        account.save()
+
+    def test_extensions(self):
+        query = 'query Login {login(email: "candidate@example.com", password: "secret") {name}}'
+        expected = self.graphql(query)
+        with self.settings(GRAPHENE=dict(settings.GRAPHENE, TIMING=True, TIMING_EXTENSIONS=True)):
+            with self.assertLogs("apps.utils.graphql.timing") as logs:
+                result = self.graphql(query)
+        timing = result.pop("extensions")["timing"]
+        self.assertEqual(result, expected)
+        self.assertGreater(timing["sql"]["count"], 0)
+        self.assertIn("RootQuery.login", [item["path"] for item in timing["execution"]["resolvers"]])
+
+        log = json.loads(logs.records[0].getMessage())
+        self.assertEqual((log["operation"], log["sql_count"]), ("Login", timing["sql"]["count"]))
+        self.assertEqual(log["response_bytes"], len(json.dumps(expected, separators=(",", ":")).encode("utf-8")))
+
+
+class LoginTest(GraphQLTestMixin, DjangoTestCase):
+    """
+    Вход аккаунта тестирования.
+
+    """
+    def setUp(self):
+        cache.clear()
+        self.account = AccountTest(name="Имя", email=" Candidate@Example.com ")
+        self.account.set_password("secret")
+        self.account.save()
+
+    def login(self, email, password="secret"):
+        return self.graphql('{login(email: "%s", password: "%s") {email}}' % (email, password))
+
+    def test_email_is_case_insensitive(self):
+        self.assertEqual(self.account.email, "candidate@example.com")
+        result = self.login("CANDIDATE@example.com")
+        self.assertEqual(result["data"]["login"]["email"], "candidate@example.com")
+        self.assertIn("errors", self.login("candidate@example.com", "wrong"))
+
+    def test_default_hasher(self):
+        self.assertTrue(self.account.password.startswith("pbkdf2_sha256$"))
+
+    def test_legacy_hash_is_upgraded(self):
+        AccountTest.objects.filter(pk=self.account.pk).update(
+            password=make_password("secret", hasher="quiz_pbkdf2_sha256")
+        )
+        self.assertNotIn("errors", self.login("candidate@example.com"))
+        self.account.refresh_from_db()
+        self.assertTrue(self.account.password.startswith("pbkdf2_sha256$"))
+        self.assertTrue(self.account.check_password("secret"))
+
+
+class TestStateTest(GraphQLTestMixin, DjangoTestCase):
+    """
+    Переходы прохождения: начало, автосохранение, завершение и закрытие по сроку.
+
+    """
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name="Категория")
+        self.question = Question.objects.create(category=category, question="Вопрос")
+        self.right = Answer.objects.create(question=self.question, answer="Верный", is_valid=True)
+        Answer.objects.create(question=self.question, answer="Неверный", is_valid=False)
+        self.test_case = TestCase.objects.create(name="Тест", time_to_test=datetime.timedelta(hours=1))
+        self.test_case.questions.add(self.question)
+        self.account = AccountTest(name="Имя", email="candidate@example.com")
+        self.account.set_password("secret")
+        self.account.save()
+        self.account.tests.add(self.test_case)
+        self.graphql('{login(email: "candidate@example.com", password: "secret") {email}}')
+
+    def start(self):
+        return self.graphql("{startTest(id: %d) {id}}" % self.test_case.pk)
+
+    def save_answer(self):
+        return self.graphql("mutation {saveAnswer(id: %d, question: %d, answers: [%d]) {answers}}" % (
+            self.test_case.pk, self.question.pk, self.right.pk
+        ))
+
+    def end(self):
+        return self.graphql("mutation {endTest(id: %d) {result {status score maxScore}}}" % self.test_case.pk)
+
+    def assertError(self, result, message):
+        self.assertIn(message, result["errors"][0]["message"])
+
+    def test_start_without_test_row(self):
+        self.assertError(self.start(), "не назначен")
+
+    def test_start_once(self):
+        Test.objects.create(account=self.account, test_case=self.test_case)
+        self.assertNotIn("errors", self.start())
+        self.assertError(self.start(), "уже начинали")
+        test = Test.objects.get(account=self.account)
+        self.assertEqual(test.status, Test.STATUS_STARTED)
+        self.assertEqual(test.deadline, test.date_start + self.test_case.time_to_test)
+
+    def test_save_answer_requires_start(self):
+        Test.objects.create(account=self.account, test_case=self.test_case)
+        self.assertError(self.save_answer(), "еще не начат")
+
+    def test_finish(self):
+        Test.objects.create(account=self.account, test_case=self.test_case)
+        self.start()
+        self.assertEqual(self.save_answer()["data"]["saveAnswer"]["answers"], [self.right.pk])
+        result = self.end()["data"]["endTest"]["result"]
+        self.assertEqual(result, {"status": "FINISHED", "score": 1, "maxScore": 1})
+        self.assertError(self.end(), "уже завершен")
+        self.assertEqual(QuestionStat.objects.get(question=self.question).attempts, 1)
+
+    def test_failed_finish_is_rolled_back(self):
+        Test.objects.create(account=self.account, test_case=self.test_case)
+        self.start()
+        self.save_answer()
+        with mock.patch("apps.quiz.graphql.mutations.stats.record_test", side_effect=RuntimeError):
+            self.assertIn("errors", self.end())
+        self.assertEqual(Test.objects.get(account=self.account).status, Test.STATUS_STARTED)
+        self.assertTrue(TestAnswer.objects.filter(question=self.question).exists())
+        self.assertEqual(self.end()["data"]["endTest"]["result"]["score"], 1)
+
+    def test_finish_after_deadline(self):
+        Test.objects.create(account=self.account, test_case=self.test_case)
+        self.start()
+        self.save_answer()
+        Test.objects.filter(account=self.account).update(deadline=timezone.now() - datetime.timedelta(hours=1))
+        self.assertError(self.save_answer(), "истекло")
+        self.assertError(self.end(), "истекло")
+        self.assertEqual(Test.objects.get(account=self.account).status, Test.STATUS_STARTED)
+
+        self.assertEqual(expire_tests(), 1)
+        test = Test.objects.get(account=self.account)
+        self.assertEqual((test.status, test.score, test.date_end), (Test.STATUS_EXPIRED, 1, test.deadline))
+
+
+class GraphQLQueriesTest(GraphQLTestMixin, DjangoTestCase):
+    """
+    Количество запросов к базе на GraphQL запрос не должно зависеть от количества тестов и вопросов.
+
+    """
+    def setUp(self):
+        cache.clear()
+        self.account = AccountTest(name="Имя", email="candidate@example.com")
+        self.account.set_password("secret")
+        self.account.save()
+        self.graphql('{login(email: "candidate@example.com", password: "secret") {email}}')
+        self.graphql("{user {email}}")  # Аккаунт по токену попадает в кеш.
+
+    def create_test_case(self, questions):
+        test_case = TestCase.objects.create(name="Тест", time_to_test=datetime.timedelta(hours=1))
+        for i in range(questions):
+            category = Category.objects.create(name="Категория {}".format(i))
+            question = Question.objects.create(category=category, question="Вопрос {}".format(i))
+            Answer.objects.create(question=question, answer="Верный", is_valid=True)
+            Answer.objects.create(question=question, answer="Неверный")
+            test_case.questions.add(question)
+        self.account.tests.add(test_case)
+        Test.objects.create(account=self.account, test_case=test_case)
+        return test_case
+
+    def get_queries_count(self, query):
+        with CaptureQueriesContext(connection) as context:
+            result = self.graphql(query)
+        self.assertNotIn("errors", result)
+        return len(context.captured_queries)
+
+    def test_user_tests(self):
+        query = "{user {tests {id name statusTest}}}"
+        self.create_test_case(1)
+        small = self.get_queries_count(query)
+        for i in range(5):
+            self.create_test_case(1)
+        self.assertEqual(self.get_queries_count(query), small)
+
+    def test_start_test(self):
+        query = "{startTest(id: %d) {id statusTest questions {id question category answers {id answer}}}}"
+        small = self.get_queries_count(query % self.create_test_case(2).pk)
+        large = self.get_queries_count(query % self.create_test_case(10).pk)
+        self.assertEqual(small, large)
+
+    def test_question_stats(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+        query = "{questionStats(ids: [%s]) {questionId answers {answerId selected}}}"
+
+        def get_stats_queries_count():
+            ids = []
+            for question in Question.objects.filter(stat=None):
+                QuestionStat.objects.create(question=question, attempts=1, correct=1, pass_rate=1)
+                for answer in question.answers.all():
+                    AnswerStat.objects.create(answer=answer, selected=1)
+                ids.append(str(question.pk))
+            return self.get_queries_count(query % ", ".join(ids))
+
+        self.create_test_case(2)
+        small = get_stats_queries_count()
+        self.create_test_case(10)
+        self.assertEqual(get_stats_queries_count(), small)
+
+
+class TokenCacheTest(DjangoTestCase):
+    """
+    Аккаунты в LRU процесса.
+
+    """
+    def setUp(self):
+        cache.clear()
+        tokens.local_cache.clear()
+        self.account = AccountTest.objects.create(name="Имя", email="candidate@example.com")
+        self.key = tokens.get_account_cache_key(self.account.pk)
+
+    def test_copy_per_request(self):
+        first = tokens.get_account(self.account.pk)
+        first.name = "Другое"
+        second = tokens.get_account(self.account.pk)
+        self.assertIsNot(second, first)
+        self.assertEqual((second.pk, second.name), (self.account.pk, "Имя"))
+        self.assertEqual(tokens.local_cache.stats()["hits"], 1)
+
+    def test_local_cache_timeout(self):
+        now = time.monotonic()
+        tokens.get_account(self.account.pk)
+        # TOKEN_LOCAL_CACHE_TIMEOUT = 10, но не дольше LOCAL_CACHE_TIMEOUT = 5.
+        with mock.patch("apps.utils.cache.time.monotonic", return_value=now + 5.5):
+            self.assertIsNone(tokens.local_cache.get(self.key))
+
+    @override_settings(QUIZ={"LOCAL_CACHE_TIMEOUT": 0})
+    def test_local_cache_disabled(self):
+        self.assertEqual(tokens.get_account(self.account.pk), self.account)
+        self.assertEqual(len(tokens.local_cache), 0)
+
+
+class SignedTokenTest(GraphQLTestMixin, DjangoTestCase):
+    """
+    Вход по подписанному токену в режиме AUTH_MODE = "signed".
+
+    """
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, True)
+        # Режим требует общего кеша, файловый кеш общий для процессов.
+        settings = self.settings(
+            QUIZ={"AUTH_MODE": "signed"},
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location}},
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        tokens.local_cache.clear()
+        self.account = AccountTest(name="Имя", email="candidate@example.com")
+        self.account.set_password("secret")
+        self.account.save()
+        result = self.graphql('{login(email: "candidate@example.com", password: "secret") {token}}')
+        self.token = result["data"]["login"]["token"]
+
+    def user(self, token):
+        return self.graphql("{user {email}}", HTTP_AUTHORIZATION="Bearer {}".format(token))
+
+    def test_verify(self):
+        self.assertEqual(self.user(self.token)["data"]["user"]["email"], "candidate@example.com")
+        self.assertEqual(tokens.get_account_by_signed_token(self.token), self.account)
+        self.assertIsNone(tokens.get_account_by_signed_token(self.token[:-1]))
+        self.assertIsNone(tokens.get_account_by_signed_token(self.token.replace(str(self.account.pk), "0", 1)))
+
+    def test_expired(self):
+        with self.settings(QUIZ={"AUTH_MODE": "signed", "TOKEN_LIFETIME": datetime.timedelta(seconds=-1)}):
+            self.assertIsNone(tokens.get_account_by_signed_token(self.token))
+
+    def test_revoke(self):
+        result = self.graphql("mutation {logout {ok}}", HTTP_AUTHORIZATION="Bearer {}".format(self.token))
+        self.assertTrue(result["data"]["logout"]["ok"])
+        self.assertIsNone(tokens.get_account_by_signed_token(self.token))
+        self.assertIsNone(self.user(self.token)["data"]["user"])
+        self.assertFalse(tokens.revoke_signed_token("bad:token"))
+
+    def test_password_change(self):
+        self.assertIsNotNone(tokens.get_account_by_signed_token(self.token))
+        self.account.set_password("changed")
+        self.account.save()
+        self.assertIsNone(tokens.get_account_by_signed_token(self.token))
+
+    def test_process_local_cache_is_refused(self):
+        with self.settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            with self.assertRaises(ImproperlyConfigured):
+                TestAccountMiddleware()
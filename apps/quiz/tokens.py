@@ -0,0 +1,295 @@
+"""
+Токены для авторизации аккаунтов тестирования.
+
+Поиск аккаунта по токену идет через кеш: сначала LRU в памяти процесса,
+затем кеш django, и только потом база. Сброс LRU не виден другим процессам,
+поэтому аккаунт живет в нем не дольше LOCAL_CACHE_TIMEOUT, а каждый запрос
+получает из него свою копию аккаунта.
+
+В режиме AUTH_MODE = "signed" токен в базе не хранится: это id аккаунта,
+отпечаток хеша его пароля и время выдачи, подписанные SECRET_KEY, как у
+PasswordResetTokenGenerator. Подпись и срок проверяются в памяти, аккаунт
+достается через тот же кеш, смена пароля делает выданные токены
+недействительными, а выход из аккаунта кладет хеш токена в список отозванных
+в кеше django до конца срока жизни токена. Авторизация запроса в обычном
+случае обходится без запросов к базе.
+
+Список отозванных и сброс кеша аккаунта при смене пароля работают между
+процессами только с общим кешем, поэтому режим "signed" с кешем в памяти
+процесса не запускается, см. check_auth_mode.
+
+"""
+import copy
+import hashlib
+import time
+
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.baseconv import base62
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from apps.utils.cache import LRUCache, is_shared_cache
+
+from .conf import get_setting, get_cache_timeout, get_local_cache_timeout
+from .models import AccountTest, Token
+
+
+local_cache = LRUCache(maxsize=get_setting("TOKEN_LOCAL_CACHE_SIZE"))
+
+
+def get_local(key):
+    """
+    Достает аккаунт из LRU процесса.
+
+    :param key: Ключ кеша.
+    :type key: str
+
+    :return: Копия аккаунта или None: экземпляр из кеша не делится между запросами.
+    :rtype: apps.quiz.models.AccountTest
+
+    """
+    account = local_cache.get(key)
+    return copy.deepcopy(account) if account is not None else None
+
+
+def set_local(key, account, timeout=None):
+    """
+    Кладет копию аккаунта в LRU процесса на TOKEN_LOCAL_CACHE_TIMEOUT, см. get_local_cache_timeout.
+
+    :param key: Ключ кеша.
+    :param account: Аккаунт.
+    :param timeout: Предел срока в секундах, например до истечения токена.
+    :type key: str
+    :type account: apps.quiz.models.AccountTest
+    :type timeout: float
+
+    """
+    local_timeout = get_local_cache_timeout("TOKEN_LOCAL_CACHE_TIMEOUT")
+    if local_timeout is not None:
+        timeout = local_timeout if timeout is None else min(timeout, local_timeout)
+    if timeout is None or timeout > 0:
+        local_cache.set(key, copy.deepcopy(account), timeout)
+
+
+def get_cache_key(token_str):
+    """
+    Ключ кеша для токена.
+
+    :param token_str: Токен.
+    :type token_str: str
+
+    :return: Ключ кеша.
+    :rtype: str
+
+    """
+    return "quiz:token:{}".format(hashlib.sha256(token_str.encode()).hexdigest())
+
+
+def get_account_by_token(token_str):
+    """
+    Достает аккаунт по токену.
+
+    :param token_str: Токен.
+    :type token_str: str
+
+    :return: Аккаунт или None
+    :rtype: apps.quiz.models.AccountTest
+
+    """
+    key = get_cache_key(token_str)
+
+    account = get_local(key)
+    if account is not None:
+        return account
+
+    cached = cache.get(key)
+    if cached is None:
+        token = Token.objects.active().select_related("account").filter(token=token_str).first()
+        if token is None:
+            return None
+        cached = (token.account, token.expires)
+        timeout = int(min(get_cache_timeout("TOKEN_CACHE_TIMEOUT"), (token.expires - timezone.now()).total_seconds()))
+        if timeout > 0:
+            cache.set(key, cached, timeout)
+
+    account, expires = cached
+    timeout = (expires - timezone.now()).total_seconds()
+    if timeout <= 0:
+        return None
+    set_local(key, account, timeout)
+    return account
+
+
+def invalidate_token(token_str):
+    """
+    Сбрасывает кеш для токена.
+
+    :param token_str: Токен.
+    :type token_str: str
+
+    """
+    if not token_str:
+        return
+    key = get_cache_key(token_str)
+    local_cache.delete(key)
+    cache.delete(key)
+
+
+def is_signed_mode():
+    return get_setting("AUTH_MODE") == "signed"
+
+
+def check_auth_mode():
+    """
+    :raises ImproperlyConfigured: Режим "signed" с кешем в памяти процесса.
+
+    """
+    if is_signed_mode() and not is_shared_cache():
+        raise ImproperlyConfigured(
+            'QUIZ["AUTH_MODE"] = "signed" требует общего для процессов кеша: '
+            "отзыв токена и смена пароля в LocMemCache не видны другим процессам."
+        )
+
+
+def get_signer():
+    return signing.TimestampSigner(salt=get_setting("SIGNED_TOKEN_SALT"))
+
+
+def get_password_fingerprint(account):
+    """
+    Отпечаток хеша пароля аккаунта: меняется вместе с паролем.
+
+    :param account: Аккаунт.
+    :type account: apps.quiz.models.AccountTest
+
+    :rtype: str
+
+    """
+    return salted_hmac(get_setting("SIGNED_TOKEN_SALT"), account.password).hexdigest()[::2]
+
+
+def make_signed_token(account):
+    """
+    Выдает подписанный токен аккаунту.
+
+    :param account: Аккаунт.
+    :type account: apps.quiz.models.AccountTest
+
+    :return: Токен вида "id:отпечаток пароля:время выдачи:подпись".
+    :rtype: str
+
+    """
+    return get_signer().sign("{}:{}".format(account.pk, get_password_fingerprint(account)))
+
+
+def get_token_expires(token_str):
+    """
+    Время окончания срока жизни подписанного токена, по времени выдачи из него.
+
+    :param token_str: Токен с проверенной подписью.
+    :type token_str: str
+
+    :return: Unix время.
+    :rtype: float
+
+    """
+    issued = base62.decode(token_str.rsplit(":", 2)[1])
+    return issued + get_setting("TOKEN_LIFETIME").total_seconds()
+
+
+def get_revoked_key(token_str):
+    return "quiz:revoked:{}".format(hashlib.sha256(token_str.encode()).hexdigest())
+
+
+def get_account_cache_key(account_id):
+    return "quiz:account:{}".format(account_id)
+
+
+def get_account(account_id):
+    """
+    Достает аккаунт по id через кеш.
+
+    :param account_id: id аккаунта.
+    :type account_id: int
+
+    :return: Аккаунт или None
+    :rtype: apps.quiz.models.AccountTest
+
+    """
+    key = get_account_cache_key(account_id)
+
+    account = get_local(key)
+    if account is not None:
+        return account
+
+    account = cache.get(key)
+    if account is None:
+        account = AccountTest.objects.filter(pk=account_id).first()
+        if account is None:
+            return None
+        cache.set(key, account, get_cache_timeout("TOKEN_CACHE_TIMEOUT"))
+    set_local(key, account)
+    return account
+
+
+def invalidate_account(account_id):
+    """
+    Сбрасывает кеш аккаунта.
+
+    :param account_id: id аккаунта.
+    :type account_id: int
+
+    """
+    key = get_account_cache_key(account_id)
+    local_cache.delete(key)
+    cache.delete(key)
+
+
+def get_account_by_signed_token(token_str):
+    """
+    Проверяет подписанный токен и достает по нему аккаунт.
+
+    :param token_str: Токен.
+    :type token_str: str
+
+    :return: Аккаунт или None, если подпись неверна, срок вышел, пароль сменился или токен отозван.
+    :rtype: apps.quiz.models.AccountTest
+
+    """
+    try:
+        value = get_signer().unsign(token_str, max_age=get_setting("TOKEN_LIFETIME"))
+        account_id, fingerprint = value.split(":")
+        account_id = int(account_id)
+    except (signing.BadSignature, ValueError):
+        return None
+    if cache.get(get_revoked_key(token_str)):
+        return None
+    account = get_account(account_id)
+    if account is None or not constant_time_compare(fingerprint, get_password_fingerprint(account)):
+        return None
+    return account
+
+
+def revoke_signed_token(token_str):
+    """
+    Отзывает подписанный токен до конца его срока жизни.
+
+    :param token_str: Токен.
+    :type token_str: str
+
+    :return: Был ли токен действующим.
+    :rtype: bool
+
+    """
+    try:
+        get_signer().unsign(token_str, max_age=get_setting("TOKEN_LIFETIME"))
+    except signing.BadSignature:
+        return False
+    timeout = get_token_expires(token_str) - time.time()
+    if timeout <= 0:
+        return False
+    # Ключ живет на секунду дольше токена, чтобы не было окна на округлении.
+    cache.set(get_revoked_key(token_str), True, int(timeout) + 1)
+    return True
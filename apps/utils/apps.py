@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
 
 
 class UtilsConfig(AppConfig):
-    name = 'utils'
+    name = "apps.utils"
+
+    def ready(self):
+        from .db import check_connections
+        from .sqlite import apply_pragmas
+        connection_created.connect(apply_pragmas, dispatch_uid="apps.utils.sqlite.apply_pragmas")
+        request_started.connect(check_connections, dispatch_uid="apps.utils.db.check_connections")
@@ -0,0 +1,4 @@
+"""
+Бэкенды баз с пулом соединений, см. pool.py.
+
+"""
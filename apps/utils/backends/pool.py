@@ -0,0 +1,292 @@
+"""
+Пул соединений с базой в памяти процесса.
+
+Django открывает соединение на поток и закрывает его в конце запроса (при
+CONN_MAX_AGE = 0), либо держит его в потоке до CONN_MAX_AGE. Бэкенды из этого
+пакета вместо открытия берут соединение из пула, а вместо закрытия
+возвращают его туда, поэтому соединений в процессе не больше размера пула,
+сколько бы ни было потоков. С пулом CONN_MAX_AGE стоит оставить 0, чтобы
+соединение возвращалось в пул после каждого запроса.
+
+Настройки базы в DATABASES:
+    "ENGINE": "apps.utils.backends.postgresql" или "apps.utils.backends.sqlite3",
+    "POOL": {
+        "SIZE": 10,  # Максимум открытых соединений.
+        "TIMEOUT": 5,  # Секунд ждать свободного соединения.
+        "MAX_AGE": 600,  # Секунд жизни соединения, None - без ограничения.
+        "HEALTH_CHECKS": True,  # Проверять соединение перед выдачей из пула.
+    }
+
+Метрики пулов процесса отдает get_pool_stats().
+
+"""
+import threading
+import time
+
+from django.utils.functional import cached_property
+
+
+DEFAULTS = {
+    "SIZE": 10,
+    "TIMEOUT": 5,
+    "MAX_AGE": 600,
+    "HEALTH_CHECKS": True,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool(object):
+    """
+    Пул соединений одной базы.
+
+    :param connect: Открывает новое соединение драйвера.
+    :param size: Максимум открытых соединений.
+    :param timeout: Секунд ждать свободного соединения.
+    :param max_age: Секунд жизни соединения, None - без ограничения.
+    :param health_checks: Проверять соединение перед выдачей.
+    :type connect: callable
+    :type size: int
+    :type timeout: float
+    :type max_age: float
+    :type health_checks: bool
+
+    """
+    def __init__(self, connect, size, timeout, max_age, health_checks):
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.health_checks = health_checks
+        self.condition = threading.Condition()
+        self.idle = []  # (соединение, время открытия)
+        self.opened = {}  # id соединения: время открытия
+        self.total = 0  # Открытые и открываемые соединения.
+        self.in_use = 0
+        self.waiting = 0
+        self.created = 0
+        self.closed = 0
+        self.timeouts = 0
+        self.failed_checks = 0
+
+    def acquire(self):
+        """
+        Берет соединение из пула, открывая новое, если пул не заполнен.
+
+        :return: Соединение и признак, что оно уже было открыто раньше.
+        :rtype: tuple
+
+        :raises TimeoutError: Свободного соединения не дождались за timeout.
+
+        """
+        deadline = time.monotonic() + self.timeout
+        with self.condition:
+            self.waiting += 1
+            try:
+                while not self.idle and self.total >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise TimeoutError("Нет свободного соединения в пуле за {} с.".format(self.timeout))
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_use += 1
+            if self.idle:
+                connection, opened = self.idle.pop()
+            else:
+                # Место занимается сразу, а открывается соединение уже без блокировки.
+                connection, opened = None, None
+                self.total += 1
+
+        if connection is None:
+            return self.open(), False
+        if self.is_expired(opened) or (self.health_checks and not self.ping(connection)):
+            # Место остается за этим запросом, меняется только соединение.
+            self.close_raw(connection)
+            return self.open(), False
+        return connection, True
+
+    def open(self):
+        try:
+            connection = self.connect()
+        except Exception:
+            with self.condition:
+                self.total -= 1
+                self.in_use -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.opened[id(connection)] = time.monotonic()
+            self.created += 1
+        return connection
+
+    def release(self, connection):
+        """
+        Возвращает соединение в пул. Незавершенная транзакция откатывается.
+
+        """
+        try:
+            connection.rollback()
+            broken = False
+        except Exception:
+            broken = True
+        with self.condition:
+            self.in_use -= 1
+            opened = self.opened.get(id(connection))
+            if not broken and opened is not None and not self.is_expired(opened):
+                self.idle.append((connection, opened))
+                self.condition.notify()
+                return
+        self.close(connection)
+
+    def discard(self, connection):
+        """
+        Закрывает выданное соединение вместо возврата в пул, например после ошибки базы.
+
+        """
+        with self.condition:
+            self.in_use -= 1
+        self.close(connection)
+
+    def close(self, connection):
+        """
+        Закрывает соединение и освобождает его место в пуле.
+
+        """
+        self.close_raw(connection)
+        with self.condition:
+            self.total -= 1
+            self.condition.notify()
+
+    def close_raw(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self.condition:
+            self.opened.pop(id(connection), None)
+            self.closed += 1
+
+    def is_expired(self, opened):
+        return self.max_age is not None and time.monotonic() - opened >= self.max_age
+
+    def ping(self, connection):
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            finally:
+                cursor.close()
+        except Exception:
+            with self.condition:
+                self.failed_checks += 1
+            return False
+        return True
+
+    def close_idle(self):
+        """
+        Закрывает свободные соединения, выданные закроются при возврате.
+
+        """
+        with self.condition:
+            idle, self.idle = self.idle, []
+        for connection, opened in idle:
+            self.close(connection)
+
+    def get_stats(self):
+        """
+        Метрики пула.
+
+        :rtype: dict
+
+        """
+        with self.condition:
+            return {
+                "size": self.size,
+                "open": len(self.opened),
+                "idle": len(self.idle),
+                "in_use": self.in_use,
+                "waiting": self.waiting,
+                "created": self.created,
+                "closed": self.closed,
+                "timeouts": self.timeouts,
+                "failed_checks": self.failed_checks,
+            }
+
+
+def get_pool_stats():
+    """
+    Метрики всех пулов процесса.
+
+    :return: {алиас базы: метрики}
+    :rtype: dict
+
+    """
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.get_stats() for alias, pool in pools.items()}
+
+
+def close_pools():
+    """
+    Закрывает свободные соединения всех пулов процесса.
+
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_idle()
+
+
+class PooledDatabaseWrapperMixin(object):
+    """
+    Примесь к DatabaseWrapper бэкенда: соединения берутся из пула и возвращаются в него.
+
+    """
+    connection_reused = False  # Последнее соединение взято из пула уже открытым.
+
+    @cached_property
+    def pool_settings(self):
+        return dict(DEFAULTS, **self.settings_dict.get("POOL", {}))
+
+    def get_pool(self, conn_params):
+        pool = _pools.get(self.alias)
+        if pool is None:
+            with _pools_lock:
+                pool = _pools.get(self.alias)
+                if pool is None:
+                    options = self.pool_settings
+                    pool = _pools[self.alias] = ConnectionPool(
+                        lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params),
+                        size=options["SIZE"],
+                        timeout=options["TIMEOUT"],
+                        max_age=options["MAX_AGE"],
+                        health_checks=options["HEALTH_CHECKS"],
+                    )
+        return pool
+
+    def get_new_connection(self, conn_params):
+        try:
+            connection, self.connection_reused = self.get_pool(conn_params).acquire()
+        except TimeoutError as e:
+            raise self.Database.OperationalError(str(e))
+        return connection
+
+    def close_if_unusable_or_obsolete(self):
+        # Django оставляет соединение после ошибки, если оно отвечает, и снимает errors_occurred.
+        # Из пула его взял бы следующий запрос, поэтому такое соединение закрывается сразу.
+        if self.connection is not None and self.errors_occurred:
+            self.close()
+            return
+        super(PooledDatabaseWrapperMixin, self).close_if_unusable_or_obsolete()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        if self.errors_occurred:
+            # После ошибки базы состояние соединения неизвестно, следующему запросу его не отдаем.
+            _pools[self.alias].discard(self.connection)
+        else:
+            _pools[self.alias].release(self.connection)
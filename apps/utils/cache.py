@@ -0,0 +1,126 @@
+"""
+Кеши в памяти процесса.
+
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS
+
+
+# Бэкенды, у которых в каждом процессе свой кеш.
+PROCESS_LOCAL_BACKENDS = ("django.core.cache.backends.locmem.LocMemCache",)
+
+
+def is_shared_cache(alias=DEFAULT_CACHE_ALIAS):
+    """
+    Общий ли кеш у всех процессов.
+
+    Сброс ключа в кеше в памяти процесса не виден другим процессам, поэтому
+    данные, которые сбрасываются сигналами, в нем долго держать нельзя.
+
+    :param alias: Алиас кеша из CACHES.
+    :type alias: str
+
+    :rtype: bool
+
+    """
+    return settings.CACHES[alias]["BACKEND"] not in PROCESS_LOCAL_BACKENDS
+
+
+class LRUCache(object):
+    """
+    Потокобезопасный LRU кеш с временем жизни записей.
+
+    """
+    def __init__(self, maxsize=128, timeout=None):
+        """
+        :param maxsize: Максимальное количество записей.
+        :param timeout: Время жизни записи в секундах, None - бессрочно.
+        :type maxsize: int
+        :type timeout: int
+
+        """
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Достает значение из кеша.
+
+        :param key: Ключ.
+        :param default: Значение, если ключа нет или он устарел.
+
+        :return: Значение из кеша.
+
+        """
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, timeout=None):
+        """
+        Кладет значение в кеш, вытесняя самые старые записи.
+
+        :param key: Ключ.
+        :param value: Значение.
+        :param timeout: Время жизни записи, по умолчанию self.timeout.
+        :type timeout: int
+
+        """
+        timeout = self.timeout if timeout is None else timeout
+        expires = time.monotonic() + timeout if timeout is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """
+        Удаляет значение из кеша.
+
+        :param key: Ключ.
+
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """
+        Очищает кеш и счетчики.
+
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """
+        Статистика кеша.
+
+        :return: Попадания, промахи и размер.
+        :rtype: dict
+
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+    def __len__(self):
+        return len(self._data)
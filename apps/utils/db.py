@@ -0,0 +1,64 @@
+"""
+Вспомогательные функции для работы с базой.
+
+"""
+from django.db import connections
+from django.db.models import Case, When, Value
+
+
+def bulk_update(model, values, fields, using="default", batch_size=None):
+    """
+    Обновляет много строк разными значениями через UPDATE ... CASE, по запросу на пачку.
+
+    :param model: Модель.
+    :param values: {pk: {поле: значение}}
+    :param fields: Обновляемые поля.
+    :param using: Алиас базы.
+    :param batch_size: Строк на запрос, по умолчанию по лимиту параметров базы.
+    :type model: django.db.models.Model
+    :type values: dict
+    :type fields: list
+    :type using: str
+    :type batch_size: int
+
+    :return: Количество обновленных строк.
+    :rtype: int
+
+    """
+    if not batch_size:
+        # На строку уходит pk в WHERE и пара pk/значение на каждое поле.
+        max_params = 999 if connections[using].vendor == "sqlite" else 10000
+        batch_size = max(1, max_params // (len(fields) * 2 + 1))
+
+    pks = list(values)
+    updated = 0
+    for start in range(0, len(pks), batch_size):
+        batch = pks[start:start + batch_size]
+        updated += model._default_manager.using(using).filter(pk__in=batch).update(**{
+            field: Case(
+                *[When(pk=pk, then=Value(values[pk][field])) for pk in batch],
+                output_field=model._meta.get_field(field)
+            )
+            for field in fields
+        })
+    return updated
+
+
+def check_connections(**kwargs):
+    """
+    Обработчик request_started: проверяет постоянные соединения перед повторным использованием.
+
+    Соединение, оставшееся от прошлого запроса (CONN_MAX_AGE > 0), могло
+    оборваться на стороне базы или сети. Для баз с CONN_HEALTH_CHECKS = True оно
+    проверяется запросом и закрывается, если не работает, тогда первый запрос к
+    базе откроет новое. Сама django проверяет соединение, только если в нем уже
+    была ошибка.
+
+    """
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        if not connection.settings_dict.get("CONN_HEALTH_CHECKS", False):
+            continue
+        if not connection.is_usable():
+            connection.close()
@@ -0,0 +1,9 @@
+"""
+Настройки GraphQL view и замеров из settings.GRAPHENE.
+
+"""
+from django.conf import settings
+
+
+def get_settings():
+    return getattr(settings, "GRAPHENE", {})
@@ -0,0 +1,205 @@
+"""
+Замеры выполнения GraphQL запросов.
+
+Для каждой операции собирается: общее время, время резолверов по полям,
+количество и время SQL запросов и размер ответа. Результат пишется в лог
+одной строкой JSON, медленные операции - с уровнем WARNING. По настройке
+замеры добавляются в ответ в extensions.timing, по образцу Apollo tracing.
+
+Настройки в settings.GRAPHENE:
+    TIMING - включить замеры.
+    TIMING_EXTENSIONS - добавлять замеры в ответ.
+    TIMING_SLOW_MS - операции дольше этого помечаются как медленные.
+    TIMING_TOP_RESOLVERS - сколько самых долгих полей писать в лог.
+
+graphql-core 1.x не отдает резолверу путь в ответе, поэтому резолверы
+группируются по полю типа: "RootQuery.startTest", "QuestionType.answers".
+
+SQL считается через лог запросов соединения (force_debug_cursor):
+execute_wrapper появился только в django 2.0.
+
+"""
+import json
+import logging
+import time
+from collections import OrderedDict, deque
+
+from django.db import connections
+from promise import Promise
+
+from .conf import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def is_enabled():
+    return bool(get_settings().get("TIMING", False))
+
+
+class FieldTiming(object):
+    """
+    Время резолвера одного поля по всем его вызовам.
+
+    """
+    __slots__ = ("count", "total", "max", "first_start")
+
+    def __init__(self, start):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.first_start = start
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+
+class OperationTiming(object):
+    """
+    Замер одной операции.
+
+    """
+    def __init__(self):
+        self.operation_name = None
+        self.query_hash = None
+        self.fields = OrderedDict()
+        self.response_size = 0
+        self.started = time.perf_counter()
+        self.start_time = time.time()
+        self.duration = None
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self._saved = {}
+
+    def start_sql(self):
+        """
+        Включает лог SQL запросов на всех соединениях, в отдельный на время операции.
+
+        """
+        for connection in connections.all():
+            self._saved[connection.alias] = (connection.force_debug_cursor, connection.queries_log)
+            connection.queries_log = deque(maxlen=connection.queries_limit)
+            connection.force_debug_cursor = True
+
+    def stop_sql(self):
+        """
+        Считает SQL запросы операции и возвращает соединениям прежний лог и режим.
+
+        """
+        for connection in connections.all():
+            if connection.alias not in self._saved:
+                continue
+            queries = connection.queries_log
+            self.sql_count += len(queries)
+            self.sql_time += sum(float(query["time"]) for query in queries)
+            connection.force_debug_cursor, connection.queries_log = self._saved.pop(connection.alias)
+            if connection.queries_logged:
+                connection.queries_log.extend(queries)
+
+    def add_field(self, info, start, end):
+        path = "{}.{}".format(info.parent_type.name, info.field_name)
+        field = self.fields.get(path)
+        if field is None:
+            field = self.fields[path] = FieldTiming(start - self.started)
+        field.add(end - start)
+
+    def finish(self, response_size=0):
+        self.duration = time.perf_counter() - self.started
+        self.response_size = response_size
+
+    def is_slow(self):
+        return self.duration * 1000 >= get_settings().get("TIMING_SLOW_MS", 500)
+
+    def get_resolvers(self, limit=None):
+        """
+        Поля по убыванию суммарного времени резолверов.
+
+        :param limit: Сколько полей вернуть, None - все.
+        :type limit: int
+
+        :rtype: list
+
+        """
+        fields = sorted(self.fields.items(), key=lambda item: item[1].total, reverse=True)
+        return [
+            {
+                "path": path,
+                "count": field.count,
+                "startOffset": int(field.first_start * 1e9),
+                "duration": int(field.total * 1e9),
+                "maxDuration": int(field.max * 1e9),
+            }
+            for path, field in fields[:limit]
+        ]
+
+    def as_log(self):
+        """
+        Замер для строки лога, время в миллисекундах.
+
+        :rtype: dict
+
+        """
+        return OrderedDict([
+            ("operation", self.operation_name),
+            ("query_hash", self.query_hash),
+            ("duration_ms", round(self.duration * 1000, 3)),
+            ("sql_count", self.sql_count),
+            ("sql_ms", round(self.sql_time * 1000, 3)),
+            ("response_bytes", self.response_size),
+            ("slow", self.is_slow()),
+            ("resolvers", [
+                OrderedDict([
+                    ("path", item["path"]),
+                    ("count", item["count"]),
+                    ("total_ms", round(item["duration"] / 1e6, 3)),
+                    ("max_ms", round(item["maxDuration"] / 1e6, 3)),
+                ])
+                for item in self.get_resolvers(get_settings().get("TIMING_TOP_RESOLVERS", 10))
+            ]),
+        ])
+
+    def as_extension(self):
+        """
+        Замер для extensions.timing в ответе, время в наносекундах как в Apollo tracing.
+
+        :rtype: dict
+
+        """
+        return OrderedDict([
+            ("version", 1),
+            ("startTime", self.start_time),
+            ("duration", int(self.duration * 1e9)),
+            ("slow", self.is_slow()),
+            ("sql", {"count": self.sql_count, "duration": int(self.sql_time * 1e9)}),
+            ("execution", {"resolvers": self.get_resolvers()}),
+        ])
+
+    def log(self):
+        level = logging.WARNING if self.is_slow() else logging.INFO
+        logger.log(level, json.dumps(self.as_log(), ensure_ascii=False))
+
+
+class TimingMiddleware(object):
+    """
+    Middleware graphene, замеряет резолверы полей.
+
+    Замер операции берется из контекста (request.graphql_timing), без него
+    middleware ничего не делает. Если резолвер вернул Promise, время
+    считается до его выполнения.
+
+    """
+    def resolve(self, next, root, args, context, info):
+        timing = getattr(context, "graphql_timing", None)
+        if timing is None:
+            return next(root, args, context, info)
+
+        start = time.perf_counter()
+        result = next(root, args, context, info)
+        if Promise.is_thenable(result):
+            def on_resolve(value):
+                timing.add_field(info, start, time.perf_counter())
+                return value
+            return Promise.resolve(result).then(on_resolve)
+        timing.add_field(info, start, time.perf_counter())
+        return result
@@ -0,0 +1,280 @@
+"""
+View для GraphQL с кешем разобранных запросов.
+
+Настройки в settings.GRAPHENE:
+    DOCUMENT_CACHE_SIZE - сколько разобранных и проверенных запросов держать в памяти процесса.
+    PERSISTED_QUERIES - словарь {sha256: запрос} или путь до JSON файла с ним.
+    PERSISTED_QUERIES_ONLY - выполнять только запросы из PERSISTED_QUERIES.
+    TIMING, TIMING_EXTENSIONS, TIMING_SLOW_MS, TIMING_TOP_RESOLVERS - замеры запросов, см. timing.py.
+
+Операции query читают с реплик базы, если они настроены, см. apps/utils/routers.py.
+
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.http import HttpResponseNotAllowed
+from django.http.response import HttpResponseBadRequest
+from graphql import Source, parse, validate
+from graphql.error import GraphQLError
+from graphql.execution import ExecutionResult
+from graphql.utils.get_operation_ast import get_operation_ast
+from graphene_django.views import GraphQLView, HttpError
+
+from ..cache import LRUCache
+from ..routers import replica_reads
+from .conf import get_settings
+from .timing import OperationTiming, TimingMiddleware, is_enabled as is_timing_enabled
+
+
+def get_query_hash(query):
+    """
+    Хеш текста запроса.
+
+    :param query: Текст запроса.
+    :type query: str
+
+    :return: sha256 в hex.
+    :rtype: str
+
+    """
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+class PersistedQueries(object):
+    """
+    Белый список зарегистрированных запросов.
+
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._queries = None
+        self._lock = threading.Lock()
+
+    @property
+    def queries(self):
+        """
+        Зарегистрированные запросы, грузятся при первом обращении.
+
+        :return: {sha256: запрос}
+        :rtype: dict
+
+        """
+        if self._queries is None:
+            with self._lock:
+                if self._queries is None:
+                    self._queries = self.load(get_settings().get("PERSISTED_QUERIES"))
+        return self._queries
+
+    @staticmethod
+    def load(source):
+        """
+        :param source: Словарь или путь до JSON файла.
+
+        :return: {sha256: запрос}
+        :rtype: dict
+
+        """
+        if not source:
+            return {}
+        if isinstance(source, str):
+            with open(source, encoding="utf-8") as f:
+                source = json.load(f)
+        return {key.lower(): query for key, query in source.items()}
+
+    def get(self, query_hash):
+        """
+        Достает запрос по хешу.
+
+        :param query_hash: sha256 запроса.
+        :type query_hash: str
+
+        :return: Текст запроса или None
+        :rtype: str
+
+        """
+        query = self.queries.get(query_hash.lower())
+        if query is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return query
+
+    def __contains__(self, query_hash):
+        return query_hash in self.queries
+
+    def reset(self):
+        self._queries = None
+        self.hits = self.misses = 0
+
+
+document_cache = LRUCache(maxsize=get_settings().get("DOCUMENT_CACHE_SIZE", 256))
+persisted_queries = PersistedQueries()
+
+
+class CachedGraphQLView(GraphQLView):
+    """
+    GraphQLView, который не разбирает и не проверяет повторно одни и те же запросы.
+
+    Поддерживает persisted queries: клиент может прислать вместо запроса его хеш
+    в extensions.persistedQuery.sha256Hash.
+
+    """
+    document_cache = document_cache
+    persisted_queries = persisted_queries
+    timing_middleware = TimingMiddleware()
+
+    @classmethod
+    def get_cache_stats(cls):
+        """
+        Счетчики попаданий и промахов кешей.
+
+        :rtype: dict
+
+        """
+        return {
+            "documents": cls.document_cache.stats(),
+            "persisted_queries": {
+                "hits": cls.persisted_queries.hits,
+                "misses": cls.persisted_queries.misses,
+            },
+        }
+
+    @staticmethod
+    def get_persisted_hash(request, data):
+        """
+        Достает хеш persisted query из запроса.
+
+        :return: sha256 или None
+        :rtype: str
+
+        """
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if not extensions:
+            return None
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        if not isinstance(extensions, dict):
+            raise HttpError(HttpResponseBadRequest("Extensions must be an object."))
+        persisted = extensions.get("persistedQuery") or {}
+        if not isinstance(persisted, dict):
+            raise HttpError(HttpResponseBadRequest("Extensions persistedQuery must be an object."))
+        sha256_hash = persisted.get("sha256Hash")
+        if sha256_hash is not None and not isinstance(sha256_hash, str):
+            raise HttpError(HttpResponseBadRequest("Extensions persistedQuery.sha256Hash must be a string."))
+        return sha256_hash
+
+    def get_middleware(self, request):
+        middleware = super(CachedGraphQLView, self).get_middleware(request)
+        if getattr(request, "graphql_timing", None) is not None:
+            middleware = list(middleware or []) + [self.timing_middleware]
+        return middleware
+
+    def get_response(self, request, data, show_graphiql=False):
+        self._persisted_hash = self.get_persisted_hash(request, data)
+        if not is_timing_enabled() or show_graphiql:
+            return super(CachedGraphQLView, self).get_response(request, data, show_graphiql)
+
+        # Имя операции и хеш запроса замер получает в execute_graphql_request.
+        timing = request.graphql_timing = OperationTiming()
+        timing.start_sql()
+        try:
+            result, status_code = super(CachedGraphQLView, self).get_response(request, data, show_graphiql)
+        finally:
+            timing.stop_sql()
+            request.graphql_timing = None
+
+        timing.finish(len(result.encode("utf-8")) if result else 0)
+        timing.log()
+        if result and get_settings().get("TIMING_EXTENSIONS", False):
+            # Размер ответа известен только после кодирования, поэтому замеры добавляются в готовый ответ.
+            response = json.loads(result, object_pairs_hook=OrderedDict)
+            response["extensions"] = {"timing": timing.as_extension()}
+            result = self.json_encode(request, response)
+        return result, status_code
+
+    def get_document(self, query):
+        """
+        Разбирает и проверяет запрос, либо достает его из кеша.
+
+        :param query: Текст запроса.
+        :type query: str
+
+        :return: AST запроса и ошибки валидации.
+        :rtype: tuple
+
+        """
+        key = (id(self.schema), get_query_hash(query))
+        document = self.document_cache.get(key)
+        if document is not None:
+            return document, []
+
+        document = parse(Source(query, name="GraphQL request"))
+        validation_errors = validate(self.schema, document)
+        if not validation_errors:
+            self.document_cache.set(key, document)
+        return document, validation_errors
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        persisted_hash = getattr(self, "_persisted_hash", None)
+        persisted_only = get_settings().get("PERSISTED_QUERIES_ONLY", False)
+
+        if persisted_hash and not query:
+            query = self.persisted_queries.get(persisted_hash)
+            if query is None:
+                return ExecutionResult(errors=[GraphQLError("PersistedQueryNotFound")], invalid=True)
+        elif query and persisted_only and get_query_hash(query) not in self.persisted_queries:
+            return ExecutionResult(errors=[GraphQLError("PersistedQueryNotFound")], invalid=True)
+
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        try:
+            document_ast, validation_errors = self.get_document(query)
+            if validation_errors:
+                return ExecutionResult(
+                    errors=validation_errors,
+                    invalid=True,
+                )
+        except Exception as e:
+            return ExecutionResult(errors=[e], invalid=True)
+
+        operation_ast = get_operation_ast(document_ast, operation_name)
+
+        timing = getattr(request, "graphql_timing", None)
+        if timing is not None:
+            timing.query_hash = get_query_hash(query)
+            if operation_ast is not None:
+                timing.operation_name = operation_ast.name.value if operation_ast.name else operation_ast.operation
+
+        if request.method.lower() == "get":
+            if operation_ast and operation_ast.operation != "query":
+                if show_graphiql:
+                    return None
+
+                raise HttpError(HttpResponseNotAllowed(
+                    ["POST"], "Can only perform a {} operation from a POST request.".format(operation_ast.operation)
+                ))
+
+        try:
+            # Чтения query идут на реплики, записи и чтения после них - в основную базу.
+            with replica_reads(operation_ast is not None and operation_ast.operation == "query"):
+                return self.execute(
+                    document_ast,
+                    root_value=self.get_root_value(request),
+                    variable_values=variables,
+                    operation_name=operation_name,
+                    context_value=self.get_context(request),
+                    middleware=self.get_middleware(request),
+                    executor=self.executor,
+                )
+        except Exception as e:
+            return ExecutionResult(errors=[e], invalid=True)
@@ -0,0 +1,18 @@
+"""
+Удаление устаревших сессий.
+
+"""
+from django.core.management.base import BaseCommand
+
+from apps.utils.sessions import purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = "Удаляет устаревшие сессии всех движков пачками, вместо clearsessions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Размер пачки на удаление.")
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_sessions(batch_size=options["batch_size"])
+        self.stdout.write("Удалено сессий: {}".format(deleted))
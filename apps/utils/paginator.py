@@ -0,0 +1,48 @@
+"""
+Пагинаторы.
+
+"""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор, который для большой таблицы без фильтров берет оценку количества строк
+    из статистики базы вместо COUNT(*) по всей таблице.
+
+    """
+    # С какого количества строк верим оценке.
+    estimate_threshold = 10000
+
+    def get_estimate(self):
+        """
+        Оценка количества строк в таблице.
+
+        :return: Оценка или None, если база ее не дает.
+        :rtype: int
+
+        """
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+            elif connection.vendor == "sqlite":
+                # Для таблиц с автоинкрементом max(rowid) близок к количеству строк.
+                cursor.execute("SELECT MAX(rowid) FROM {}".format(connection.ops.quote_name(table)))
+            else:
+                return None
+            row = cursor.fetchone()
+        return row[0] if row and row[0] else None
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, "query") and not queryset.query.where and not queryset.query.distinct:
+            estimate = self.get_estimate()
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+        return super(EstimatedCountPaginator, self).count
@@ -0,0 +1,153 @@
+"""
+Чтение с реплик базы.
+
+ReplicaRouter отправляет чтения на реплики только внутри replica_reads(), его
+включает GraphQL view для операций query. Все остальное, включая записи,
+идет в базу по умолчанию, как без роутера.
+
+После первой записи запрос закрепляется за основной базой до конца, чтобы
+читать свои записи. ReplicaPinMiddleware переносит закрепление на следующие
+запросы клиента: после запроса с записью ставится cookie на
+DATABASE_REPLICA_PIN_SECONDS, пока оно живо, клиент читает только из основной
+базы и не видит отставания реплики, например, только что выданный токен.
+
+Настройки:
+    DATABASE_REPLICAS - алиасы реплик из DATABASES, пустой список - без реплик.
+    DATABASE_REPLICA_PIN_SECONDS - сколько секунд после записи читать из основной базы.
+    DATABASE_REPLICA_PIN_COOKIE - имя cookie закрепления.
+    DATABASE_PRIMARY_MODELS - модели "app_label.model", которые всегда читаются из основной базы.
+
+Локально реплику можно проверить на копии файла SQLite:
+    cp db.sqlite3 db-replica.sqlite3
+
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+try:
+    from django.utils.deprecation import MiddlewareMixin
+except ImportError:
+    MiddlewareMixin = object
+
+
+_state = threading.local()
+
+
+def get_replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def get_primary_models():
+    # Сессии пишутся при входе и читаются сразу в следующем запросе.
+    return getattr(settings, "DATABASE_PRIMARY_MODELS", ("sessions.session",))
+
+
+def reset(pinned=False):
+    """
+    Начинает запрос: без чтения с реплик и без записей.
+
+    :param pinned: Закрепить запрос за основной базой.
+    :type pinned: bool
+
+    """
+    _state.pinned = pinned
+    _state.wrote = False
+    _state.reads = 0
+    _state.replica = None
+
+
+def is_pinned():
+    return getattr(_state, "pinned", False)
+
+
+def has_written():
+    return getattr(_state, "wrote", False)
+
+
+def pin():
+    """
+    Закрепляет текущий запрос за основной базой.
+
+    """
+    _state.pinned = True
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """
+    Чтения внутри блока идут на реплику, пока запрос не закреплен.
+
+    :param enabled: False - блок ничего не меняет.
+    :type enabled: bool
+
+    """
+    if not enabled:
+        yield
+        return
+    _state.reads = getattr(_state, "reads", 0) + 1
+    try:
+        yield
+    finally:
+        _state.reads -= 1
+
+
+class ReplicaRouter(object):
+    """
+    Роутер чтения с реплик.
+
+    Реплика выбирается случайно одна на запрос, чтобы чтения одного запроса
+    не расходились между репликами с разным отставанием.
+
+    """
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if not replicas or not getattr(_state, "reads", 0) or is_pinned():
+            return None
+        if model._meta.label_lower in get_primary_models():
+            return None
+        if getattr(_state, "replica", None) is None:
+            _state.replica = random.choice(replicas)
+        return _state.replica
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        pin()
+        # Явно: иначе django пишет объект в базу, из которой он прочитан, то есть в реплику.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS}.union(get_replicas())
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему репликацией.
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaPinMiddleware(MiddlewareMixin):
+    """
+    Закрепляет клиента за основной базой на время после его записи.
+
+    Должна стоять первой, чтобы видеть записи сессии и остальных middleware.
+
+    """
+    def get_cookie_name(self):
+        return getattr(settings, "DATABASE_REPLICA_PIN_COOKIE", "db_pinned")
+
+    def process_request(self, request):
+        reset(pinned=self.get_cookie_name() in request.COOKIES)
+
+    def process_response(self, request, response):
+        seconds = getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 5)
+        if has_written() and get_replicas() and seconds:
+            response.set_cookie(self.get_cookie_name(), "1", max_age=seconds, httponly=True)
+        reset()
+        return response
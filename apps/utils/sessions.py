@@ -0,0 +1,240 @@
+"""
+Сессии с движком по пути запроса.
+
+PathSessionMiddleware заменяет django.contrib.sessions.middleware.SessionMiddleware:
+запросы с путем из SESSION_PATH_ENGINES получают сессию своего движка и
+cookie, остальные - SESSION_ENGINE и SESSION_COOKIE_NAME, как обычно. Так
+запросы кандидатов в /graph/ можно держать в кеше или в подписанной cookie, а
+админку оставить на базе.
+
+Сессия сохраняется, только если ее данные или ключ изменились: повторная
+запись того же значения, например токена при повторном входе, не пишет в
+хранилище и не переставляет cookie.
+
+Настройки:
+    SESSION_PATH_ENGINES = {
+        "/graph/": {
+            "ENGINE": "django.contrib.sessions.backends.cache",
+            "COOKIE_NAME": "quiz_sessionid",  # По умолчанию SESSION_COOKIE_NAME.
+            "COOKIE_PATH": "/graph/",  # По умолчанию SESSION_COOKIE_PATH.
+        },
+    }
+
+Сессии несовместимых движков с одним именем cookie затирали бы друг друга,
+поэтому такая настройка - ошибка. db и cached_db хранят сессии в одной таблице
+и могут делить cookie. Со своей cookie запросы по пути не видят вход в
+админку, например, question_stats для персонала.
+
+Устаревшие сессии из базы и файлов удаляет purge_expired_sessions(), команда
+purge_sessions.
+
+"""
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.exceptions import ImproperlyConfigured, SuspiciousOperation
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.http import cookie_date
+
+
+DB_ENGINES = ("django.contrib.sessions.backends.db", "django.contrib.sessions.backends.cached_db")
+
+_stores = {}
+
+
+class UnchangedSessionMixin(object):
+    """
+    Примесь к SessionStore: запоминает загруженные данные, чтобы не сохранять их без изменений.
+
+    """
+    _loaded = None
+
+    def load(self):
+        data = super(UnchangedSessionMixin, self).load()
+        # Ключ запоминается после загрузки: при неизвестном ключе load его сбрасывает.
+        # Данные сравниваются сериализованными, чтобы заметить изменения вложенных значений.
+        self._loaded = (self._session_key, self.serializer().dumps(data))
+        return data
+
+    def has_changed(self):
+        """
+        Отличаются ли ключ или данные от загруженных из хранилища.
+
+        :rtype: bool
+
+        """
+        if self._loaded is None:
+            return True
+        session_key, data = self._loaded
+        if session_key != self._session_key:
+            return True
+        return data != self.serializer().dumps(getattr(self, "_session_cache", {}))
+
+
+def get_session_store(engine):
+    """
+    SessionStore движка с примесью UnchangedSessionMixin.
+
+    :param engine: Модуль движка сессий.
+    :type engine: str
+
+    """
+    store = _stores.get(engine)
+    if store is None:
+        base = import_module(engine).SessionStore
+        store = _stores[engine] = type("SessionStore", (UnchangedSessionMixin, base), {})
+    return store
+
+
+def get_default_options():
+    return {
+        "ENGINE": settings.SESSION_ENGINE,
+        "COOKIE_NAME": settings.SESSION_COOKIE_NAME,
+        "COOKIE_PATH": settings.SESSION_COOKIE_PATH,
+    }
+
+
+def get_path_options():
+    """
+    Настройки сессий по путям, пути от длинных к коротким.
+
+    :return: [(путь, настройки)]
+    :rtype: list
+
+    """
+    defaults = get_default_options()
+    return sorted(
+        ((path, dict(defaults, **options)) for path, options in getattr(settings, "SESSION_PATH_ENGINES", {}).items()),
+        key=lambda item: len(item[0]), reverse=True
+    )
+
+
+def get_engines():
+    """
+    Все движки сессий проекта.
+
+    :rtype: set
+
+    """
+    return {settings.SESSION_ENGINE}.union(options["ENGINE"] for path, options in get_path_options())
+
+
+def check_options(path_options):
+    """
+    :raises ImproperlyConfigured: Несовместимые движки с одной cookie.
+
+    """
+    cookies = {}
+    for path, options in [(None, get_default_options())] + path_options:
+        # На вложенный путь браузер пришлет обе cookie с одним именем, поэтому путь cookie не различает.
+        engine = cookies.setdefault(options["COOKIE_NAME"], options["ENGINE"])
+        if engine != options["ENGINE"] and not {engine, options["ENGINE"]}.issubset(DB_ENGINES):
+            raise ImproperlyConfigured(
+                "Сессии `{}` и `{}` с одной cookie `{}`, задайте COOKIE_NAME для `{}`.".format(
+                    engine, options["ENGINE"], options["COOKIE_NAME"], path
+                )
+            )
+
+
+class PathSessionMiddleware(SessionMiddleware):
+    """
+    Сессии с движком по пути запроса, без записи неизмененных сессий.
+
+    """
+    def __init__(self, get_response=None):
+        self.get_response = get_response
+        self.path_options = get_path_options()
+        check_options(self.path_options)
+        self.default_options = get_default_options()
+
+    def get_options(self, request):
+        for path, options in self.path_options:
+            if request.path_info.startswith(path):
+                return options
+        return self.default_options
+
+    def process_request(self, request):
+        options = request.session_options = self.get_options(request)
+        request.session = get_session_store(options["ENGINE"])(request.COOKIES.get(options["COOKIE_NAME"]))
+
+    def process_response(self, request, response):
+        """
+        То же, что SessionMiddleware.process_response, но со своей cookie и без записи неизмененной сессии.
+
+        """
+        options = getattr(request, "session_options", self.default_options)
+        cookie_name, cookie_path = options["COOKIE_NAME"], options["COOKIE_PATH"]
+        try:
+            accessed = request.session.accessed
+            modified = request.session.modified and request.session.has_changed()
+            empty = request.session.is_empty()
+        except AttributeError:
+            return response
+
+        if cookie_name in request.COOKIES and empty:
+            response.delete_cookie(cookie_name, path=cookie_path, domain=settings.SESSION_COOKIE_DOMAIN)
+            return response
+
+        if accessed:
+            patch_vary_headers(response, ("Cookie",))
+        if not (modified or settings.SESSION_SAVE_EVERY_REQUEST) or empty or response.status_code == 500:
+            return response
+
+        if request.session.get_expire_at_browser_close():
+            max_age, expires = None, None
+        else:
+            max_age = request.session.get_expiry_age()
+            expires = cookie_date(time.time() + max_age)
+        try:
+            request.session.save()
+        except UpdateError:
+            raise SuspiciousOperation(
+                "The request's session was deleted before the request completed. "
+                "The user may have logged out in a concurrent request, for example."
+            )
+        response.set_cookie(
+            cookie_name, request.session.session_key, max_age=max_age, expires=expires,
+            domain=settings.SESSION_COOKIE_DOMAIN, path=cookie_path,
+            secure=settings.SESSION_COOKIE_SECURE or None,
+            httponly=settings.SESSION_COOKIE_HTTPONLY or None,
+        )
+        return response
+
+
+def purge_expired_sessions(batch_size=1000):
+    """
+    Удаляет устаревшие сессии всех движков проекта.
+
+    Сессии в базе удаляются пачками, чтобы не держать блокировку таблицы
+    одним большим DELETE. Файловые сессии чистит сам движок, сессии в кеше и
+    cookie устаревают сами.
+
+    :param batch_size: Размер пачки.
+    :type batch_size: int
+
+    :return: Количество удаленных сессий из базы.
+    :rtype: int
+
+    """
+    deleted = 0
+    models = set()
+    for engine in get_engines():
+        store = import_module(engine).SessionStore
+        if hasattr(store, "get_model_class"):
+            models.add(store.get_model_class())
+        else:
+            store.clear_expired()
+
+    for model in models:
+        while True:
+            keys = list(model.objects.filter(
+                expire_date__lt=timezone.now()
+            ).values_list("pk", flat=True)[:batch_size])
+            if not keys:
+                break
+            deleted += model.objects.filter(pk__in=keys).delete()[0]
+    return deleted
@@ -0,0 +1,37 @@
+"""
+Профиль SQLite для одновременных записей.
+
+По умолчанию SQLite пишет журнал отката и блокирует всю базу на запись, так что
+читатели ждут писателей, а при старте экзамена одновременные входы и начала
+тестов упираются в "database is locked". Профиль включает WAL (читатели не
+ждут писателя), ожидание блокировки вместо ошибки, synchronous=NORMAL (в WAL
+без риска порчи базы), больший кеш страниц и чтение через mmap.
+
+PRAGMA выполняются при каждом новом соединении с SQLite из настройки
+SQLITE_PRAGMAS, {} - не менять ничего.
+
+"""
+from django.conf import settings
+
+
+def get_pragmas():
+    return getattr(settings, "SQLITE_PRAGMAS", {})
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """
+    Обработчик connection_created.
+
+    :param connection: Новое соединение.
+    :type connection: django.db.backends.base.base.BaseDatabaseWrapper
+
+    """
+    # Соединение из пула уже настроено.
+    if connection.vendor != "sqlite" or getattr(connection, "connection_reused", False):
+        return
+    pragmas = get_pragmas()
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute("PRAGMA {} = {}".format(name, value))
@@ -1,3 +1,332 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from . import routers, sessions
+from .backends import pool
+from .backends.sqlite3.base import DatabaseWrapper as PooledSQLiteWrapper
+
+
+class FakeConnection(object):
+    """
+    Соединение драйвера для пула.
+
+    """
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.closed = False
+
+    def cursor(self):
+        if self.broken:
+            raise DatabaseError("broken")
+        return self
+
+    def execute(self, sql):
+        pass
+
+    def rollback(self):
+        if self.broken:
+            raise DatabaseError("broken")
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    """
+    Выдача, возврат и замена соединений пула.
+
+    """
+    def make_pool(self, size=2, timeout=0.01, max_age=None, health_checks=True):
+        self.connections = []
+
+        def connect():
+            self.connections.append(FakeConnection())
+            return self.connections[-1]
+        return pool.ConnectionPool(connect, size, timeout, max_age, health_checks)
+
+    def test_reuse(self):
+        connection_pool = self.make_pool()
+        connection, reused = connection_pool.acquire()
+        self.assertFalse(reused)
+        connection_pool.release(connection)
+        self.assertEqual(connection_pool.acquire(), (connection, True))
+        self.assertEqual(connection_pool.get_stats()["created"], 1)
+
+    def test_size_and_timeout(self):
+        connection_pool = self.make_pool(size=1)
+        connection_pool.acquire()
+        with self.assertRaises(TimeoutError):
+            connection_pool.acquire()
+        stats = connection_pool.get_stats()
+        self.assertEqual((stats["open"], stats["in_use"], stats["timeouts"]), (1, 1, 1))
+
+    def test_failed_check_is_replaced(self):
+        connection_pool = self.make_pool(size=1)
+        connection, reused = connection_pool.acquire()
+        connection_pool.release(connection)
+        connection.broken = True
+        replacement, reused = connection_pool.acquire()
+        self.assertIsNot(replacement, connection)
+        self.assertFalse(reused)
+        self.assertTrue(connection.closed)
+        self.assertEqual(connection_pool.get_stats()["failed_checks"], 1)
+
+    def test_expired_is_closed_on_release(self):
+        connection_pool = self.make_pool(max_age=0)
+        connection, reused = connection_pool.acquire()
+        connection_pool.release(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(connection_pool.get_stats()["idle"], 0)
+
+    def test_broken_release_frees_slot(self):
+        connection_pool = self.make_pool(size=1)
+        connection, reused = connection_pool.acquire()
+        connection.broken = True
+        connection_pool.release(connection)
+        self.assertTrue(connection.closed)
+        self.assertFalse(connection_pool.acquire()[1])
+
+    def test_discard_frees_slot(self):
+        connection_pool = self.make_pool(size=1)
+        connection, reused = connection_pool.acquire()
+        connection_pool.discard(connection)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(connection_pool.acquire()[0], connection)
+        stats = connection_pool.get_stats()
+        self.assertEqual((stats["open"], stats["in_use"], stats["closed"]), (1, 1, 1))
+
+
+class PooledDatabaseWrapperTest(SimpleTestCase):
+    """
+    Бэкенд с пулом: соединение после ошибки базы не возвращается в пул.
+
+    """
+    alias = "pool_test"
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.addCleanup(pool._pools.pop, self.alias, None)
+        self.wrapper = PooledSQLiteWrapper({
+            "ENGINE": "apps.utils.backends.sqlite3",
+            "NAME": os.path.join(directory, "pool.sqlite3"),
+            "OPTIONS": {},
+            "TIME_ZONE": None,
+            "CONN_MAX_AGE": 0,
+            "AUTOCOMMIT": True,
+            "ATOMIC_REQUESTS": False,
+            "POOL": {"SIZE": 1},
+        }, alias=self.alias)
+        self.addCleanup(self.wrapper.close)
+
+    def query(self, sql):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute(sql)
+
+    def test_connection_is_returned(self):
+        self.query("SELECT 1")
+        self.wrapper.close_if_unusable_or_obsolete()
+        self.assertEqual(pool.get_pool_stats()[self.alias]["idle"], 1)
+        self.query("SELECT 1")
+        self.assertTrue(self.wrapper.connection_reused)
+
+    def test_connection_with_errors_is_closed(self):
+        with self.assertRaises(DatabaseError):
+            self.query("SELECT * FROM missing_table")
+        self.assertTrue(self.wrapper.errors_occurred)
+        self.wrapper.close_if_unusable_or_obsolete()
+        stats = pool.get_pool_stats()[self.alias]
+        self.assertEqual((stats["open"], stats["idle"], stats["in_use"], stats["closed"]), (0, 0, 0, 1))
+        self.query("SELECT 1")
+        self.assertFalse(self.wrapper.connection_reused)
+
+
+class DbHealthTest(TestCase):
+    """
+    Доступ к /health/db/.
+
+    """
+    def test_internal_ip(self):
+        response = self.client.get("/health/db/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["databases"]["default"])
+
+    def test_external_ip(self):
+        self.assertEqual(self.client.get("/health/db/", REMOTE_ADDR="10.1.2.3").status_code, 403)
+
+    def test_staff(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+        self.assertEqual(self.client.get("/health/db/", REMOTE_ADDR="10.1.2.3").status_code, 200)
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1", "replica_2"])
+class ReplicaRouterTest(SimpleTestCase):
+    """
+    Чтения с реплик и закрепление за основной базой.
+
+    """
+    def setUp(self):
+        routers.reset()
+        self.addCleanup(routers.reset)
+        self.router = routers.ReplicaRouter()
+
+    def read(self, model=User):
+        return self.router.db_for_read(model)
+
+    def test_reads_outside_block(self):
+        self.assertIsNone(self.read())
+        with routers.replica_reads(False):
+            self.assertIsNone(self.read())
+
+    def test_one_replica_per_request(self):
+        with routers.replica_reads():
+            replica = self.read()
+            self.assertIn(replica, ["replica_1", "replica_2"])
+            self.assertEqual({self.read() for i in range(20)}, {replica})
+        self.assertIsNone(self.read())
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        with routers.replica_reads():
+            self.assertIsNone(self.read())
+
+    def test_primary_models(self):
+        with routers.replica_reads():
+            self.assertIsNone(self.read(Session))
+
+    def test_write_pins_request(self):
+        with routers.replica_reads():
+            self.assertIsNotNone(self.read())
+            self.router.db_for_write(User)
+            self.assertIsNone(self.read())
+        self.assertTrue(routers.has_written())
+
+    def test_pin_middleware(self):
+        middleware = routers.ReplicaPinMiddleware()
+        factory = RequestFactory()
+
+        middleware.process_request(factory.post("/graph/"))
+        self.router.db_for_write(User)
+        response = middleware.process_response(None, HttpResponse())
+        self.assertEqual(response.cookies["db_pinned"]["max-age"], 5)
+        self.assertFalse(routers.is_pinned())
+
+        request = factory.post("/graph/")
+        request.COOKIES["db_pinned"] = "1"
+        middleware.process_request(request)
+        with routers.replica_reads():
+            self.assertIsNone(self.read())
+        response = middleware.process_response(request, HttpResponse())
+        self.assertNotIn("db_pinned", response.cookies)
+
+        middleware.process_request(factory.post("/graph/"))
+        with routers.replica_reads():
+            self.assertIsNotNone(self.read())
+
+
+CACHE_SESSIONS = {"/graph/": {"ENGINE": "django.contrib.sessions.backends.cache", "COOKIE_NAME": "quiz_sessionid"}}
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"])
+class ReplicaWriteTest(TestCase):
+    """
+    Объект, прочитанный с реплики, пишется в основную базу.
+
+    """
+    def setUp(self):
+        routers.reset()
+        self.addCleanup(routers.reset)
+        self.user = User.objects.create_user("candidate", "candidate@example.com", "password")
+        # Как после чтения в replica_reads(): реплики в тестовом окружении нет.
+        self.user._state.db = "replica_1"
+
+    def test_save(self):
+        with routers.replica_reads():
+            self.user.first_name = "Имя"
+            self.user.save(update_fields=["first_name"])
+        self.assertEqual(self.user._state.db, "default")
+        self.assertEqual(User.objects.get(pk=self.user.pk).first_name, "Имя")
+
+    def test_related(self):
+        with routers.replica_reads():
+            entry = LogEntry(user=self.user, action_flag=1, object_repr="Объект")
+            entry.save()
+        self.assertEqual(entry._state.db, "default")
+        self.assertTrue(LogEntry.objects.filter(user=self.user).exists())
+
+
+@override_settings(SESSION_PATH_ENGINES=CACHE_SESSIONS)
+class PathSessionTest(SimpleTestCase):
+    """
+    Сессии с движком по пути и без записи неизмененных данных.
+
+    """
+    def setUp(self):
+        cache.clear()
+        self.store = sessions.get_session_store("django.contrib.sessions.backends.cache")
+        self.middleware = sessions.PathSessionMiddleware()
+        self.factory = RequestFactory()
+
+    def make_session(self, **data):
+        session = self.store()
+        session.update(data)
+        session.save()
+        return self.store(session.session_key)
+
+    def test_has_changed(self):
+        self.assertTrue(self.store().has_changed())
+        session = self.make_session(token="a", nested={"ids": [1]})
+        self.assertEqual(session["token"], "a")
+        self.assertFalse(session.has_changed())
+        session["token"] = "a"
+        self.assertFalse(session.has_changed())
+        session["nested"]["ids"].append(2)
+        self.assertTrue(session.has_changed())
+
+    def test_cycle_key_is_change(self):
+        session = self.make_session(token="a")
+        session.load()
+        session.cycle_key()
+        self.assertTrue(session.has_changed())
+
+    def request(self, path, cookies=None, **data):
+        request = self.factory.post(path)
+        request.COOKIES.update(cookies or {})
+        self.middleware.process_request(request)
+        request.session.update(data)
+        return request, self.middleware.process_response(request, HttpResponse())
+
+    def test_engine_by_path(self):
+        request, response = self.request("/graph/", token="a")
+        self.assertIsInstance(request.session, self.store)
+        self.assertIn("quiz_sessionid", response.cookies)
+        self.assertEqual(response.cookies["quiz_sessionid"]["path"], "/")
+        request, response = self.request("/admin/")
+        self.assertNotIsInstance(request.session, self.store)
+
+    def test_unchanged_session_is_not_saved(self):
+        request, response = self.request("/graph/", token="a")
+        cookies = {"quiz_sessionid": response.cookies["quiz_sessionid"].value}
+        with mock.patch.object(self.store, "save") as save:
+            request, response = self.request("/graph/", cookies, token="a")
+        self.assertFalse(save.called)
+        self.assertNotIn("quiz_sessionid", response.cookies)
+        with mock.patch.object(self.store, "save") as save:
+            self.request("/graph/", cookies, token="b")
+        self.assertTrue(save.called)
+
+    @override_settings(SESSION_PATH_ENGINES={"/graph/": {"ENGINE": "django.contrib.sessions.backends.cache"}})
+    def test_shared_cookie_is_refused(self):
+        with self.assertRaises(ImproperlyConfigured):
+            sessions.PathSessionMiddleware()
@@ -1,3 +1,41 @@
-from django.shortcuts import render
+"""
+Служебные view.
 
-# Create your views here.
+"""
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from django.views.decorators.cache import never_cache
+
+from .backends.pool import get_pool_stats
+
+
+@never_cache
+def db_health(request):
+    """
+    Проверка баз для балансировщика и метрики пулов соединений процесса.
+
+    Доступна с адресов из INTERNAL_IPS и персоналу: каждый запрос ходит во все базы.
+
+    :param request: Объект запроса.
+    :type request: django.http.request.HttpRequest
+
+    :return: 200 - все базы отвечают, 503 - нет, 403 - нет доступа.
+    :rtype: django.http.JsonResponse
+
+    """
+    if request.META.get("REMOTE_ADDR") not in settings.INTERNAL_IPS and not request.user.is_staff:
+        return JsonResponse({"detail": "Доступ запрещен."}, status=403)
+
+    databases = {}
+    for connection in connections.all():
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            databases[connection.alias] = True
+        except Exception:
+            databases[connection.alias] = False
+    return JsonResponse(
+        {"databases": databases, "pools": get_pool_stats()},
+        status=200 if all(databases.values()) else 503
+    )
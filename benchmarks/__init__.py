@@ -0,0 +1,10 @@
+"""
+Бенчмарки.
+
+Запускаются из корня проекта, например:
+    python -m benchmarks.indexes --tests 1000000
+
+Каждый бенчмарк работает со своей базой (по умолчанию во временной папке),
+печатает сводку и пишет результаты в JSON для сравнения между коммитами.
+
+"""
@@ -0,0 +1,139 @@
+"""
+Цена открытия соединения с базой на запрос.
+
+Одни и те же запросы test по HTTP в /graph/ локального WSGI сервера на
+--concurrency потоков гоняются с разными настройками соединений:
+    per_request - CONN_MAX_AGE = 0, соединение на каждый запрос, как по умолчанию;
+    persistent - CONN_MAX_AGE, соединение живет в потоке между запросами;
+    persistent_checked - то же с CONN_HEALTH_CHECKS, проверка в начале запроса;
+    pooled - бэкенд apps.utils.backends.sqlite3 с пулом на --pool-size соединений.
+
+Тестовый клиент django не закрывает соединения в конце запроса, поэтому
+запросы идут через настоящий WSGI сервер. SQLite открывается быстро, поэтому
+сетевое подключение можно изобразить задержкой --connect-latency при каждом
+новом соединении.
+
+    python -m benchmarks.connections --requests 200 --concurrency 8 --connect-latency 5
+
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .lifecycle import HTTPSession, seed, start_wsgi_server, PASSWORD
+from .utils import get_parser, setup_django, summarize, timed, write_results
+
+
+MODES = {
+    "per_request": {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False},
+    "persistent": {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": False},
+    "persistent_checked": {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": True},
+    "pooled": {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False, "ENGINE": "apps.utils.backends.sqlite3"},
+}
+
+
+class ConnectCounter(object):
+    """
+    Считает новые соединения и задерживает каждое на latency секунд.
+
+    """
+    def __init__(self, latency):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def __call__(self, sender, connection, **kwargs):
+        if getattr(connection, "connection_reused", False):
+            return
+        with self.lock:
+            self.count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+def run_mode(name, options, test_case_id, emails, args, counter):
+    """
+    Замер одного режима в новых потоках, с новыми соединениями.
+
+    :rtype: dict
+
+    """
+    from django.conf import settings
+    from django.db import connection
+    from apps.utils.backends.pool import close_pools, get_pool_stats
+
+    connection.close()
+    close_pools()
+    database = settings.DATABASES["default"]
+    database.update(ENGINE="django.db.backends.sqlite3", POOL={"SIZE": args.pool_size, "TIMEOUT": 30})
+    database.update(options)
+    counter.count = 0
+
+    server, url = start_wsgi_server(args.concurrency)
+    durations = []
+    lock = threading.Lock()
+    query = json.dumps({"query": "{test(id: %d) {id name timeToTest}}" % test_case_id})
+
+    def worker(email):
+        session = HTTPSession(url)
+        session.post(json.dumps({"query": '{login(email: "%s", password: "%s") {name}}' % (email, PASSWORD)}))
+        local = []
+        for i in range(args.requests):
+            duration, (status, content) = timed(session.post, query)
+            local.append(duration)
+        with lock:
+            durations.extend(local)
+        session.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(worker, emails[:args.concurrency]))
+    wall = time.perf_counter() - started
+    server.shutdown()
+
+    result = dict(
+        summarize(durations),
+        requests_per_s=len(durations) / wall,
+        connections=counter.count,
+        pool=get_pool_stats().get("default") if "ENGINE" in options else None,
+    )
+    print("{:19} {:7.1f} запросов/с, p50 {:6.2f} мс, p95 {:6.2f} мс, новых соединений {}".format(
+        name, result["requests_per_s"], result["p50_ms"], result["p95_ms"], result["connections"]
+    ))
+    return result
+
+
+def main():
+    parser = get_parser(__doc__)
+    parser.add_argument("--requests", type=int, default=200, help="Запросов на поток.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Потоков.")
+    parser.add_argument("--pool-size", type=int, default=4, help="Размер пула для pooled.")
+    parser.add_argument("--connect-latency", type=float, default=0, help="Задержка нового соединения, мс.")
+    args = parser.parse_args()
+
+    db_path = setup_django(args.db)
+    from django.core.management import call_command
+    from django.db.backends.signals import connection_created
+
+    print("База: {}".format(db_path))
+    call_command("migrate", verbosity=0)
+    test_case_id, emails = seed(args.concurrency, 200, "4", 30)
+
+    counter = ConnectCounter(args.connect_latency / 1000.0)
+    connection_created.connect(counter)
+    results = {
+        name: run_mode(name, options, test_case_id, emails, args, counter)
+        for name, options in MODES.items()
+    }
+    write_results(args.output, "connections", {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "pool_size": args.pool_size,
+        "connect_latency_ms": args.connect_latency,
+        "modes": results,
+    })
+
+
+if __name__ == "__main__":
+    main()
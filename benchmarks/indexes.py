@@ -0,0 +1,166 @@
+"""
+Планы и время горячих запросов до и после индексов.
+
+База создается на схеме до индексов (миграция quiz 0005), заполняется сырыми
+INSERT'ами, затем запросы замеряются, база мигрируется до последней схемы и
+запросы замеряются снова.
+
+    python -m benchmarks.indexes --tests 1000000 --output indexes.json
+
+"""
+import random
+
+from .utils import get_parser, setup_django, timed, summarize, write_results
+
+
+BEFORE_MIGRATION = "0005_auto_20170728_1905"
+
+QUERIES = {
+    # resolve_start_test, мутации.
+    "test_by_account_and_test_case": (
+        'SELECT "id" FROM "quiz_test" WHERE "account_id" = %s AND "test_case_id" = %s',
+        lambda data: [data.random_account(), data.random_test_case()],
+    ),
+    # status_test для списка тестов аккаунта.
+    "tests_by_account": (
+        'SELECT "id" FROM "quiz_test" WHERE "account_id" = %s AND "test_case_id" IN (%s, %s, %s)',
+        lambda data: [data.random_account()] + [data.random_test_case() for i in range(3)],
+    ),
+    # resolve_login.
+    "account_by_email": (
+        'SELECT "id" FROM "quiz_accounttest" WHERE "email" = %s',
+        lambda data: [data.email(data.random_account())],
+    ),
+    # TestAccountMiddleware.
+    "token_by_token": (
+        'SELECT "id", "account_id" FROM "quiz_token" WHERE "token" = %s',
+        lambda data: [data.token(data.random_account())],
+    ),
+}
+
+
+class Dataset(object):
+    """
+    Данные для замеров, вставляются сырыми запросами, чтобы не зависеть от текущих моделей.
+
+    """
+    def __init__(self, tests, test_cases, seed=0):
+        self.test_cases = test_cases
+        self.accounts = max(1, tests // test_cases)
+        self.random = random.Random(seed)
+
+    @staticmethod
+    def email(account_id):
+        return "candidate{}@example.com".format(account_id)
+
+    @staticmethod
+    def token(account_id):
+        return "{:050d}".format(account_id)
+
+    def random_account(self):
+        return self.random.randint(1, self.accounts)
+
+    def random_test_case(self):
+        return self.random.randint(1, self.test_cases)
+
+    def insert(self, cursor, sql, rows, batch_size=10000):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+
+    def create(self):
+        from django.db import connection, transaction
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.insert(cursor, 'INSERT INTO "quiz_testcase" ("id", "name", "is_active", "time_to_test") '
+                                'VALUES (%s, %s, %s, %s)',
+                        ((i, "Тест {}".format(i), True, 3600 * 10 ** 6) for i in range(1, self.test_cases + 1)))
+            self.insert(cursor, 'INSERT INTO "quiz_accounttest" ("id", "name", "email", "information", "password") '
+                                'VALUES (%s, %s, %s, %s, %s)',
+                        ((i, "Кандидат {}".format(i), self.email(i), "", "password")
+                         for i in range(1, self.accounts + 1)))
+            self.insert(cursor, 'INSERT INTO "quiz_token" ("account_id", "token") VALUES (%s, %s)',
+                        ((i, self.token(i)) for i in range(1, self.accounts + 1)))
+            self.insert(cursor, 'INSERT INTO "quiz_test" ("account_id", "test_case_id", "answers") '
+                                'VALUES (%s, %s, %s)',
+                        ((account, test_case, "")
+                         for account in range(1, self.accounts + 1)
+                         for test_case in range(1, self.test_cases + 1)))
+
+
+def explain(cursor, sql, params):
+    """
+    План запроса.
+
+    :rtype: list
+
+    """
+    from django.db import connection
+
+    prefix = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+    cursor.execute(prefix + sql, params)
+    return [" ".join(str(i) for i in row) for row in cursor.fetchall()]
+
+
+def measure(data, lookups):
+    """
+    Замеряет все запросы.
+
+    :rtype: dict
+
+    """
+    from django.db import connection
+
+    results = {}
+    with connection.cursor() as cursor:
+        for name, (sql, get_params) in QUERIES.items():
+            durations = []
+            for i in range(lookups):
+                duration, rows = timed(lambda: cursor.execute(sql, get_params(data)) or cursor.fetchall())
+                durations.append(duration)
+            results[name] = dict(summarize(durations), plan=explain(cursor, sql, get_params(data)))
+    return results
+
+
+def main():
+    parser = get_parser(__doc__)
+    parser.add_argument("--tests", type=int, default=1000000, help="Прохождений в базе.")
+    parser.add_argument("--test-cases", type=int, default=20, help="Тестов, у каждого аккаунта все тесты.")
+    parser.add_argument("--lookups", type=int, default=2000, help="Запросов на замер.")
+    args = parser.parse_args()
+
+    db_path = setup_django(args.db)
+    from django.core.management import call_command
+
+    print("База: {}".format(db_path))
+    call_command("migrate", "quiz", BEFORE_MIGRATION, verbosity=0)
+    data = Dataset(args.tests, args.test_cases)
+    duration, _ = timed(data.create)
+    print("Заполнено {} прохождений за {:.1f} с".format(data.accounts * data.test_cases, duration))
+
+    before = measure(data, args.lookups)
+    duration, _ = timed(call_command, "migrate", verbosity=0)
+    print("Миграции до последней схемы за {:.1f} с".format(duration))
+    after = measure(data, args.lookups)
+
+    for name in QUERIES:
+        print("\n{}".format(name))
+        for label, result in (("до", before[name]), ("после", after[name])):
+            print("  {:6} p50 {:.3f} мс, p95 {:.3f} мс | {}".format(
+                label, result["p50_ms"], result["p95_ms"], "; ".join(result["plan"])
+            ))
+
+    write_results(args.output, "indexes", {
+        "tests": data.accounts * data.test_cases,
+        "before": before,
+        "after": after,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""
+Нагрузка на полный цикл прохождения теста через /graph/.
+
+Каждый кандидат в своей сессии делает login, user, test, startTest,
+автосохраняет ответы по одному через saveAnswer и завершает тест через endTest.
+Часть кандидатов бросает тест, не завершив его, их прохождения потом закрывает
+expire_tests. Кандидаты идут параллельно в --concurrency потоков.
+
+Запросы идут через тестовый клиент django, либо с --wsgi по HTTP в локальный
+WSGI сервер, запущенный в этом же процессе на той же базе. Количество SQL
+запросов на операцию берется из extensions.timing ответа (GRAPHENE["TIMING"]).
+
+    python -m benchmarks.lifecycle --candidates 500 --concurrency 16 --output lifecycle.json
+
+"""
+import datetime
+import http.cookiejar
+import json
+import logging
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import get_parser, setup_django, timed, summarize, write_results
+
+
+PASSWORD = "password"
+
+OPERATIONS = ("login", "user", "test", "startTest", "saveAnswer", "endTest")
+
+# Признаки гонки в глобальном состоянии promise 2.0 (стек контекстов и очередь Async общие
+# на все потоки), на которой ломались DataLoader'ы. Резолверы больше не возвращают Promise,
+# но такие ошибки по-прежнему считаются отдельно: это не отказ операции, а поломка
+# выполнения GraphQL в потоках.
+CONCURRENCY_ERROR_MARKERS = ("_exited",)
+
+
+def get_error_kind(status, response):
+    """
+    Вид ошибки ответа.
+
+    :param status: HTTP статус.
+    :param response: Разобранный ответ.
+    :type status: int
+    :type response: dict
+
+    :return: None, "concurrency", "http" или "graphql".
+    :rtype: str
+
+    """
+    errors = response.get("errors") or []
+    messages = " ".join(str(error.get("message", "")) for error in errors if isinstance(error, dict))
+    if any(marker in messages for marker in CONCURRENCY_ERROR_MARKERS):
+        return "concurrency"
+    if status != 200:
+        return "http"
+    if errors:
+        return "graphql"
+    return None
+
+
+def seed(candidates, questions, answers, questions_per_test):
+    """
+    Заполняет базу через seed_perf: один тест и по новому прохождению на каждого кандидата.
+
+    :return: id теста и email кандидатов.
+    :rtype: tuple
+
+    """
+    from django.core.management import call_command
+    from apps.quiz.models import AccountTest, Test, TestCase
+
+    call_command(
+        "seed_perf", categories=10, questions=questions, active_questions=1.0, answers=answers,
+        test_cases=1, questions_per_test=questions_per_test, accounts=candidates, password=PASSWORD,
+        tests=candidates, statuses=Test.STATUS_NEW + ":1", verbosity=0,
+    )
+    return TestCase.objects.get().pk, list(AccountTest.objects.order_by("pk").values_list("email", flat=True))
+
+
+class ClientSession(object):
+    """
+    Сессия кандидата через тестовый клиент django.
+
+    """
+    def __init__(self, url):
+        from django.test import Client
+
+        self.url = url
+        self.client = Client()
+
+    def post(self, body):
+        response = self.client.post(self.url, body, content_type="application/json")
+        return response.status_code, response.content
+
+    def close(self):
+        from django.db import connection
+
+        connection.close()
+
+
+class HTTPSession(object):
+    """
+    Сессия кандидата по HTTP, с cookies и CSRF токеном.
+
+    """
+    def __init__(self, url):
+        self.url = url
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        # GET на /graph/ ставит cookie csrftoken, даже если сам запрос вернул ошибку.
+        try:
+            self.opener.open(self.url + "?query=%7B__typename%7D").read()
+        except urllib.error.HTTPError:
+            pass
+
+    def get_csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == "csrftoken":
+                return cookie.value
+        return ""
+
+    def post(self, body):
+        request = urllib.request.Request(self.url, data=body.encode(), headers={
+            "Content-Type": "application/json",
+            "X-CSRFToken": self.get_csrf_token(),
+        })
+        try:
+            with self.opener.open(request) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def close(self):
+        pass
+
+
+def start_wsgi_server(threads=16):
+    """
+    WSGI сервер на свободном порту с постоянным набором потоков, как у gunicorn с gthread.
+
+    Постоянные потоки нужны, чтобы соединения с базой жили между запросами.
+
+    :param threads: Потоков обработки запросов.
+    :type threads: int
+
+    :return: Сервер и адрес /graph/, сервер останавливается через shutdown().
+    :rtype: tuple
+
+    """
+    from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+    from django.core.wsgi import get_wsgi_application
+
+    class PooledWSGIServer(WSGIServer):
+        executor = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.executor.submit(self.process_request_thread, request, client_address)
+
+        def process_request_thread(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+        def shutdown(self):
+            super(PooledWSGIServer, self).shutdown()
+            self.executor.shutdown()
+            self.server_close()
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = make_server("127.0.0.1", 0, get_wsgi_application(),
+                         server_class=PooledWSGIServer, handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{}/graph/".format(server.server_port)
+
+
+class Recorder(object):
+    """
+    Длительности, SQL запросы и ошибки по операциям, общий на все потоки.
+
+    Ошибки гонок выполнения GraphQL в потоках (concurrency_errors) в errors не входят.
+
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.concurrency_errors = defaultdict(int)
+
+    def add(self, operation, duration, queries, error):
+        """
+        :param error: Вид ошибки из get_error_kind, либо признак ошибки.
+
+        """
+        with self.lock:
+            self.durations[operation].append(duration)
+            if queries is not None:
+                self.queries[operation].append(queries)
+            if error == "concurrency":
+                self.concurrency_errors[operation] += 1
+            elif error:
+                self.errors[operation] += 1
+
+    def summary(self):
+        results = {}
+        for operation in OPERATIONS:
+            queries = self.queries[operation]
+            results[operation] = dict(
+                summarize(self.durations[operation]),
+                errors=self.errors[operation],
+                concurrency_errors=self.concurrency_errors[operation],
+                queries_mean=sum(queries) / len(queries) if queries else None,
+                queries_max=max(queries) if queries else None,
+            )
+        return results
+
+
+class Candidate(object):
+    """
+    Один кандидат, проходит тест от входа до завершения.
+
+    """
+    def __init__(self, session, recorder, email, test_case_id, rng, finish):
+        self.session = session
+        self.recorder = recorder
+        self.email = email
+        self.test_case_id = test_case_id
+        self.rng = rng
+        self.finish = finish
+
+    def call(self, operation, query):
+        duration, (status, content) = timed(self.session.post, json.dumps({"query": query}))
+        try:
+            response = json.loads(content.decode())
+        except ValueError:
+            response = {}
+        timing = response.get("extensions", {}).get("timing")
+        error = get_error_kind(status, response)
+        self.recorder.add(operation, duration, timing["sql"]["count"] if timing else None, error)
+        return (response.get("data") or {}).get(operation)
+
+    def run(self):
+        try:
+            self.call("login", '{login(email: "%s", password: "%s") {name}}' % (self.email, PASSWORD))
+            self.call("user", "{user {name email tests {id name statusTest timeToTest}}}")
+            self.call("test", "{test(id: %d) {id name statusTest timeToTest}}" % self.test_case_id)
+            paper = self.call("startTest", "{startTest(id: %d) {id questions {id question answers {id answer}}}}"
+                              % self.test_case_id)
+            if not paper:
+                return
+
+            chosen = []
+            for question in paper["questions"]:
+                answer = self.rng.choice(question["answers"])
+                chosen.append((question["id"], answer["id"]))
+                self.call("saveAnswer", "mutation {saveAnswer(id: %d, question: %s, answers: [%s]) {answers}}"
+                          % (self.test_case_id, question["id"], answer["id"]))
+
+            if self.finish:
+                # Последний ответ уходит вместе с завершением, как при нажатии "Завершить".
+                self.call("endTest", "mutation {endTest(id: %d, answers: [{question: %s, answers: [%s]}]) "
+                                     "{result {status score maxScore}}}" % ((self.test_case_id,) + chosen[-1]))
+        finally:
+            self.session.close()
+
+
+def run_candidates(url, session_class, test_case_id, emails, concurrency, abandon, seed=0):
+    """
+    Прогоняет всех кандидатов.
+
+    :return: Записанные замеры и общее время в секундах.
+    :rtype: tuple
+
+    """
+    recorder = Recorder()
+    rng = random.Random(seed)
+    plan = [(email, random.Random(rng.random()), rng.random() >= abandon) for email in emails]
+
+    def run(item):
+        email, candidate_rng, finish = item
+        Candidate(session_class(url), recorder, email, test_case_id, candidate_rng, finish).run()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run, plan))
+    return recorder, time.perf_counter() - started
+
+
+def main():
+    parser = get_parser(__doc__)
+    parser.add_argument("--candidates", type=int, default=200, help="Кандидатов.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Одновременных кандидатов.")
+    parser.add_argument("--questions", type=int, default=2000, help="Вопросов в базе.")
+    parser.add_argument("--answers", default="4", help="Ответов на вопрос, число или диапазон.")
+    parser.add_argument("--questions-per-test", type=int, default=30, help="Вопросов в тесте.")
+    parser.add_argument("--abandon", type=float, default=0.1,
+                        help="Доля кандидатов, которые не завершают тест, их закрывает expire_tests.")
+    parser.add_argument("--autosave-mode", choices=("direct", "buffered"), default="direct",
+                        help="QUIZ AUTOSAVE_MODE.")
+    parser.add_argument("--wsgi", action="store_true", help="Ходить по HTTP в локальный WSGI сервер.")
+    args = parser.parse_args()
+
+    from project import settings as project_settings
+    overrides = {}
+    from apps.utils.cache import PROCESS_LOCAL_BACKENDS
+    if args.autosave_mode == "buffered" and project_settings.CACHES["default"]["BACKEND"] in PROCESS_LOCAL_BACKENDS:
+        # Режим "buffered" с LocMemCache не запускается, файловый кеш общий для процессов.
+        overrides["CACHES"] = {"default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": tempfile.mkdtemp(prefix="quiz-bench-cache-"),
+        }}
+    db_path = setup_django(
+        args.db,
+        GRAPHENE=dict(project_settings.GRAPHENE, TIMING=True, TIMING_EXTENSIONS=True),
+        QUIZ=dict(getattr(project_settings, "QUIZ", {}), AUTOSAVE_MODE=args.autosave_mode),
+        **overrides
+    )
+    # Строки замеров в лог не нужны, они приходят в ответе.
+    logging.getLogger("apps.utils.graphql.timing").setLevel(logging.ERROR)
+
+    from django.core.management import call_command
+    from django.db.models import Count
+    from django.utils import timezone
+    from apps.quiz import autosave
+    from apps.quiz.expiry import expire_tests
+    from apps.quiz.models import Test
+
+    print("База: {}".format(db_path))
+    call_command("migrate", verbosity=0)
+    duration, (test_case_id, emails) = timed(seed, args.candidates, args.questions, args.answers, args.questions_per_test)
+    print("Заполнено за {:.1f} с".format(duration))
+
+    server = None
+    if args.wsgi:
+        server, url = start_wsgi_server(args.concurrency)
+        session_class = HTTPSession
+    else:
+        url, session_class = "/graph/", ClientSession
+
+    try:
+        recorder, wall = run_candidates(url, session_class, test_case_id, emails, args.concurrency, args.abandon)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    autosave.flush()
+    # Брошенные прохождения закрываются так, будто их срок уже вышел.
+    expire_duration, expired = timed(expire_tests, now=timezone.now() + datetime.timedelta(days=1))
+
+    results = recorder.summary()
+    requests = sum(result["count"] for result in results.values())
+    print("\n{} кандидатов, {} запросов за {:.1f} с: {:.1f} запросов/с, {:.1f} кандидатов/с".format(
+        args.candidates, requests, wall, requests / wall, args.candidates / wall
+    ))
+    for operation in OPERATIONS:
+        result = results[operation]
+        if not result["count"]:
+            continue
+        print("  {:11} {:6} p50 {:7.2f} мс, p95 {:7.2f} мс, p99 {:7.2f} мс, SQL {}, ошибок {}, гонок {}".format(
+            operation, result["count"], result["p50_ms"], result["p95_ms"], result["p99_ms"],
+            "{:.1f}".format(result["queries_mean"]) if result["queries_mean"] is not None else "-",
+            result["errors"], result["concurrency_errors"],
+        ))
+    print("  expire_tests закрыл {} за {:.1f} мс".format(expired, expire_duration * 1000))
+    statuses = dict(Test.objects.order_by().values_list("status").annotate(Count("pk")))
+    print("  Прохождения по статусам: {}".format(statuses))
+
+    write_results(args.output, "lifecycle", {
+        "candidates": args.candidates,
+        "concurrency": args.concurrency,
+        "questions": args.questions,
+        "questions_per_test": args.questions_per_test,
+        "abandon": args.abandon,
+        "autosave_mode": args.autosave_mode,
+        "transport": "wsgi" if args.wsgi else "client",
+        "requests": requests,
+        "wall_s": wall,
+        "requests_per_s": requests / wall,
+        "candidates_per_s": args.candidates / wall,
+        "operations": results,
+        "expire_tests": {"expired": expired, "duration_ms": expire_duration * 1000},
+        "statuses": statuses,
+    })
+
+
+if __name__ == "__main__":
+    main()
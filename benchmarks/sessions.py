@@ -0,0 +1,116 @@
+"""
+Накладные расходы сессии на запрос кандидата при разных движках.
+
+Каждый кандидат входит, делает --requests запросов user и --relogins раз
+входит повторно, через тестовый клиент django. Замер повторяется для
+стратегий сессий /graph/:
+    django_db - SessionMiddleware django с сессиями в базе, как было;
+    db, cached_db, cache, signed_cookies - PathSessionMiddleware с этим
+        движком для /graph/, без записи неизмененных сессий.
+
+По каждой операции считаются время и запросы к таблице django_session.
+
+    python -m benchmarks.sessions --candidates 20 --requests 50 --relogins 5
+
+"""
+import json
+
+from .lifecycle import ClientSession, seed, PASSWORD
+from .utils import get_parser, setup_django, summarize, timed, write_results
+
+
+SESSION_MIDDLEWARE = "django.contrib.sessions.middleware.SessionMiddleware"
+PATH_SESSION_MIDDLEWARE = "apps.utils.sessions.PathSessionMiddleware"
+
+STRATEGIES = {
+    "django_db": (SESSION_MIDDLEWARE, "django.contrib.sessions.backends.db", "sessionid"),
+    "db": (PATH_SESSION_MIDDLEWARE, "django.contrib.sessions.backends.db", "sessionid"),
+    "cached_db": (PATH_SESSION_MIDDLEWARE, "django.contrib.sessions.backends.cached_db", "sessionid"),
+    "cache": (PATH_SESSION_MIDDLEWARE, "django.contrib.sessions.backends.cache", "quiz_sessionid"),
+    "signed_cookies": (PATH_SESSION_MIDDLEWARE, "django.contrib.sessions.backends.signed_cookies", "quiz_sessionid"),
+}
+
+OPERATIONS = ("user", "relogin")
+
+
+def run_strategy(name, strategy, emails, args):
+    """
+    Замер одной стратегии.
+
+    :rtype: dict
+
+    """
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    middleware, engine, cookie_name = strategy
+    settings.MIDDLEWARE = [
+        middleware if item in (SESSION_MIDDLEWARE, PATH_SESSION_MIDDLEWARE) else item
+        for item in settings.MIDDLEWARE
+    ]
+    settings.SESSION_PATH_ENGINES = {"/graph/": {"ENGINE": engine, "COOKIE_NAME": cookie_name}}
+    cache.clear()
+
+    login = json.dumps({"query": '{login(email: "%s", password: "%s") {name}}'})
+    user = json.dumps({"query": "{user {name}}"})
+    durations = {operation: [] for operation in OPERATIONS}
+    session_queries = {operation: 0 for operation in OPERATIONS}
+
+    def call(session, operation, body):
+        with CaptureQueriesContext(connection) as queries:
+            duration, (status, content) = timed(session.post, body)
+        if status != 200 or json.loads(content.decode()).get("errors"):
+            raise RuntimeError("{} {}: {}".format(name, operation, content[:200]))
+        durations[operation].append(duration)
+        session_queries[operation] += sum("django_session" in query["sql"] for query in queries.captured_queries)
+
+    for email in emails:
+        session = ClientSession("/graph/")
+        body = login % (email, PASSWORD)
+        session.post(body)
+        for i in range(args.requests):
+            call(session, "user", user)
+        for i in range(args.relogins):
+            call(session, "relogin", body)
+
+    result = {
+        operation: dict(
+            summarize(durations[operation]),
+            session_queries=session_queries[operation] / max(1, len(durations[operation])),
+        )
+        for operation in OPERATIONS
+    }
+    print("{:15} user p50 {:6.2f} мс, сессия {:.2f} запроса; повторный вход p50 {:6.2f} мс, сессия {:.2f}".format(
+        name, result["user"]["p50_ms"], result["user"]["session_queries"],
+        result["relogin"]["p50_ms"], result["relogin"]["session_queries"],
+    ))
+    return result
+
+
+def main():
+    parser = get_parser(__doc__)
+    parser.add_argument("--candidates", type=int, default=20, help="Кандидатов.")
+    parser.add_argument("--requests", type=int, default=50, help="Запросов user на кандидата.")
+    parser.add_argument("--relogins", type=int, default=5, help="Повторных входов на кандидата.")
+    args = parser.parse_args()
+
+    db_path = setup_django(args.db)
+    from django.core.management import call_command
+
+    print("База: {}".format(db_path))
+    call_command("migrate", verbosity=0)
+    test_case_id, emails = seed(args.candidates, 50, "4", 10)
+
+    results = {name: run_strategy(name, strategy, emails, args) for name, strategy in STRATEGIES.items()}
+    write_results(args.output, "sessions", {
+        "candidates": args.candidates,
+        "requests": args.requests,
+        "relogins": args.relogins,
+        "strategies": results,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Старт экзамена на SQLite: одновременные login и startTest с профилем и без.
+
+Все кандидаты одновременно входят и начинают тест, в --concurrency процессов:
+в потоках запросы упираются в GIL, а не в блокировки SQLite. Пароли хешируются
+MD5PasswordHasher, чтобы время login было временем записи в базу, а не PBKDF2.
+Замер проводится дважды на новых базах: с настройками SQLite по умолчанию
+(SQLITE_PRAGMAS = {}) и с профилем из settings.SQLITE_PRAGMAS.
+
+    python -m benchmarks.sqlite_storm --candidates 500 --concurrency 16 --output sqlite_storm.json
+
+"""
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from .lifecycle import ClientSession, Recorder, get_error_kind, seed, PASSWORD
+from .utils import get_parser, setup_django, summarize, timed, write_results
+
+
+OPERATIONS = ("login", "startTest")
+
+
+def worker(test_case_id, emails, barrier, queue):
+    """
+    Кандидаты одного процесса по очереди входят и начинают тест.
+
+    Замеры (операция, секунды, вид ошибки) уходят в queue одним списком.
+
+    """
+    records = []
+
+    def call(session, operation, query):
+        duration, (status, content) = timed(session.post, json.dumps({"query": query}))
+        try:
+            error = get_error_kind(status, json.loads(content.decode()))
+        except ValueError:
+            error = "http"
+        records.append((operation, duration, error))
+
+    # Первая волна стартует одновременно.
+    barrier.wait()
+    for email in emails:
+        session = ClientSession("/graph/")
+        try:
+            call(session, "login", '{login(email: "%s", password: "%s") {name}}' % (email, PASSWORD))
+            call(session, "startTest", "{startTest(id: %d) {id}}" % test_case_id)
+        finally:
+            session.close()
+    queue.put(records)
+
+
+def storm(test_case_id, emails, concurrency):
+    """
+    Все кандидаты входят и начинают тест.
+
+    Процессы создаются fork после закрытия соединения, у каждого свое соединение с базой.
+
+    :return: Записанные замеры и общее время в секундах.
+    :rtype: tuple
+
+    """
+    context = multiprocessing.get_context("fork")
+    chunks = [emails[i::concurrency] for i in range(concurrency) if emails[i::concurrency]]
+    barrier = context.Barrier(len(chunks) + 1)
+    queue = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(test_case_id, chunk, barrier, queue)) for chunk in chunks
+    ]
+    for process in processes:
+        process.start()
+    barrier.wait()
+    started = time.perf_counter()
+    recorder = Recorder()
+    for process in processes:
+        for operation, duration, error in queue.get():
+            recorder.add(operation, duration, None, error)
+    wall = time.perf_counter() - started
+    for process in processes:
+        process.join()
+    return recorder, wall
+
+
+def measure(label, pragmas, args):
+    """
+    Замер на новой базе с заданными PRAGMA.
+
+    :rtype: dict
+
+    """
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+    from apps.quiz.models import Test
+
+    connection.close()
+    settings.SQLITE_PRAGMAS = pragmas
+    settings.DATABASES["default"]["NAME"] = os.path.join(tempfile.mkdtemp(prefix="quiz-bench-"), "db.sqlite3")
+    call_command("migrate", verbosity=0)
+    test_case_id, emails = seed(args.candidates, args.questions, "4", args.questions_per_test)
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode")
+        journal_mode = cursor.fetchone()[0]
+    connection.close()
+
+    recorder, wall = storm(test_case_id, emails, args.concurrency)
+    started = Test.objects.filter(status=Test.STATUS_STARTED).count()
+    result = {
+        "journal_mode": journal_mode,
+        "pragmas": pragmas,
+        "wall_s": wall,
+        "starts_per_s": started / wall,
+        "started": started,
+        "operations": {
+            operation: dict(
+                summarize(recorder.durations[operation]),
+                errors=recorder.errors[operation],
+                concurrency_errors=recorder.concurrency_errors[operation],
+            )
+            for operation in OPERATIONS
+        },
+    }
+    print("\n{} (journal_mode={}): начато {} из {} за {:.1f} с, {:.1f} стартов/с".format(
+        label, journal_mode, started, len(emails), wall, result["starts_per_s"]
+    ))
+    for operation in OPERATIONS:
+        item = result["operations"][operation]
+        print("  {:10} p50 {:7.2f} мс, p95 {:7.2f} мс, p99 {:7.2f} мс, ошибок {}, гонок {}".format(
+            operation, item["p50_ms"], item["p95_ms"], item["p99_ms"], item["errors"], item["concurrency_errors"]
+        ))
+    return result
+
+
+def main():
+    parser = get_parser(__doc__)
+    parser.add_argument("--candidates", type=int, default=300, help="Кандидатов.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Одновременных кандидатов, процессов.")
+    parser.add_argument("--questions", type=int, default=2000, help="Вопросов в базе.")
+    parser.add_argument("--questions-per-test", type=int, default=30, help="Вопросов в тесте.")
+    args = parser.parse_args()
+
+    # Каждый замер на своей новой базе, --db не используется.
+    setup_django(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+    from django.conf import settings
+
+    profile = dict(settings.SQLITE_PRAGMAS)
+    results = {
+        "default": measure("Без профиля", {}, args),
+        "profile": measure("С профилем", profile, args),
+    }
+    write_results(args.output, "sqlite_storm", dict(
+        results, candidates=args.candidates, concurrency=args.concurrency
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Общие функции бенчмарков.
+
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_parser(description):
+    """
+    Парсер аргументов с общими для бенчмарков опциями.
+
+    :param description: Описание бенчмарка.
+    :type description: str
+
+    :rtype: argparse.ArgumentParser
+
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--db", help="Файл базы SQLite, по умолчанию во временной папке.")
+    parser.add_argument("--output", help="Куда записать результаты в JSON.")
+    return parser
+
+
+def setup_django(db_path=None, settings_module="project.settings", **overrides):
+    """
+    Настраивает django на отдельную базу.
+
+    :param db_path: Файл базы SQLite, None - новый файл во временной папке.
+    :param settings_module: Модуль настроек.
+    :param overrides: Настройки, которые нужно переопределить.
+    :type db_path: str
+    :type settings_module: str
+
+    :return: Путь до файла базы.
+    :rtype: str
+
+    """
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="quiz-bench-"), "db.sqlite3")
+
+    from django.conf import settings
+    settings.DATABASES["default"]["NAME"] = db_path
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ["*"]
+    for key, value in overrides.items():
+        setattr(settings, key, value)
+
+    import django
+    django.setup()
+    return db_path
+
+
+def timed(fn, *args, **kwargs):
+    """
+    Время выполнения функции.
+
+    :return: Секунды и результат функции.
+    :rtype: tuple
+
+    """
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+def percentile(values, percent):
+    """
+    Перцентиль по ближайшему рангу.
+
+    :param values: Значения.
+    :param percent: Перцентиль, от 0 до 100.
+    :type values: list
+    :type percent: float
+
+    :rtype: float
+
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, int(round(percent / 100.0 * len(values))) - 1))
+    return values[index]
+
+
+def summarize(durations):
+    """
+    Сводка по длительностям в миллисекундах.
+
+    :param durations: Длительности в секундах.
+    :type durations: list
+
+    :rtype: dict
+
+    """
+    if not durations:
+        return {"count": 0}
+    return {
+        "count": len(durations),
+        "mean_ms": sum(durations) / len(durations) * 1000,
+        "p50_ms": percentile(durations, 50) * 1000,
+        "p95_ms": percentile(durations, 95) * 1000,
+        "p99_ms": percentile(durations, 99) * 1000,
+        "max_ms": max(durations) * 1000,
+    }
+
+
+def get_revision():
+    """
+    Текущий коммит, чтобы результаты можно было сравнивать.
+
+    :rtype: str
+
+    """
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path, name, results):
+    """
+    Пишет результаты в JSON.
+
+    :param path: Файл, None - не писать.
+    :param name: Название бенчмарка.
+    :param results: Результаты.
+    :type path: str
+    :type name: str
+    :type results: dict
+
+    """
+    if not path:
+        return
+    with open(path, "w") as f:
+        json.dump({
+            "benchmark": name,
+            "revision": get_revision(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": results,
+        }, f, indent=2, ensure_ascii=False, default=str)
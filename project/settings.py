@@ -49,13 +49,22 @@ INSTALLED_APPS = [
 
 GRAPHENE = {
     # 'SCHEMA': 'project.schema.schema',
-    "DATETIME_FORMAT": "%d.%m.%Y %H:%M:%S"
+    "DATETIME_FORMAT": "%d.%m.%Y %H:%M:%S",
+    "DOCUMENT_CACHE_SIZE": 256,
+    # "PERSISTED_QUERIES": os.path.join(BASE_DIR, "persisted_queries.json"),
+    "PERSISTED_QUERIES_ONLY": False,
+    # Замеры запросов, см. apps/utils/graphql/timing.py.
+    "TIMING": False,
+    "TIMING_EXTENSIONS": False,
+    "TIMING_SLOW_MS": 500,
+    "TIMING_TOP_RESOLVERS": 10,
 }
 
 
 MIDDLEWARE = [
+    'apps.utils.routers.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'apps.utils.sessions.PathSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -89,11 +98,85 @@ WSGI_APPLICATION = 'project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/1.11/ref/settings/#databases
 
+# База из переменных окружения, по умолчанию SQLite рядом с проектом:
+#   DB_ENGINE - бэкенд, например django.db.backends.postgresql, или
+#       apps.utils.backends.postgresql - он же с пулом соединений, см. apps/utils/backends/pool.py.
+#   DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT - параметры подключения.
+#   DB_CONN_MAX_AGE - секунд держать соединение между запросами, 0 - закрывать после запроса.
+#       С пулом оставить 0: соединение вернется в пул, а не закроется.
+#   DB_CONN_HEALTH_CHECKS - 1/0, проверять оставшееся соединение в начале запроса.
+#   DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_MAX_AGE - размер пула, секунд ждать соединения, секунд жизни соединения.
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.sqlite3'),
+        'NAME': os.environ.get('DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+        'USER': os.environ.get('DB_USER', ''),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', ''),
+        'PORT': os.environ.get('DB_PORT', ''),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1',
+        'POOL': {
+            'SIZE': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+            'MAX_AGE': int(os.environ.get('DB_POOL_MAX_AGE', 600)),
+        },
+    },
+    # 'replica': {
+    #     'ENGINE': 'django.db.backends.sqlite3',
+    #     'NAME': os.path.join(BASE_DIR, 'db-replica.sqlite3'),
+    #     'TEST': {'MIRROR': 'default'},
+    # },
+}
+
+# Профиль SQLite для одновременных записей, см. apps/utils/sqlite.py.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 10000,  # мс
+    'cache_size': -20000,  # КиБ
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Чтения GraphQL query с реплик, см. apps/utils/routers.py.
+DATABASE_ROUTERS = ['apps.utils.routers.ReplicaRouter']
+DATABASE_REPLICAS = []  # ['replica']
+DATABASE_REPLICA_PIN_SECONDS = 5
+
+# Адреса балансировщика и мониторинга, им доступна /health/db/ без входа персонала.
+INTERNAL_IPS = [ip for ip in os.environ.get('INTERNAL_IPS', '127.0.0.1').split(',') if ip]
+
+
+# Кеш из переменных окружения:
+#   CACHE_BACKEND - бэкенд, например django.core.cache.backends.memcached.PyLibMCCache.
+#   CACHE_LOCATION - адрес кеша.
+# Если процессов несколько (воркеры WSGI сервера, команды по cron), кеш обязан быть
+# общим, например memcached: сигналы сбрасывают ключи ключей ответов, слепков тестов и
+# токенов, а сброс в LocMemCache виден только своему процессу. С LocMemCache эти данные
+# кешируются не дольше QUIZ["LOCAL_CACHE_TIMEOUT"], см. apps/quiz/conf.py.
+# QUIZ["AUTH_MODE"] = "signed" с LocMemCache не запускается.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    },
+}
+
+
+# Сессии запросов кандидатов в /graph/, см. apps/utils/sessions.py:
+#   GRAPH_SESSION_ENGINE - движок, например django.contrib.sessions.backends.cache,
+#       cached_db или signed_cookies, по умолчанию как у всего проекта.
+#   GRAPH_SESSION_COOKIE_NAME - своя cookie, обязательна для движков, несовместимых с SESSION_ENGINE.
+# Устаревшие сессии удаляет команда purge_sessions.
+
+SESSION_PATH_ENGINES = {
+    '/graph/': {
+        'ENGINE': os.environ.get('GRAPH_SESSION_ENGINE', 'django.contrib.sessions.backends.db'),
+        'COOKIE_NAME': os.environ.get('GRAPH_SESSION_COOKIE_NAME', 'sessionid'),
+    },
 }
 
 
@@ -116,6 +199,16 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.BCryptPasswordHasher',
+    'apps.quiz.hashers.AccountPasswordHasher',
+]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/1.11/topics/i18n/
 
@@ -135,3 +228,24 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+
+
+# Logging
+# https://docs.djangoproject.com/en/1.11/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'apps.utils.graphql.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -17,18 +17,19 @@ from django.conf.urls import url
 from django.contrib import admin
 from django.conf import settings
 
-from graphene_django.views import GraphQLView
-
 from apps.quiz.graphql import schema
+from apps.utils.graphql.views import CachedGraphQLView
+from apps.utils.views import db_health
 
 
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
-    url(r"^graph/", GraphQLView.as_view(schema=schema)),
+    url(r"^graph/", CachedGraphQLView.as_view(schema=schema)),
+    url(r"^health/db/$", db_health),
 ]
 
 
 if settings.DEBUG:
     urlpatterns += [
-        url(r"^graphiql/", GraphQLView.as_view(schema=schema, graphiql=True))
+        url(r"^graphiql/", CachedGraphQLView.as_view(schema=schema, graphiql=True))
     ]